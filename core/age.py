@@ -1,18 +1,29 @@
-from contextlib import contextmanager, asynccontextmanager
+from contextlib import aclosing, asynccontextmanager, closing, contextmanager
 import datetime
 import json
-from django.db import connections
-from core import models
+import logging
+import ujson
+from core import models, agtype, changelog, metrics, render_cache
+from core.connection import (
+    graph_cursor,
+    graph_transaction,
+    agraph_cursor,
+    stream_graph_rows,
+    astream_graph_rows,
+)
 from dataclasses import dataclass
 from core import filters, pagination
 import typing
 from pydantic import BaseModel, Field
 import strawberry
+from asgiref.sync import sync_to_async
 
 if typing.TYPE_CHECKING:
     from core import models, filters, pagination, inputs
 
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class LinkedStructure:
     identifier: str
@@ -104,14 +115,72 @@ class RetrievedNodeMetric:
         return None
 
 
-@dataclass
-class RetrievedEntity:
+class LazyProperties:
+    """Base for retrieved graph elements with lazily decoded properties
+
+    Retrieved vertices and edges are slotted and keep their properties as
+    the raw agtype (JSON) text until they are first accessed, as most
+    renders only ever look at a few properties of a few rows. Equality
+    and hashing follow the identity of the element in its graph.
+    """
+
+    __slots__ = (
+        "graph_name",
+        "id",
+        "kind_age_name",
+        "_properties",
+        "_raw_properties",
+    )
+
     graph_name: str
     id: int
     kind_age_name: str | None
-    properties: dict[str, str] | None
-    cached_metrics: list[RetrievedNodeMetric] | None = None
-    cached_relations: list["RetrievedRelation"] | None = None
+
+    @property
+    def properties(self) -> dict[str, typing.Any]:
+        if self._properties is None:
+            raw = self._raw_properties
+            self._properties = ujson.loads(raw) if raw else {}
+            self._raw_properties = None
+        return self._properties
+
+    @properties.setter
+    def properties(self, value: dict[str, typing.Any] | None) -> None:
+        self._properties = value
+        self._raw_properties = None
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.graph_name == other.graph_name and self.id == other.id
+
+    def __hash__(self):
+        return hash((self.graph_name, self.id))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.graph_name}:{self.id}, {self.kind_age_name})"
+
+
+class RetrievedEntity(LazyProperties):
+    __slots__ = ("cached_metrics", "cached_relations")
+
+    def __init__(
+        self,
+        graph_name: str,
+        id: int,
+        kind_age_name: str | None,
+        properties: dict[str, typing.Any] | None = None,
+        cached_metrics: list[RetrievedNodeMetric] | None = None,
+        cached_relations: list["RetrievedRelation"] | None = None,
+        raw_properties: str | bytes | None = None,
+    ):
+        self.graph_name = graph_name
+        self.id = id
+        self.kind_age_name = kind_age_name
+        self._properties = properties
+        self._raw_properties = raw_properties
+        self.cached_metrics = cached_metrics
+        self.cached_relations = cached_relations
 
     def retrieve_relations(self) -> "RetrievedRelation":
         return self.cached_relations or get_age_relations(self.graph_name, self.id)
@@ -122,6 +191,12 @@ class RetrievedEntity:
     def retrieve_left_relations(self) -> "RetrievedRelation":
         return get_left_relations(self.graph_name, self.id)
 
+    def aretrieve_right_relations(self) -> typing.AsyncIterator["RetrievedRelation"]:
+        return aget_right_relations(self.graph_name, self.id)
+
+    def aretrieve_left_relations(self) -> typing.AsyncIterator["RetrievedRelation"]:
+        return aget_left_relations(self.graph_name, self.id)
+
     def retrieve_metrics(self) -> list["RetrievedNodeMetric"]:
         return self.cached_metrics or get_age_metrics(self.graph_name, self.id)
 
@@ -202,14 +277,26 @@ class RetrievedEntity:
         }
 
 
-@dataclass
-class RetrievedRelation:
-    graph_name: str
-    id: int
-    kind_age_name: str | None
-    left_id: int
-    right_id: int
-    properties: dict[str, str] | None
+class RetrievedRelation(LazyProperties):
+    __slots__ = ("left_id", "right_id")
+
+    def __init__(
+        self,
+        graph_name: str,
+        id: int,
+        kind_age_name: str | None,
+        left_id: int,
+        right_id: int,
+        properties: dict[str, typing.Any] | None = None,
+        raw_properties: str | bytes | None = None,
+    ):
+        self.graph_name = graph_name
+        self.id = id
+        self.kind_age_name = kind_age_name
+        self.left_id = left_id
+        self.right_id = right_id
+        self._properties = properties
+        self._raw_properties = raw_properties
 
     def retrieve_left(self) -> "RetrievedEntity":
         return get_age_entity(self.graph_name, self.left_id)
@@ -286,17 +373,8 @@ class RetrievedRelation:
             raise ValueError(f"Error retrieving metrics {e} {self.properties}")
 
 
-@contextmanager
-def graph_cursor():
-    with connections["default"].cursor() as cursor:
-        cursor.execute("LOAD 'age';")
-        cursor.execute('SET search_path = ag_catalog, "$user", public')
-        
-        print(f"Creating new graph cursor. Use this to support AGE queries.")
-        yield cursor
-        print(f"Closing graph cursor.")
-
-
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_graph(name: str):
     with graph_cursor() as cursor:
         cursor.execute(
@@ -307,15 +385,18 @@ def create_age_graph(name: str):
             return exists
         else:
             cursor.execute("SELECT create_graph(%s);", [name])
-            print(cursor.fetchone())
+            cursor.fetchone()
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def delete_age_graph(name: str):
     with graph_cursor() as cursor:
         cursor.execute("SELECT drop_graph(%s, true);", [name])
-        print(cursor.fetchone())
+        cursor.fetchone()
 
 
+@metrics.observe_age_function
 def create_age_entity_kind(category: "models.EntityCategory"):
     with graph_cursor() as cursor:
         try:
@@ -323,11 +404,12 @@ def create_age_entity_kind(category: "models.EntityCategory"):
                 "SELECT create_vlabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_relation_kind(category: "models.RelationCategory"):
     with graph_cursor() as cursor:
         try:
@@ -335,11 +417,12 @@ def create_age_relation_kind(category: "models.RelationCategory"):
                 "SELECT create_elabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_structure_kind(category: "models.StructureCategory"):
     with graph_cursor() as cursor:
         try:
@@ -347,11 +430,12 @@ def create_age_structure_kind(category: "models.StructureCategory"):
                 "SELECT create_vlabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_natural_event_kind(category: "models.NaturalEventCategory"):
     with graph_cursor() as cursor:
         try:
@@ -359,9 +443,9 @@ def create_age_natural_event_kind(category: "models.NaturalEventCategory"):
                 "SELECT create_vlabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
         for role in category.collected_in_role_vertex_name:
             try:
@@ -369,20 +453,21 @@ def create_age_natural_event_kind(category: "models.NaturalEventCategory"):
                     "SELECT create_elabel(%s, %s);",
                     (category.graph.age_name, category.get_inrole_vertex_name(role)),
                 )
-                print(cursor.fetchone())
+                cursor.fetchone()
             except Exception as e:
-                print(e)
+                logger.warning("Could not create label: %s", e)
         for role in category.collected_in_role_vertex_name:
             try:
                 cursor.execute(
                     "SELECT create_elabel(%s, %s);",
                     (category.graph.age_name, category.get_outrole_vertex_name(role)),
                 )
-                print(cursor.fetchone())
+                cursor.fetchone()
             except Exception as e:
-                print(e)
+                logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_protocol_event_kind(category: "models.ProtocolEventCategory"):
     with graph_cursor() as cursor:
         try:
@@ -390,9 +475,9 @@ def create_age_protocol_event_kind(category: "models.ProtocolEventCategory"):
                 "SELECT create_vlabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
         for role in category.collected_in_role_vertex_name:
             try:
@@ -400,20 +485,21 @@ def create_age_protocol_event_kind(category: "models.ProtocolEventCategory"):
                     "SELECT create_elabel(%s, %s);",
                     (category.graph.age_name, category.get_inrole_vertex_name(role)),
                 )
-                print(cursor.fetchone())
+                cursor.fetchone()
             except Exception as e:
-                print(e)
+                logger.warning("Could not create label: %s", e)
         for role in category.collected_in_role_vertex_name:
             try:
                 cursor.execute(
                     "SELECT create_elabel(%s, %s);",
                     (category.graph.age_name, category.get_outrole_vertex_name(role)),
                 )
-                print(cursor.fetchone())
+                cursor.fetchone()
             except Exception as e:
-                print(e)
+                logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_metric_kind(category: "models.MetricCategory"):
     with graph_cursor() as cursor:
         try:
@@ -421,11 +507,12 @@ def create_age_metric_kind(category: "models.MetricCategory"):
                 "SELECT create_vlabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_reagent_kind(category: "models.ReagentCategory"):
     with graph_cursor() as cursor:
         try:
@@ -433,11 +520,12 @@ def create_age_reagent_kind(category: "models.ReagentCategory"):
                 "SELECT create_vlabel(%s, Reagent);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_measurement_kind(category: "models.MeasurementCategory"):
     with graph_cursor() as cursor:
         try:
@@ -445,11 +533,12 @@ def create_age_measurement_kind(category: "models.MeasurementCategory"):
                 "SELECT create_elabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
 
+@metrics.observe_age_function
 def create_age_relation_kind(category: "models.RelationCategory"):
     with graph_cursor() as cursor:
         try:
@@ -457,88 +546,84 @@ def create_age_relation_kind(category: "models.RelationCategory"):
                 "SELECT create_elabel(%s, %s);",
                 (category.graph.age_name, category.get_age_vertex_name()),
             )
-            print(cursor.fetchone())
+            cursor.fetchone()
         except Exception as e:
-            print(e)
+            logger.warning("Could not create label: %s", e)
 
 
-def vertex_ag_to_retrieved_entity(graph_name, vertex):
-    trimmed_vertex = vertex.replace("::vertex", "")
-    print("timmed neighbour", trimmed_vertex)
+def vertex_ag_to_retrieved_entity(graph_name, vertex) -> "RetrievedEntity":
+    if not isinstance(vertex, RetrievedEntity):
+        vertex = agtype.decode_agtype(vertex, graph_name)
 
-    parsed_vertex = json.loads(trimmed_vertex)
-    return RetrievedEntity(
-        graph_name=graph_name,
-        id=parsed_vertex["id"],
-        kind_age_name=parsed_vertex["label"],
-        properties=parsed_vertex["properties"],
-    )
+    return agtype.canonical(graph_name, vertex)
 
 
-def edge_ag_to_retrieved_relation(graph_name, edge):
-    trimmed_relationship = edge.replace("::edge", "")
-    print("timmed", trimmed_relationship)
-    parsed_relationship = json.loads(trimmed_relationship)
-    return RetrievedRelation(
-        graph_name=graph_name,
-        id=parsed_relationship["id"],
-        kind_age_name=parsed_relationship["label"],
-        left_id=parsed_relationship["start_id"],
-        right_id=parsed_relationship["end_id"],
-        properties=parsed_relationship["properties"],
-    )
+def edge_ag_to_retrieved_relation(graph_name, edge) -> "RetrievedRelation":
+    if not isinstance(edge, RetrievedRelation):
+        edge = agtype.decode_agtype(edge, graph_name)
+
+    return agtype.canonical(graph_name, edge)
 
 
-def edge_ag_to_retrieved_metric(graph_name, edge):
-    trimmed_relationship = edge.replace("::edge", "")
-    print("timmed", trimmed_relationship)
-    parsed_relationship = json.loads(trimmed_relationship)
+def edge_ag_to_retrieved_metric(graph_name, edge) -> RetrievedNodeMetric:
+    relation = edge_ag_to_retrieved_relation(graph_name, edge)
     return RetrievedNodeMetric(
         graph_name=graph_name,
-        id=parsed_relationship["id"],
-        kind_age_name=parsed_relationship["label"],
-        properties=parsed_relationship["properties"],
+        id=relation.id,
+        kind_age_name=relation.kind_age_name,
+        properties=relation.properties,
     )
 
 
-def get_neighbors_and_edges(graph_name, node_id):
-    with graph_cursor() as cursor:
-        print(graph_name, int(node_id))
-        cursor.execute(
-            """
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (n)-[r]-(neighbor)
-                WHERE id(n) = %s AND id(neighbor) <> id(n)
-                RETURN DISTINCT r, neighbor 
-            $$) as (relationship agtype, neighbor agtype);
-            """,
-            [graph_name, int(node_id)],
-        )
+def _neighbors_and_edges_query(graph_name, node_id):
+    return (
+        """
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH (n)-[r]-(neighbor)
+            WHERE id(n) = %s AND id(neighbor) <> id(n)
+            RETURN DISTINCT r, neighbor 
+        $$) as (relationship agtype, neighbor agtype);
+        """,
+        [graph_name, int(node_id)],
+    )
 
-        results = cursor.fetchall()
-        print("Thre results", results)
 
-        nodes: list[RetrievedEntity] = []
-        relation_ships: list[RetrievedRelation] = []
+def _split_neighbors_and_edges(graph_name, results):
+    nodes: list[RetrievedEntity] = []
+    relation_ships: list[RetrievedRelation] = []
 
-        for result in results:
-            print(result)
-            relationship = result[0]  # Edge connecting the nodes
-            neighbour = result[1]  # Starting node
+    for result in results:
+        relationship = result[0]  # Edge connecting the nodes
+        neighbour = result[1]  # Starting node
 
-            if neighbour:
-                nodes.append(vertex_ag_to_retrieved_entity(graph_name, neighbour))
+        if neighbour:
+            nodes.append(vertex_ag_to_retrieved_entity(graph_name, neighbour))
 
-            if relationship:
-                relation_ships.append(
-                    edge_ag_to_retrieved_relation(graph_name, relationship)
-                )
+        if relationship:
+            relation_ships.append(
+                edge_ag_to_retrieved_relation(graph_name, relationship)
+            )
 
-        print(nodes, relation_ships)
-        return nodes, relation_ships
+    return nodes, relation_ships
 
 
+@metrics.observe_age_function
+def get_neighbors_and_edges(graph_name, node_id):
+    with graph_cursor() as cursor:
+        cursor.execute(*_neighbors_and_edges_query(graph_name, node_id))
+        return _split_neighbors_and_edges(graph_name, cursor.fetchall())
+
+
+@metrics.observe_age_function
+async def aget_neighbors_and_edges(graph_name, node_id):
+    async with agraph_cursor() as cursor:
+        await cursor.execute(*_neighbors_and_edges_query(graph_name, node_id))
+        return _split_neighbors_and_edges(graph_name, await cursor.fetchall())
+
+
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_entity(
     category: "models.EntityCategory",
     name: str | None = None,
@@ -549,7 +634,7 @@ def create_age_entity(
         
     
 
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
             
             
         if external_id:
@@ -576,9 +661,10 @@ def create_age_entity(
             )
             existing = cursor.fetchone()
             if existing:
-                return vertex_ag_to_retrieved_entity(
+                vertex = vertex_ag_to_retrieved_entity(
                     category.graph.age_name, existing[0]
                 )
+                return changelog.recorded(cursor, changelog.UPDATED, vertex)
                 
         
         if category.sequence:
@@ -602,9 +688,6 @@ def create_age_entity(
             RETURN n
         $$) as (n agtype);"""
 
-
-        print("create query", create_query)
-
         cursor.execute(
             create_query,
             (
@@ -620,18 +703,21 @@ def create_age_entity(
         result = cursor.fetchone()
         if result:
             entity = result[0]
-            return vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            vertex = vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            return changelog.recorded(cursor, changelog.CREATED, vertex)
         else:
             raise ValueError("No entity created or returned by the query.")
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_reagent(
     category: "models.ReagentCategory",
     name: str | None = None,
     external_id: str | None = None,
 ) -> RetrievedEntity:
 
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         
         
         if external_id:
@@ -658,9 +744,10 @@ def create_age_reagent(
             )
             existing = cursor.fetchone()
             if existing:
-                return vertex_ag_to_retrieved_entity(
+                vertex = vertex_ag_to_retrieved_entity(
                     category.graph.age_name, existing[0]
                 )
+                return changelog.recorded(cursor, changelog.UPDATED, vertex)
                 
         
         if category.sequence:
@@ -698,40 +785,118 @@ def create_age_reagent(
         result = cursor.fetchone()
         if result:
             entity = result[0]
-            return vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            vertex = vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            return changelog.recorded(cursor, changelog.CREATED, vertex)
         else:
             raise ValueError("No entity created or returned by the query.")
 
 
-def get_active_reagent_for_reagent_category(category: "models.ReagentCategory"):
+def _active_reagent_scan_query(category: "models.ReagentCategory"):
+    return (
+        f"""
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH (n:{category.get_age_vertex_name()} {{__type: "REAGENT", __category_id: %s, __category_type: %s}}) 
+            WHERE n.__active = true
+            RETURN n
+        $$) as (n agtype);
+        """,
+        (category.graph.age_name, category.id, category.get_age_type_name()),
+    )
+
+
+def _invalidate_category_caches(category: "models.ReagentCategory") -> None:
+    """Drop the category from the metadata cache, which the loaders read through
+
+    Needed after writes that bypass post_save (queryset updates, raw SQL).
+    """
+    from core import metadata
+
+    metadata.invalidate(category)
+
 
-    # get the active reagent for the category
+def _scan_active_reagent(category: "models.ReagentCategory") -> RetrievedEntity | None:
+    """Find the active reagent by its __active flag and store the pointer
+
+    Only needed for categories whose active reagent was set before the
+    pointer existed.
+    """
     with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (n:{category.get_age_vertex_name()} {{__type: "REAGENT", __category_id: %s, __category_type: %s}}) 
-                WHERE n.__active = true
-                RETURN n
-            $$) as (n agtype);
-            """,
-            (category.graph.age_name, category.id, category.get_age_type_name()),
-        )
+        cursor.execute(*_active_reagent_scan_query(category))
         result = cursor.fetchone()
-        if result:
-            entity = result[0]
-            return vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
-        else:
-            raise ValueError("No entity created or returned by the query.")
 
+    if not result:
+        return None
+
+    entity = vertex_ag_to_retrieved_entity(category.graph.age_name, result[0])
+    models.ReagentCategory.objects.filter(pk=category.pk).update(
+        active_reagent_id=entity.id
+    )
+    _invalidate_category_caches(category)
+    return entity
+
+
+@metrics.observe_age_function
+def get_active_reagents_for_reagent_categories(
+    categories: list["models.ReagentCategory"],
+) -> dict[int, RetrievedEntity]:
+    """Get the active reagents of many categories, by category id
+
+    Follows the active reagent pointer of the categories, so all reagents
+    of a graph are retrieved together. Categories without an active
+    reagent are left out.
+    """
+    active = {}
+    pointers_by_graph = {}
+
+    for category in categories:
+        if category.active_reagent_id is None:
+            entity = _scan_active_reagent(category)
+            if entity is not None:
+                active[category.id] = entity
+            continue
+
+        pointers_by_graph.setdefault(category.graph.age_name, {})[
+            category.active_reagent_id
+        ] = category.id
+
+    for graph_name, pointers in pointers_by_graph.items():
+        for entity in get_age_entities(graph_name, list(pointers)):
+            active[pointers[entity.id]] = entity
+
+    return active
+
+
+@metrics.observe_age_function
+def get_active_reagent_for_reagent_category(category: "models.ReagentCategory"):
+    active = get_active_reagents_for_reagent_categories([category])
+    if category.id not in active:
+        raise ValueError("No entity created or returned by the query.")
+    return active[category.id]
 
+
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def set_as_active_reagent_for_category(
     category: "models.ReagentCategory", entity_id: str
 ) -> RetrievedEntity:
+    """Make the reagent the active one of its category
 
-    # unsert old active
-    with graph_cursor() as cursor:
+    The __active flags and the active reagent pointer of the category are
+    updated in one transaction, that holds a lock on the category row, so
+    concurrent calls cannot leave two active reagents behind. The category
+    instance is only read, so it may come from the metadata cache.
+    """
+    table = models.ReagentCategory._meta.db_table
+    pk_column = models.ReagentCategory._meta.pk.column
+
+    with graph_transaction() as cursor:
+        cursor.execute(
+            f'SELECT active_reagent_id FROM "{table}" WHERE "{pk_column}" = %s FOR UPDATE',
+            (category.pk,),
+        )
+
+        # unset old active
         cursor.execute(
             f"""
             SELECT * 
@@ -744,9 +909,16 @@ def set_as_active_reagent_for_category(
             """,
             (category.graph.age_name, category.id, category.get_age_type_name()),
         )
+        changelog.record(
+            cursor,
+            changelog.UPDATED,
+            *(
+                vertex_ag_to_retrieved_entity(category.graph.age_name, row[0])
+                for row in cursor.fetchall()
+            ),
+        )
 
-    # set new active
-    with graph_cursor() as cursor:
+        # set new active
         cursor.execute(
             f"""
             SELECT * 
@@ -765,13 +937,24 @@ def set_as_active_reagent_for_category(
             ),
         )
         result = cursor.fetchone()
-        if result:
-            entity = result[0]
-            return vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
-        else:
+        if not result:
             raise ValueError("No entity created or returned by the query.")
 
+        entity = vertex_ag_to_retrieved_entity(category.graph.age_name, result[0])
+        changelog.record(cursor, changelog.UPDATED, entity)
+        cursor.execute(
+            f'UPDATE "{table}" SET active_reagent_id = %s WHERE "{pk_column}" = %s',
+            (entity.id, category.pk),
+        )
+
+    # The raw update sends no post_save, cached copies of the category
+    # still hold the previous pointer
+    _invalidate_category_caches(category)
+    return entity
+
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_protocol_event(
     category: "models.ProtocolEventCategory",
     name: str | None = None,
@@ -781,7 +964,7 @@ def create_age_protocol_event(
     variables: list["inputs.VariableMappingInput"] | None = None,
 ) -> RetrievedEntity:
 
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         if external_id:
             # Try to find existing reagent first
             cursor.execute(
@@ -812,9 +995,10 @@ def create_age_protocol_event(
             )
             existing = cursor.fetchone()
             if existing:
-                return vertex_ag_to_retrieved_entity(
+                vertex = vertex_ag_to_retrieved_entity(
                     category.graph.age_name, existing[0]
                 )
+                return changelog.recorded(cursor, changelog.UPDATED, vertex)
 
         # Create new reagent if not found
         cursor.execute(
@@ -841,10 +1025,13 @@ def create_age_protocol_event(
         result = cursor.fetchone()
         if result:
             entity = result[0]
-            return vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            vertex = vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            return changelog.recorded(cursor, changelog.CREATED, vertex)
         else:
             raise ValueError("No entity created or returned by the query.")
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_natural_event(
     category: "models.NaturalEventCategory",
     name: str | None = None,
@@ -861,7 +1048,7 @@ def create_age_natural_event(
         sequence_setting = ""
         
 
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         if external_id:
             # Try to find existing reagent first
             cursor.execute(
@@ -892,9 +1079,10 @@ def create_age_natural_event(
             )
             existing = cursor.fetchone()
             if existing:
-                return vertex_ag_to_retrieved_entity(
+                vertex = vertex_ag_to_retrieved_entity(
                     category.graph.age_name, existing[0]
                 )
+                return changelog.recorded(cursor, changelog.UPDATED, vertex)
 
         # Create new reagent if not found
         cursor.execute(
@@ -919,11 +1107,14 @@ def create_age_natural_event(
         result = cursor.fetchone()
         if result:
             entity = result[0]
-            return vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            vertex = vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            return changelog.recorded(cursor, changelog.CREATED, vertex)
         else:
             raise ValueError("No entity created or returned by the query.")
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_event_in_edge(
     category: "models.ProtocolEventCategory",
     event_entity: RetrievedEntity,
@@ -931,7 +1122,7 @@ def create_age_event_in_edge(
 ):
 
     # Create the edge between the entity and the event
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         cursor.execute(
             f"""
             SELECT * 
@@ -953,13 +1144,16 @@ def create_age_event_in_edge(
         result = cursor.fetchone()
         if result:
             new_edge = result[0]
-            return edge_ag_to_retrieved_relation(event_entity.graph_name, new_edge)
+            relation = edge_ag_to_retrieved_relation(event_entity.graph_name, new_edge)
+            return changelog.recorded(cursor, changelog.CREATED, relation)
         else:
             raise ValueError(
                 f"No entity created or returned by the query. To created {event_entity} {edge}"
             )
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_event_out_edge(
     category: "models.ProtocolEventCategory",
     event_entity: RetrievedEntity,
@@ -967,7 +1161,7 @@ def create_age_event_out_edge(
 ):
 
     # Create the edge between the entity and the event
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         cursor.execute(
             f"""
             SELECT * 
@@ -989,13 +1183,15 @@ def create_age_event_out_edge(
         result = cursor.fetchone()
         if result:
             new_edge = result[0]
-            return edge_ag_to_retrieved_relation(event_entity.graph_name, new_edge)
+            relation = edge_ag_to_retrieved_relation(event_entity.graph_name, new_edge)
+            return changelog.recorded(cursor, changelog.CREATED, relation)
         else:
             raise ValueError(
                 f"No entity created or returned by the query. To created {event_entity} {edge}"
             )
 
 
+@metrics.observe_age_function
 def get_random_node(graph_name):
     with graph_cursor() as cursor:
         cursor.execute(
@@ -1019,12 +1215,14 @@ def get_random_node(graph_name):
             raise ValueError("No entity created or returned by the query.")
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_structure(
     category: "models.StructureCategory",
     object: str = None,
 ) -> RetrievedEntity:
 
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         cursor.execute(
             f"""
             SELECT * 
@@ -1049,12 +1247,14 @@ def create_age_structure(
         result = cursor.fetchone()
         if result:
             entity = result[0]
-            print("Created structure", entity)
-            return vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            vertex = vertex_ag_to_retrieved_entity(category.graph.age_name, entity)
+            return changelog.recorded(cursor, changelog.CREATED, vertex)
         else:
             raise ValueError("No entity created or returned by the query.")
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def associate_structure(
     graph_name: str,
     structure_identifier: str,
@@ -1084,7 +1284,7 @@ def associate_structure(
         created_by (str): The ID of the user who created the association.
 
     """
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         cursor.execute(
             f"""SELECT * FROM cypher(%s, $$
                 MATCH (a: Structure) WHERE a.identifier = %s AND a.object = %s
@@ -1107,8 +1307,17 @@ def associate_structure(
                 created_by,
             ),
         )
+        result = cursor.fetchone()
+        if result:
+            changelog.record(
+                cursor,
+                changelog.CREATED,
+                edge_ag_to_retrieved_relation(graph_name, result[0]),
+            )
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_measurement(
     category: "models.MeasurementCategory",
     structure_id: str,
@@ -1138,7 +1347,7 @@ def create_measurement(
         created_by (str): The ID of the user who created the association.
 
     """
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         cursor.execute(
             f"""SELECT * FROM cypher(%s, $$
                 MATCH (a) WHERE id(a) = %s
@@ -1165,11 +1374,14 @@ def create_measurement(
         result = cursor.fetchone()
         if result:
             measurement = result[0]
-            return edge_ag_to_retrieved_relation(category.graph.age_name, measurement)
+            relation = edge_ag_to_retrieved_relation(category.graph.age_name, measurement)
+            return changelog.recorded(cursor, changelog.CREATED, relation)
         else:
             raise ValueError("No measurement created or returned by the query.")
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_metric(
     metric_category: "models.MetricCategory",
     structure_id: str,
@@ -1177,7 +1389,7 @@ def create_age_metric(
     assignation_id: str = None,
     created_by: str = None,
 ):
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
 
         if isinstance(value, list):
             value = json.dumps(value)
@@ -1204,31 +1416,139 @@ def create_age_metric(
         result = cursor.fetchone()
         if result:
             entity = result[0]
-            return vertex_ag_to_retrieved_entity(metric_category.age_name, entity)
+            vertex = vertex_ag_to_retrieved_entity(metric_category.graph.age_name, entity)
+            return changelog.recorded(cursor, changelog.CREATED, vertex)
         else:
             raise ValueError("No entity created or returned by the query.")
 
 
+def _age_entity_query(graph_name, entity_id):
+    return (
+        """
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH (n) WHERE id(n) = %s
+            RETURN n
+        $$) as (n agtype);
+        """,
+        (graph_name, int(entity_id)),
+    )
+
+
+@metrics.observe_age_function
 def get_age_entity(graph_name, entity_id) -> RetrievedEntity:
 
     with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (n) WHERE id(n) = %s
-                RETURN n
-            $$) as (n agtype);
-            """,
-            (graph_name, int(entity_id)),
-        )
+        cursor.execute(*_age_entity_query(graph_name, entity_id))
         result = cursor.fetchone()
         if result:
             entity = result[0]
             return vertex_ag_to_retrieved_entity(graph_name, entity)
         raise ValueError("No entity created or returned by the query.")
+
+
+@metrics.observe_age_function
+async def aget_age_entity(graph_name, entity_id) -> RetrievedEntity:
+
+    async with agraph_cursor() as cursor:
+        await cursor.execute(*_age_entity_query(graph_name, entity_id))
+        result = await cursor.fetchone()
+        if result:
+            entity = result[0]
+            return vertex_ag_to_retrieved_entity(graph_name, entity)
+        raise ValueError("No entity created or returned by the query.")
     
     
+# AGE graph ids carry the id of their label in the upper 16 bits
+LABEL_ID_SHIFT = 48
+
+# label id -> label name of the vertex labels, per graph. Labels are never
+# renumbered, so the mapping only has to be refreshed for unknown labels.
+_vertex_labels: dict[str, dict[int, str]] = {}
+
+
+def _vertex_labels_query(graph_name):
+    return (
+        """
+        SELECT l.id, l.name
+        FROM ag_catalog.ag_label l
+        JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+        WHERE g.name = %s AND l.kind = 'v' AND l.name <> '_ag_label_vertex';
+        """,
+        (graph_name,),
+    )
+
+
+def _age_entities_query(graph_name, label: str | None, entity_ids):
+    match = f"(n:`{label}`)" if label else "(n)"
+    return (
+        f"""
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH {match} WHERE id(n) IN [{", ".join(str(int(i)) for i in entity_ids)}]
+            RETURN n
+        $$) as (n agtype);
+        """,
+        (graph_name,),
+    )
+
+
+def _group_by_label(graph_name, entity_ids) -> dict[str | None, list[int]]:
+    labels = _vertex_labels.get(graph_name, {})
+    groups = {}
+    for entity_id in entity_ids:
+        label = labels.get(int(entity_id) >> LABEL_ID_SHIFT)
+        groups.setdefault(label, []).append(int(entity_id))
+    return groups
+
+
+def _needs_labels(graph_name, entity_ids) -> bool:
+    labels = _vertex_labels.get(graph_name)
+    return labels is None or any(
+        int(entity_id) >> LABEL_ID_SHIFT not in labels for entity_id in entity_ids
+    )
+
+
+@metrics.observe_age_function
+def get_age_entities(graph_name, entity_ids) -> list[RetrievedEntity]:
+    """Retrieve many vertices of a graph with one query per label
+
+    Vertices that do not exist are left out of the result.
+    """
+    with graph_cursor() as cursor:
+        if _needs_labels(graph_name, entity_ids):
+            cursor.execute(*_vertex_labels_query(graph_name))
+            _vertex_labels[graph_name] = dict(cursor.fetchall())
+
+        entities = []
+        for label, ids in _group_by_label(graph_name, entity_ids).items():
+            cursor.execute(*_age_entities_query(graph_name, label, ids))
+            entities += [
+                vertex_ag_to_retrieved_entity(graph_name, row[0])
+                for row in cursor.fetchall()
+            ]
+        return entities
+
+
+@metrics.observe_age_function
+async def aget_age_entities(graph_name, entity_ids) -> list[RetrievedEntity]:
+    """Async version of `get_age_entities`"""
+    async with agraph_cursor() as cursor:
+        if _needs_labels(graph_name, entity_ids):
+            await cursor.execute(*_vertex_labels_query(graph_name))
+            _vertex_labels[graph_name] = dict(await cursor.fetchall())
+
+        entities = []
+        for label, ids in _group_by_label(graph_name, entity_ids).items():
+            await cursor.execute(*_age_entities_query(graph_name, label, ids))
+            entities += [
+                vertex_ag_to_retrieved_entity(graph_name, row[0])
+                for row in await cursor.fetchall()
+            ]
+        return entities
+
+
+@metrics.observe_age_function
 def get_age_entity_by_category_and_external_id(category: models.EntityCategory, external_id) -> RetrievedEntity:
 
     with graph_cursor() as cursor:
@@ -1249,6 +1569,7 @@ def get_age_entity_by_category_and_external_id(category: models.EntityCategory,
         raise ValueError("No entity created or returned by the query.")
     
     
+@metrics.observe_age_function
 def get_entities(filters: typing.Optional["filters.EntityFilter"], pagination: typing.Optional["pagination.GraphPaginationInput"] = None) -> RetrievedEntity:
     from core import models, filters as f, pagination as p
     
@@ -1262,7 +1583,6 @@ def get_entities(filters: typing.Optional["filters.EntityFilter"], pagination: t
     
     match_statements = []
     
-    print(filters)
     
     if filters.graph:
         base_qs = base_qs.filter(
@@ -1338,8 +1658,6 @@ def get_entities(filters: typing.Optional["filters.EntityFilter"], pagination: t
     
 
     FINAL_MATCH = " AND ".join(match_statements)
-    print("Final match", FINAL_MATCH)
-    print("Graphname", graph_name)
         
     final_query = f"""
             SELECT *
@@ -1350,7 +1668,6 @@ def get_entities(filters: typing.Optional["filters.EntityFilter"], pagination: t
     """
     
     
-    print("Final query", final_query, query_params)
     
 
     with graph_cursor() as cursor:
@@ -1359,7 +1676,6 @@ def get_entities(filters: typing.Optional["filters.EntityFilter"], pagination: t
             query_params,
         )
         result = cursor.fetchall()
-        print("Retrieved this result", result)
         if result:
             return [
                 vertex_ag_to_retrieved_entity(graph_name, metric[0]) for metric in result
@@ -1368,6 +1684,7 @@ def get_entities(filters: typing.Optional["filters.EntityFilter"], pagination: t
             return []
 
 
+@metrics.observe_age_function
 def get_reagents(filters: typing.Optional["filters.ReagentFilter"], pagination: typing.Optional["pagination.GraphPaginationInput"] = None) -> RetrievedEntity:
     from core import models, filters as f, pagination as p
     
@@ -1381,7 +1698,6 @@ def get_reagents(filters: typing.Optional["filters.ReagentFilter"], pagination:
     
     match_statements = []
     
-    print(filters)
     
     if filters.graph:
         base_qs = base_qs.filter(
@@ -1458,8 +1774,6 @@ def get_reagents(filters: typing.Optional["filters.ReagentFilter"], pagination:
     
 
     FINAL_MATCH = " AND ".join(match_statements)
-    print("Final match", FINAL_MATCH)
-    print("Graphname", graph_name)
         
     final_query = f"""
             SELECT *
@@ -1470,7 +1784,6 @@ def get_reagents(filters: typing.Optional["filters.ReagentFilter"], pagination:
     """
     
     
-    print("Final query", final_query, query_params)
     
 
     with graph_cursor() as cursor:
@@ -1479,7 +1792,6 @@ def get_reagents(filters: typing.Optional["filters.ReagentFilter"], pagination:
             query_params,
         )
         result = cursor.fetchall()
-        print("Retrieved this result", result)
         if result:
             return [
                 vertex_ag_to_retrieved_entity(graph_name, metric[0]) for metric in result
@@ -1488,6 +1800,7 @@ def get_reagents(filters: typing.Optional["filters.ReagentFilter"], pagination:
             return []
 
 
+@metrics.observe_age_function
 def select_measurements_for_structure(graph_name, structure_id, categories: list["models.MeasurementCategory"]):
     with graph_cursor() as cursor:
         cursor.execute(
@@ -1511,6 +1824,7 @@ def select_measurements_for_structure(graph_name, structure_id, categories: list
             return []
 
 
+@metrics.observe_age_function
 def get_age_structure(graph_name, structure_identifier) -> RetrievedEntity:
 
     with graph_cursor() as cursor:
@@ -1532,6 +1846,7 @@ def get_age_structure(graph_name, structure_identifier) -> RetrievedEntity:
         raise ValueError("No entity created or returned by the query.")
     
     
+@metrics.observe_age_function
 def get_age_structure_by_object(structure: "models.StructureCategory", object: str) -> RetrievedEntity:
 
     with graph_cursor() as cursor:
@@ -1554,20 +1869,25 @@ def get_age_structure_by_object(structure: "models.StructureCategory", object: s
         raise ValueError("No entity created or returned by the query.")
 
 
+def _age_entity_relation_query(graph_name, edge_id):
+    return (
+        """
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH (a)-[e]->(b) 
+            WHERE id(e) = %s
+            RETURN e
+        $$) as (e agtype);
+        """,
+        (graph_name, int(edge_id)),
+    )
+
+
+@metrics.observe_age_function
 def get_age_entity_relation(graph_name, edge_id) -> RetrievedRelation:
 
     with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (a)-[e]->(b) 
-                WHERE id(e) = %s
-                RETURN e
-            $$) as (e agtype);
-            """,
-            (graph_name, int(edge_id)),
-        )
+        cursor.execute(*_age_entity_relation_query(graph_name, edge_id))
         result = cursor.fetchone()
         if result:
             relation = result[0]
@@ -1575,29 +1895,54 @@ def get_age_entity_relation(graph_name, edge_id) -> RetrievedRelation:
         raise ValueError("No entityrelation found by the query.")
 
 
+@metrics.observe_age_function
+async def aget_age_entity_relation(graph_name, edge_id) -> RetrievedRelation:
+
+    async with agraph_cursor() as cursor:
+        await cursor.execute(*_age_entity_relation_query(graph_name, edge_id))
+        result = await cursor.fetchone()
+        if result:
+            relation = result[0]
+            return edge_ag_to_retrieved_relation(graph_name, relation)
+        raise ValueError("No entityrelation found by the query.")
+
+
+def _age_metrics_query(graph_name, node_id):
+    return (
+        """
+        SELECT * 
+        FROM cypher(%s, $$
+                MATCH (a)-[r]->(a)
+                WHERE id(a) = %s
+                RETURN r
+        $$) AS (r agtype);
+        """,
+        (graph_name, int(node_id)),
+    )
+
+
+@metrics.observe_age_function
 def get_age_metrics(graph_name, node_id):
     with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                    MATCH (a)-[r]->(a)
-                    WHERE id(a) = %s
-                    RETURN r
-            $$) AS (r agtype);
-            """,
-            (graph_name, int(node_id)),
-        )
-        result = cursor.fetchall()
-        print("Retrieved this result", result)
-        if result:
-            return [
-                edge_ag_to_retrieved_metric(graph_name, metric[0]) for metric in result
-            ]
-        else:
-            return []
+        cursor.execute(*_age_metrics_query(graph_name, node_id))
+        return [
+            edge_ag_to_retrieved_metric(graph_name, metric[0])
+            for metric in cursor.fetchall()
+        ]
 
 
+@metrics.observe_age_function
+async def aget_age_metrics(graph_name, node_id):
+    async with agraph_cursor() as cursor:
+        await cursor.execute(*_age_metrics_query(graph_name, node_id))
+        return [
+            edge_ag_to_retrieved_metric(graph_name, metric[0])
+            for metric in await cursor.fetchall()
+        ]
+
+
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_relation_metric(graph_name, metric_name, edge_id, value):
     # We need to add temporal support
     # __valid_from = timestamp or None (None means it is valid from the beginning)
@@ -1607,7 +1952,7 @@ def create_age_relation_metric(graph_name, metric_name, edge_id, value):
     # metric_one = value
     # metric_two = value
 
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         cursor.execute(
             f"""SELECT * FROM cypher(%s, $$
                 MATCH ()-[r]-() WHERE id(r) = %s
@@ -1621,7 +1966,8 @@ def create_age_relation_metric(graph_name, metric_name, edge_id, value):
 
         if result:
             edge = result[0]
-            return edge_ag_to_retrieved_relation(graph_name, edge)
+            relation = edge_ag_to_retrieved_relation(graph_name, edge)
+            return changelog.recorded(cursor, changelog.UPDATED, relation)
 
         else:
             existence_query = """
@@ -1643,8 +1989,10 @@ def create_age_relation_metric(graph_name, metric_name, edge_id, value):
             raise ValueError("No entity created or returned by the query.")
 
 
+@metrics.observe_age_function
+@render_cache.invalidates_graph
 def create_age_relation(category: "models.RelationCategory", left_id, right_id):
-    with graph_cursor() as cursor:
+    with graph_transaction() as cursor:
         cursor.execute(
             f"""
             SELECT * 
@@ -1659,7 +2007,8 @@ def create_age_relation(category: "models.RelationCategory", left_id, right_id):
         )
         result = cursor.fetchone()
         if result:
-            return edge_ag_to_retrieved_relation(category.graph.age_name, result[0])
+            relation = edge_ag_to_retrieved_relation(category.graph.age_name, result[0])
+            return changelog.recorded(cursor, changelog.CREATED, relation)
         else:
             existence_query = """
                 SELECT count(*)
@@ -1689,340 +2038,515 @@ def to_graph_id(id):
     return id.split(":")[0]
 
 
-def select_all_entities(
+def _select_all_entities_query(
     graph_name,
     pagination: pagination.GraphPaginationInput,
     filter: filters.EntityFilter,
 ):
-    with graph_cursor() as cursor:
+    WHERE = ""
 
-        WHERE = ""
+    and_clauses = []
 
-        and_clauses = []
+    if filter:
 
-        if filter:
+        if filter.ids:
+            and_clauses.append(
+                f'id(n) IN [ {", ".join([to_entity_id(id) for id in filter.ids])}]'
+            )
 
-            if filter.ids:
-                and_clauses.append(
-                    f'id(n) IN [ {", ".join([to_entity_id(id) for id in filter.ids])}]'
-                )
+        if filter.search:
+            and_clauses.append(f'n.Label STARTS WITH "{filter.search}"')
 
-            if filter.search:
-                and_clauses.append(f'n.Label STARTS WITH "{filter.search}"')
+        if filter.linked_expression:
+            expression = models.LinkedExpression.objects.get(
+                id=filter.linked_expression
+            )
+            and_clauses.append(f'label(n) = "{expression.age_name}"')
 
-            if filter.linked_expression:
-                expression = models.LinkedExpression.objects.get(
-                    id=filter.linked_expression
-                )
-                and_clauses.append(f'label(n) = "{expression.age_name}"')
+        if and_clauses:
+            WHERE = "WHERE " + " AND ".join(and_clauses)
 
-            if and_clauses:
-                WHERE = "WHERE " + " AND ".join(and_clauses)
+    return (
+        f"""
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH (n)
+            {WHERE}
+            RETURN n
+            ORDER BY id(n)
+            SKIP %s
+            LIMIT %s
+        $$) as (n agtype);
+        """,
+        [graph_name, pagination.offset or 0, pagination.limit or 200],
+    )
 
-        print(WHERE)
 
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (n)
-                {WHERE}
-                RETURN n
-                ORDER BY id(n)
-                SKIP %s
-                LIMIT %s
-            $$) as (n agtype);
-            """,
-            [graph_name, pagination.offset or 0, pagination.limit or 200],
-        )
+@metrics.observe_age_function
+def select_all_entities(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    filter: filters.EntityFilter,
+):
+    rows = stream_graph_rows(
+        *_select_all_entities_query(graph_name, pagination, filter)
+    )
+    with closing(rows):
+        for result in rows:
+            yield vertex_ag_to_retrieved_entity(graph_name, result[0])
 
-        if cursor.rowcount == 0:
-            return []
 
-        for result in cursor.fetchall():
-            print(result)
+@metrics.observe_age_function
+async def aselect_all_entities(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    filter: filters.EntityFilter,
+):
+    query = await sync_to_async(_select_all_entities_query)(
+        graph_name, pagination, filter
+    )
+
+    async with aclosing(astream_graph_rows(*query)) as rows:
+        async for result in rows:
             yield vertex_ag_to_retrieved_entity(graph_name, result[0])
 
 
+def _select_latest_nodes_query(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    filter: filters.EntityFilter,
+):
+    return (
+        """
+        SELECT *
+        FROM cypher(%s, $$
+            MATCH (n)
+            RETURN n
+            ORDER BY n.__created_at DESC
+            SKIP %s
+            LIMIT %s
+        $$) as (n agtype);
+        """,
+        [graph_name, pagination.offset or 0, pagination.limit or 200],
+    )
+
+
+@metrics.observe_age_function
 def select_latest_nodes(
     graph_name,
     pagination: pagination.GraphPaginationInput,
     filter: filters.EntityFilter,
 ):
 
-    with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT *
-            FROM cypher(%s, $$
-                MATCH (n)
-                RETURN n
-                ORDER BY n.__created_at DESC
-                SKIP %s
-                LIMIT %s
-            $$) as (n agtype);
-            """,
-            [graph_name, pagination.offset or 0, pagination.limit or 200],
-        )
+    rows = stream_graph_rows(
+        *_select_latest_nodes_query(graph_name, pagination, filter)
+    )
+    with closing(rows):
+        for result in rows:
+            yield vertex_ag_to_retrieved_entity(graph_name, result[0])
 
-        if cursor.rowcount == 0:
-            return []
 
-        for result in cursor.fetchall():
+@metrics.observe_age_function
+async def aselect_latest_nodes(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    filter: filters.EntityFilter,
+):
+
+    rows = astream_graph_rows(
+        *_select_latest_nodes_query(graph_name, pagination, filter)
+    )
+    async with aclosing(rows):
+        async for result in rows:
             yield vertex_ag_to_retrieved_entity(graph_name, result[0])
 
 
-def select_paired_entities(
+def _select_paired_entities_query(
     graph_name,
     pagination: pagination.GraphPaginationInput,
     relation_filter: filters.EntityRelationFilter | None = None,
     left_filter: filters.EntityFilter | None = None,
     right_filter: filters.EntityFilter | None = None,
 ):
-    with graph_cursor() as cursor:
+    WHERE = ""
 
-        WHERE = ""
+    and_clauses = []
 
-        and_clauses = []
+    if left_filter:
 
-        if left_filter:
+        if left_filter.ids:
+            and_clauses.append(
+                f'id(n) IN [ {", ".join([to_entity_id(id) for id in left_filter.ids])}]'
+            )
 
-            if left_filter.ids:
-                and_clauses.append(
-                    f'id(n) IN [ {", ".join([to_entity_id(id) for id in filter.ids])}]'
-                )
+        if left_filter.search:
+            and_clauses.append(f'n.Label STARTS WITH "{left_filter.search}"')
 
-            if left_filter.search:
-                and_clauses.append(f'n.Label STARTS WITH "{filter.search}"')
+        if left_filter.linked_expression:
+            expression = models.LinkedExpression.objects.get(
+                id=left_filter.linked_expression
+            )
+            and_clauses.append(f'label(n) = "{expression.age_name}"')
 
-            if left_filter.linked_expression:
-                expression = models.LinkedExpression.objects.get(
-                    id=filter.linked_expression
-                )
-                and_clauses.append(f'label(n) = "{expression.age_name}"')
+    if right_filter:
 
-            if and_clauses:
-                WHERE = "WHERE " + " AND ".join(and_clauses)
+        if right_filter.ids:
+            and_clauses.append(
+                f'id(m) IN [ {", ".join([to_entity_id(id) for id in right_filter.ids])}]'
+            )
 
-        if right_filter:
+        if right_filter.search:
+            and_clauses.append(f'm.Label STARTS WITH "{right_filter.search}"')
 
-            if right_filter.ids:
-                and_clauses.append(
-                    f'id(m) IN [ {", ".join([to_entity_id(id) for id in filter.ids])}]'
-                )
+        if right_filter.linked_expression:
+            expression = models.LinkedExpression.objects.get(
+                id=right_filter.linked_expression
+            )
+            and_clauses.append(f'label(m) = "{expression.age_name}"')
 
-            if right_filter.search:
-                and_clauses.append(f'm.Label STARTS WITH "{filter.search}"')
+    if relation_filter:
 
-            if right_filter.linked_expression:
-                expression = models.LinkedExpression.objects.get(
-                    id=filter.linked_expression
-                )
-                and_clauses.append(f'label(m) = "{expression.age_name}"')
+        if relation_filter.left_id:
+            and_clauses.append(f"id(n) = {to_entity_id(relation_filter.left_id)}")
 
-            if and_clauses:
-                WHERE = "WHERE " + " AND ".join(and_clauses)
+        if relation_filter.right_id:
+            and_clauses.append(f"id(m) = {to_entity_id(relation_filter.right_id)}")
 
-        if relation_filter:
+        if not relation_filter.with_self:
+            and_clauses.append(f"id(n) <> id(m)")
 
-            if relation_filter.left_id:
-                and_clauses.append(f"id(n) = {to_entity_id(relation_filter.left_id)}")
+        if relation_filter.ids:
+            and_clauses.append(
+                f'id(e) IN [ {", ".join([to_entity_id(id) for id in relation_filter.ids])}]'
+            )
 
-            if relation_filter.right_id:
-                and_clauses.append(f"id(m) = {to_entity_id(relation_filter.right_id)}")
+        if relation_filter.search:
+            and_clauses.append(f'e.Label STARTS WITH "{relation_filter.search}"')
 
-            if not relation_filter.with_self:
-                and_clauses.append(f"id(n) <> id(m)")
+        if relation_filter.linked_expression:
+            expression = models.LinkedExpression.objects.get(
+                id=relation_filter.linked_expression
+            )
+            and_clauses.append(f'label(e) = "{expression.age_name}"')
 
-            if relation_filter.ids:
-                and_clauses.append(
-                    f'id(e) IN [ {", ".join([to_entity_id(id) for id in relation_filter.ids])}]'
-                )
+    if and_clauses:
+        WHERE = "WHERE " + " AND ".join(and_clauses)
 
-            if relation_filter.search:
-                and_clauses.append(f'e.Label STARTS WITH "{relation_filter.search}"')
+    return (
+        f"""
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH (n) - [e] - (m)
+            {WHERE}
+            RETURN n, m, e
+            SKIP %s
+            LIMIT %s
+        $$) as (n agtype, m agtype, e agtype);
+        """,
+        [graph_name, pagination.offset or 0, pagination.limit or 200],
+    )
 
-            if relation_filter.linked_expression:
-                expression = models.LinkedExpression.objects.get(
-                    id=relation_filter.linked_expression
-                )
-                and_clauses.append(f'label(e) = "{expression.age_name}"')
 
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (n) - [e] - (m)
-                {WHERE}
-                RETURN n, m, e
-                SKIP %s
-                LIMIT %s
-            $$) as (n agtype, m agtype, e agtype);
-            """,
-            [graph_name, pagination.offset or 0, pagination.limit or 200],
+def _to_pair(graph_name, result):
+    return (
+        vertex_ag_to_retrieved_entity(graph_name, result[0]),
+        vertex_ag_to_retrieved_entity(graph_name, result[1]),
+        edge_ag_to_retrieved_relation(graph_name, result[2]),
+    )
+
+
+@metrics.observe_age_function
+def select_paired_entities(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    relation_filter: filters.EntityRelationFilter | None = None,
+    left_filter: filters.EntityFilter | None = None,
+    right_filter: filters.EntityFilter | None = None,
+):
+    rows = stream_graph_rows(
+        *_select_paired_entities_query(
+            graph_name, pagination, relation_filter, left_filter, right_filter
         )
+    )
+    with closing(rows):
+        for result in rows:
+            yield _to_pair(graph_name, result)
 
-        if cursor.rowcount == 0:
-            return []
 
-        for result in cursor.fetchall():
-            print(result)
-            yield vertex_ag_to_retrieved_entity(
-                graph_name, result[0]
-            ), vertex_ag_to_retrieved_entity(
-                graph_name, result[1]
-            ), edge_ag_to_retrieved_relation(
-                graph_name, result[2]
-            )
+@metrics.observe_age_function
+async def aselect_paired_entities(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    relation_filter: filters.EntityRelationFilter | None = None,
+    left_filter: filters.EntityFilter | None = None,
+    right_filter: filters.EntityFilter | None = None,
+):
+    query = await sync_to_async(_select_paired_entities_query)(
+        graph_name, pagination, relation_filter, left_filter, right_filter
+    )
 
+    async with aclosing(astream_graph_rows(*query)) as rows:
+        async for result in rows:
+            yield _to_pair(graph_name, result)
 
-def select_all_relations(
+
+def _select_all_relations_query(
     graph_name,
     pagination: pagination.GraphPaginationInput,
     filter: filters.EntityRelationFilter,
 ):
-    with graph_cursor() as cursor:
+    WHERE = ""
 
-        WHERE = ""
+    and_clauses = []
 
-        and_clauses = []
+    if filter:
 
-        if filter:
+        if filter.left_id:
+            and_clauses.append(f"id(a) = {to_entity_id(filter.left_id)}")
 
-            if filter.left_id:
-                and_clauses.append(f"id(a) = {to_entity_id(filter.left_id)}")
+        if filter.right_id:
+            and_clauses.append(f"id(b) = {to_entity_id(filter.right_id)}")
 
-            if filter.right_id:
-                and_clauses.append(f"id(b) = {to_entity_id(filter.right_id)}")
+        if not filter.with_self:
+            and_clauses.append(f"id(a) <> id(b)")
 
-            if not filter.with_self:
-                and_clauses.append(f"id(a) <> id(b)")
+        if filter.ids:
+            and_clauses.append(
+                f'id(e) IN [ {", ".join([to_entity_id(id) for id in filter.ids])}]'
+            )
 
-            if filter.ids:
-                and_clauses.append(
-                    f'id(e) IN [ {", ".join([to_entity_id(id) for id in filter.ids])}]'
-                )
+        if filter.search:
+            and_clauses.append(f'e.Label STARTS WITH "{filter.search}"')
 
-            if filter.search:
-                and_clauses.append(f'e.Label STARTS WITH "{filter.search}"')
+        if filter.linked_expression:
+            expression = models.LinkedExpression.objects.get(
+                id=filter.linked_expression
+            )
+            and_clauses.append(f'label(e) = "{expression.age_name}"')
 
-            if filter.linked_expression:
-                expression = models.LinkedExpression.objects.get(
-                    id=filter.linked_expression
-                )
-                and_clauses.append(f'label(e) = "{expression.age_name}"')
+        if and_clauses:
+            WHERE = "WHERE " + " AND ".join(and_clauses)
 
-            if and_clauses:
-                WHERE = "WHERE " + " AND ".join(and_clauses)
+    return (
+        f"""
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH (a) - [e] - (b)
+            {WHERE}
+            RETURN e
+            ORDER BY id(e)
+            SKIP %s
+            LIMIT %s
+        $$) as (e agtype);
+        """,
+        [graph_name, pagination.offset or 0, pagination.limit or 200],
+    )
 
-        print(WHERE)
 
-        try:
+@metrics.observe_age_function
+def select_all_relations(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    filter: filters.EntityRelationFilter,
+):
+    try:
+        rows = stream_graph_rows(
+            *_select_all_relations_query(graph_name, pagination, filter)
+        )
+        with closing(rows):
+            for result in rows:
+                yield edge_ag_to_retrieved_relation(graph_name, result[0])
 
-            cursor.execute(
-                f"""
-                SELECT * 
-                FROM cypher(%s, $$
-                    MATCH (a) - [e] - (b)
-                    {WHERE}
-                    RETURN e
-                    ORDER BY id(e)
-                    SKIP %s
-                    LIMIT %s
-                $$) as (e agtype);
-                """,
-                [graph_name, pagination.offset or 0, pagination.limit or 200],
-            )
+    except Exception as e:
+        return []
 
-            print("here")
 
-            if cursor.rowcount == 0:
-                print("No results")
-                return []
+@metrics.observe_age_function
+async def aselect_all_relations(
+    graph_name,
+    pagination: pagination.GraphPaginationInput,
+    filter: filters.EntityRelationFilter,
+):
+    query = await sync_to_async(_select_all_relations_query)(
+        graph_name, pagination, filter
+    )
 
-            for result in cursor.fetchall():
-                print(result)
+    try:
+        async with aclosing(astream_graph_rows(*query)) as rows:
+            async for result in rows:
                 yield edge_ag_to_retrieved_relation(graph_name, result[0])
 
-        except Exception as e:
-            print("Error", e)
-            print(e)
-            return []
+    except Exception as e:
+        return
+
 
+def _relations_query(
+    graph_name,
+    entity_id,
+    direction: typing.Literal["both", "right", "left"] = "both",
+):
+    if direction == "right":
+        pattern = "(a)-[r]->(b)"
+        returns = "id(r), type(r), id(a), id(b), properties(r)"
+    elif direction == "left":
+        pattern = "(a)<-[r]-(b)"
+        returns = "id(r), type(r), id(b), id(a), properties(r)"
+    else:
+        pattern = "(a)-[r]-(b)"
+        returns = "id(r), type(r), id(a), id(b), properties(r)"
+
+    return (
+        f"""
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH {pattern} WHERE id(a) = %s
+            RETURN {returns}
+        $$) as (rel_id agtype, rel_type agtype, start_id agtype, end_id agtype, rel_props agtype);
+        """,
+        [graph_name, entity_id],
+    )
 
+
+def _row_to_retrieved_relation(graph_name, result):
+    return RetrievedRelation(
+        id=result[0],
+        kind_age_name=result[1],
+        left_id=result[2],
+        right_id=result[3],
+        properties=result[4],
+        graph_name=graph_name,
+    )
+
+
+@metrics.observe_age_function
 def get_age_relations(graph_name, entity_id):
-    with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (a)-[r]-(b) WHERE id(a) = %s
-                RETURN id(r), type(r), id(a), id(b), properties(r)
-            $$) as (rel_id agtype, rel_type agtype, start_id agtype, end_id agtype, rel_props agtype);
-            """,
-            [graph_name, entity_id],
-        )
-        for result in cursor.fetchall():
-            print(result)
-            yield RetrievedRelation(
-                id=result[0],
-                kind_age_name=result[1],
-                left_id=result[2],
-                right_id=result[3],
-                properties=json.loads(result[4]),
-                graph_name=graph_name,
-            )
+    with closing(stream_graph_rows(*_relations_query(graph_name, entity_id))) as rows:
+        for result in rows:
+            yield _row_to_retrieved_relation(graph_name, result)
 
 
+@metrics.observe_age_function
 def get_right_relations(graph_name, entity_id):
-    with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (a)-[r]->(b) WHERE id(a) = %s
-                RETURN id(r), type(r), id(a), id(b), properties(r)
-            $$) as (rel_id agtype, rel_type agtype, start_id agtype, end_id agtype, rel_props agtype);
-            """,
-            [graph_name, entity_id],
-        )
-        for result in cursor.fetchall():
-            print(result)
-            yield RetrievedRelation(
-                id=result[0],
-                kind_age_name=result[1],
-                left_id=result[2],
-                right_id=result[3],
-                properties=json.loads(result[4]),
-                graph_name=graph_name,
-            )
+    rows = stream_graph_rows(
+        *_relations_query(graph_name, entity_id, "right")
+    )
+    with closing(rows):
+        for result in rows:
+            yield _row_to_retrieved_relation(graph_name, result)
 
 
+@metrics.observe_age_function
 def get_left_relations(graph_name, entity_id):
-    with graph_cursor() as cursor:
-        cursor.execute(
-            f"""
-            SELECT * 
-            FROM cypher(%s, $$
-                MATCH (a)<-[r]-(b) WHERE id(a) = %s
-                RETURN id(r), type(r), id(b), id(a), properties(r)
-            $$) as (rel_id agtype, rel_type agtype, start_id agtype, end_id agtype, rel_props agtype);
-            """,
-            [graph_name, entity_id],
+    rows = stream_graph_rows(*_relations_query(graph_name, entity_id, "left"))
+    with closing(rows):
+        for result in rows:
+            yield _row_to_retrieved_relation(graph_name, result)
+
+
+@metrics.observe_age_function
+async def aget_age_relations(graph_name, entity_id):
+    rows = astream_graph_rows(*_relations_query(graph_name, entity_id))
+    async with aclosing(rows):
+        async for result in rows:
+            yield _row_to_retrieved_relation(graph_name, result)
+
+
+@metrics.observe_age_function
+async def aget_right_relations(graph_name, entity_id):
+    rows = astream_graph_rows(
+        *_relations_query(graph_name, entity_id, "right")
+    )
+    async with aclosing(rows):
+        async for result in rows:
+            yield _row_to_retrieved_relation(graph_name, result)
+
+
+@metrics.observe_age_function
+async def aget_left_relations(graph_name, entity_id):
+    rows = astream_graph_rows(
+        *_relations_query(graph_name, entity_id, "left")
+    )
+    async with aclosing(rows):
+        async for result in rows:
+            yield _row_to_retrieved_relation(graph_name, result)
+
+
+def _neighbourhood_query(
+    graph_name,
+    entity_ids,
+    direction: typing.Literal["both", "right", "left"] = "both",
+    label: str | None = None,
+    with_self: bool = True,
+    limit: int | None = None,
+):
+    if direction == "right":
+        pattern = "(a)-[r]->(b)"
+    elif direction == "left":
+        pattern = "(a)<-[r]-(b)"
+    else:
+        pattern = "(a)-[r]-(b)"
+
+    and_clauses = [f'id(a) IN [{", ".join(str(int(i)) for i in entity_ids)}]']
+    if label:
+        and_clauses.append(f'label(r) = "{label}"')
+    if not with_self:
+        and_clauses.append("id(a) <> id(b)")
+
+    # A limit is applied per vertex in the database, so hub vertices do not
+    # send all of their edges
+    limited = ""
+    if limit is not None:
+        limited = f"""
+            WITH a, r
+            ORDER BY id(a), id(r)
+            WITH a, collect(r)[0..{int(limit)}] AS edges
+            UNWIND edges AS r"""
+
+    return (
+        f"""
+        SELECT * 
+        FROM cypher(%s, $$
+            MATCH {pattern}
+            WHERE {" AND ".join(and_clauses)}{limited}
+            RETURN id(a), r
+            ORDER BY id(a), id(r)
+        $$) as (node_id agtype, r agtype);
+        """,
+        [graph_name],
+    )
+
+
+@metrics.observe_age_function
+async def aget_neighbourhoods(
+    graph_name,
+    entity_ids,
+    direction: typing.Literal["both", "right", "left"] = "both",
+    label: str | None = None,
+    with_self: bool = True,
+    limit: int | None = None,
+) -> dict[int, list[RetrievedRelation]]:
+    """Retrieve the incident edges of many vertices in a single query
+
+    The edges are grouped by vertex id and ordered by their id. All edges
+    are returned, or at most `limit` per vertex.
+    """
+    neighbourhoods = {int(entity_id): [] for entity_id in entity_ids}
+
+    rows = astream_graph_rows(
+        *_neighbourhood_query(
+            graph_name, entity_ids, direction, label, with_self, limit
         )
-        for result in cursor.fetchall():
-            print(result)
-            yield RetrievedRelation(
-                id=result[0],
-                kind_age_name=result[1],
-                left_id=result[2],
-                right_id=result[3],
-                properties=json.loads(result[4]),
-                graph_name=graph_name,
+    )
+    async with aclosing(rows):
+        async for node_id, edge in rows:
+            neighbourhoods.setdefault(int(node_id), []).append(
+                edge_ag_to_retrieved_relation(graph_name, edge)
             )
 
+    return neighbourhoods
 
 
+@metrics.observe_age_function
 def create_age_sequence(
     sequence: "models.GraphSequence"
 ) -> RetrievedEntity:
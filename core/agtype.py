@@ -0,0 +1,341 @@
+from contextvars import ContextVar
+import copy
+import re
+import sys
+import time
+import typing
+import psycopg
+import ujson
+from strawberry.types.graphql import OperationType
+from psycopg.adapt import Loader
+from psycopg.types import TypeInfo
+from strawberry.extensions import SchemaExtension
+from core import age
+from core.metrics import EDGES_DECODED, VERTICES_DECODED
+from core.tracing import current_execution
+
+
+VERTEX_SUFFIX = "::vertex"
+EDGE_SUFFIX = "::edge"
+PATH_SUFFIX = "::path"
+PROPERTIES_KEY = '"properties":'
+AGTYPE_MARKER = "__agtype__"
+
+# Tokens the path tokenizer cares about: whole strings (so braces and
+# annotations inside of them are skipped) and braces.
+path_token_pattern = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]')
+bytes_path_token_pattern = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]')
+
+# Matches annotations outside of strings. Strings are matched (and kept) as a
+# whole so that e.g. a property value "a::vertex" is left untouched.
+annotation_pattern = re.compile(
+    r'"[^"\\]*(?:\\.[^"\\]*)*"|\}::(vertex|edge)|::(?:path|numeric)'
+)
+
+
+# The id of a vertex or edge, which AGE always writes first
+element_id_pattern = re.compile(r'\{\s*"id"\s*:\s*(\d+)')
+bytes_element_id_pattern = re.compile(rb'\{\s*"id"\s*:\s*(\d+)')
+
+# (graph_name, id) -> the vertex/edge decoded first within the operation,
+# see `IdentityMapExtension`. Elements decoded without their graph (by the
+# AgtypeLoader) are held as (None, id) -> (text, element).
+identity_map: ContextVar[dict | None] = ContextVar("identity_map", default=None)
+
+
+def _annotate(match: re.Match) -> str:
+    kind = match.group(1)
+    if kind:
+        return f',"{AGTYPE_MARKER}":"{kind}"}}'
+    if match.group(0)[0] == '"':
+        return match.group(0)
+    return ""
+
+
+def to_entity(
+    graph_name: str | None, vertex: dict, raw_properties: str | bytes | None = None
+) -> "age.RetrievedEntity":
+    VERTICES_DECODED.inc()
+    return age.RetrievedEntity(
+        graph_name=graph_name,
+        id=vertex["id"],
+        kind_age_name=sys.intern(vertex["label"]),
+        properties=None if raw_properties else vertex.get("properties") or {},
+        raw_properties=raw_properties,
+    )
+
+
+def to_relation(
+    graph_name: str | None, edge: dict, raw_properties: str | bytes | None = None
+) -> "age.RetrievedRelation":
+    EDGES_DECODED.inc()
+    return age.RetrievedRelation(
+        graph_name=graph_name,
+        id=edge["id"],
+        kind_age_name=sys.intern(edge["label"]),
+        left_id=edge["start_id"],
+        right_id=edge["end_id"],
+        properties=None if raw_properties else edge.get("properties") or {},
+        raw_properties=raw_properties,
+    )
+
+
+def _split_properties(data: str | bytes):
+    """Split a vertex/edge object into its decoded header and raw properties
+
+    AGE always writes the properties last, so everything before them (id,
+    label, start_id, end_id) is decoded right away and the properties text
+    is kept for decoding on first access.
+    """
+    key = PROPERTIES_KEY if isinstance(data, str) else PROPERTIES_KEY.encode()
+    index = data.find(key)
+    if index == -1:
+        return ujson.loads(data), None
+
+    header = data[:index].rstrip()[:-1] + data[-1:]
+    raw_properties = data[index + len(key) : -1].strip()
+    return ujson.loads(header), raw_properties
+
+
+def _identified(graph_name: str | None, data: str | bytes, decode):
+    """Decode an element unless the identity map already holds it"""
+    elements = identity_map.get()
+    if elements is None:
+        return decode(graph_name, *_split_properties(data))
+
+    pattern = (
+        element_id_pattern if isinstance(data, str) else bytes_element_id_pattern
+    )
+    match = pattern.match(data)
+    if match is None:
+        return decode(graph_name, *_split_properties(data))
+
+    if graph_name is not None:
+        key = (graph_name, int(match.group(1)))
+        element = elements.get(key)
+        if element is None:
+            element = elements[key] = decode(graph_name, *_split_properties(data))
+        return element
+
+    # Ids are only unique within a graph, so without the graph an element
+    # is only shared if its text is the same (see `canonical`)
+    key = (None, int(match.group(1)))
+    entry = elements.get(key)
+    if entry is not None and entry[0] == data:
+        return entry[1]
+
+    element = decode(None, *_split_properties(data))
+    if entry is None:
+        elements[key] = (data, element)
+    return element
+
+
+def lazy_entity(graph_name: str | None, data: str | bytes) -> "age.RetrievedEntity":
+    return _identified(graph_name, data, to_entity)
+
+
+def lazy_relation(
+    graph_name: str | None, data: str | bytes
+) -> "age.RetrievedRelation":
+    return _identified(graph_name, data, to_relation)
+
+
+def canonical(graph_name: str, element):
+    """Bind an element to its graph and return the shared instance of it
+
+    Elements that were decoded without knowing their graph (e.g. by the
+    AgtypeLoader) are registered in (or replaced by the entry of) the
+    identity map once their graph is known. An element that is already
+    bound to another graph (the same text in two graphs) is copied.
+    """
+    graph_name = sys.intern(graph_name)
+    if element.graph_name is not None and element.graph_name != graph_name:
+        element = copy.copy(element)
+    element.graph_name = graph_name
+    elements = identity_map.get()
+    if elements is None:
+        return element
+    return elements.setdefault((element.graph_name, element.id), element)
+
+
+def _resolve(value, graph_name: str | None):
+    if isinstance(value, dict):
+        kind = value.pop(AGTYPE_MARKER, None)
+        if kind == "vertex":
+            return to_entity(graph_name, value)
+        if kind == "edge":
+            return to_relation(graph_name, value)
+        return {key: _resolve(item, graph_name) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [_resolve(item, graph_name) for item in value]
+
+    return value
+
+
+def iter_path(data: str | bytes, graph_name: str | None = None):
+    """Yield the vertices and edges of an agtype path (or any agtype text)
+
+    Walks the text once: strings are skipped as a whole, braces are tracked
+    on a stack and every object that is directly followed by a ::vertex or
+    ::edge annotation is decoded and yielded as soon as it is closed. This
+    stays linear in the size of the input, independent of how deeply the
+    property maps are nested or how long the path is.
+    """
+    if isinstance(data, str):
+        pattern, vertex, edge, open_brace = (
+            path_token_pattern,
+            VERTEX_SUFFIX,
+            EDGE_SUFFIX,
+            "{",
+        )
+    else:
+        pattern, vertex, edge, open_brace = (
+            bytes_path_token_pattern,
+            VERTEX_SUFFIX.encode(),
+            EDGE_SUFFIX.encode(),
+            b"{",
+        )
+
+    starts = []
+
+    for match in pattern.finditer(data):
+        token = match.group()
+        if len(token) != 1:
+            continue
+
+        if token == open_brace:
+            starts.append(match.start())
+            continue
+
+        if not starts:
+            raise ValueError("Unbalanced braces in agtype value")
+
+        start = starts.pop()
+        end = match.end()
+
+        if data.startswith(vertex, end):
+            yield lazy_entity(graph_name, data[start:end])
+        elif data.startswith(edge, end):
+            yield lazy_relation(graph_name, data[start:end])
+
+
+def decode_agtype(data: str | bytes, graph_name: str | None = None):
+    """Decode the text representation of an agtype value
+
+    Vertices become RetrievedEntity, edges RetrievedRelation and paths a list
+    of alternating entities and relations. Scalars, lists and maps are
+    decoded like JSON (numerics become floats).
+    """
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode()
+
+    if data.endswith(VERTEX_SUFFIX):
+        return lazy_entity(graph_name, data[: -len(VERTEX_SUFFIX)])
+
+    if data.endswith(EDGE_SUFFIX):
+        return lazy_relation(graph_name, data[: -len(EDGE_SUFFIX)])
+
+    if data.endswith(PATH_SUFFIX):
+        return list(iter_path(data, graph_name))
+
+    if "::" not in data:
+        return ujson.loads(data)
+
+    return _resolve(
+        ujson.loads(annotation_pattern.sub(_annotate, data)), graph_name
+    )
+
+
+def iter_elements(value):
+    """Yield all entities and relations contained in a decoded agtype value"""
+    if isinstance(value, (age.RetrievedEntity, age.RetrievedRelation)):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from iter_elements(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_elements(item)
+
+
+def to_jsonable(value):
+    """Convert a decoded agtype value back into plain JSON data"""
+    if isinstance(value, age.RetrievedEntity):
+        return {
+            "id": value.id,
+            "label": value.kind_age_name,
+            "properties": value.properties,
+        }
+
+    if isinstance(value, age.RetrievedRelation):
+        return {
+            "id": value.id,
+            "label": value.kind_age_name,
+            "start_id": value.left_id,
+            "end_id": value.right_id,
+            "properties": value.properties,
+        }
+
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+
+    return value
+
+
+class AgtypeLoader(Loader):
+    """Psycopg loader that decodes agtype columns with `decode_agtype`
+
+    The graph name is not known to the loader, decoded entities and
+    relations are bound to their graph by the caller. If the fetch is
+    traced, the decode time is added to the traced execution.
+    """
+
+    def load(self, data: typing.Union[bytes, bytearray, memoryview]):
+        execution = current_execution.get()
+        if execution is None:
+            return decode_agtype(bytes(data))
+
+        start = time.perf_counter()
+        try:
+            return decode_agtype(bytes(data))
+        finally:
+            execution.decode += time.perf_counter() - start
+
+
+def register_agtype(connection: psycopg.Connection) -> None:
+    """Register the agtype loader on a connection that has AGE loaded"""
+    info = TypeInfo.fetch(connection, "agtype")
+    if info is not None:
+        connection.adapters.register_loader(info.oid, AgtypeLoader)
+
+
+async def aregister_agtype(connection: psycopg.AsyncConnection) -> None:
+    """Register the agtype loader on an async connection that has AGE loaded"""
+    info = await TypeInfo.fetch(connection, "agtype")
+    if info is not None:
+        connection.adapters.register_loader(info.oid, AgtypeLoader)
+
+
+class IdentityMapExtension(SchemaExtension):
+    """Shares decoded vertices and edges within a query operation
+
+    Vertices and edges that are decoded again (e.g. a hub node in many
+    paths, or a node that is also the endpoint of an edge) resolve to the
+    instance that was decoded first. Only queries use the map: mutations
+    must see their own writes and subscriptions would grow it unbounded.
+    """
+
+    def on_execute(self):
+        if self.execution_context.operation_type != OperationType.QUERY:
+            yield
+            return
+
+        token = identity_map.set({})
+        try:
+            yield
+        finally:
+            identity_map.reset(token)
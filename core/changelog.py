@@ -0,0 +1,109 @@
+"""Per-graph log of the vertices and edges written by core.age
+
+The create/set functions of core.age record every element they create or
+update through the cursor of the write itself, inside the graph transaction
+of the write (see `core.connection.graph_transaction`), so a change is
+committed or rolled back together with the write it describes. Materialized views use the log to
+refresh their snapshots incrementally (see core.materialized).
+
+Changes are read by commit order, not by id: ids are assigned on insert,
+but a change with a lower id can commit after one with a higher id. So a
+reader remembers the transaction snapshot it read the log in, and next
+reads the changes of all transactions that were not visible in it.
+"""
+
+import datetime
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+
+CREATED = "CREATE"
+UPDATED = "UPDATE"
+DELETED = "DELETE"
+
+
+def change_log_enabled() -> bool:
+    return bool(settings.CHANGE_LOG.get("ENABLED", False))
+
+
+def retention() -> datetime.timedelta:
+    return datetime.timedelta(days=settings.CHANGE_LOG.get("RETENTION_DAYS", 7))
+
+
+def record(cursor, operation: str, *elements) -> None:
+    """Log the elements (RetrievedEntity or RetrievedRelation) as changed"""
+    from core import age, models
+
+    if not elements or not change_log_enabled():
+        return
+
+    params = []
+    for element in elements:
+        kind = "VERTEX" if isinstance(element, age.RetrievedEntity) else "EDGE"
+        params.extend(
+            (element.graph_name, element.id, element.kind_age_name, kind, operation)
+        )
+
+    values = ", ".join(["(%s, %s, %s, %s, %s, now(), txid_current())"] * len(elements))
+    cursor.execute(
+        f'INSERT INTO "{models.GraphChange._meta.db_table}" '
+        "(graph_name, element_id, label, kind, operation, created_at, transaction_id) "
+        f"VALUES {values}",
+        params,
+    )
+
+
+def recorded(cursor, operation: str, element):
+    """Log the element as changed and return it"""
+    record(cursor, operation, element)
+    return element
+
+
+def current_snapshot() -> str:
+    """The transaction snapshot of the database (txid_current_snapshot)"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_current_snapshot()::text")
+        return cursor.fetchone()[0]
+
+
+def parse_snapshot(snapshot: str) -> tuple[int, int, set[int]]:
+    """The xmin, xmax and in progress transactions of a snapshot"""
+    xmin, xmax, in_progress = snapshot.split(":")
+    return int(xmin), int(xmax), {int(x) for x in in_progress.split(",") if x}
+
+
+def is_visible(transaction_id: int, snapshot: str) -> bool:
+    """Whether the transaction was committed when the snapshot was taken"""
+    xmin, xmax, in_progress = parse_snapshot(snapshot)
+    if transaction_id < xmin:
+        return True
+    return transaction_id < xmax and transaction_id not in in_progress
+
+
+def changes_since(graph_name: str, snapshot: str) -> list:
+    """The changes of the graph that were not yet committed in the snapshot
+
+    Take the snapshot for the next read before reading the changes: changes
+    that commit in between are then read twice instead of never.
+    """
+    from core import models
+
+    xmin, _, _ = parse_snapshot(snapshot)
+    changes = models.GraphChange.objects.filter(
+        graph_name=graph_name, transaction_id__gte=xmin
+    ).order_by("id")
+    return [
+        change
+        for change in changes
+        if not is_visible(change.transaction_id, snapshot)
+    ]
+
+
+def prune() -> None:
+    """Delete the changes that are older than the retention period"""
+    from core import models
+
+    models.GraphChange.objects.filter(
+        created_at__lt=timezone.now() - retention()
+    ).delete()
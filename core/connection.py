@@ -0,0 +1,530 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from contextlib import asynccontextmanager, closing, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+import threading
+import uuid
+import weakref
+from django.conf import settings
+from django.db import connections, transaction
+import psycopg
+from psycopg.client_cursor import ClientCursorMixin
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+from core.metrics import OPEN_GRAPH_CURSORS
+from core.tracing import atraced, atraced_stream, traced, traced_stream
+
+
+AGE_SESSION_STATEMENTS = (
+    "LOAD 'age';",
+    'SET search_path = ag_catalog, "$user", public',
+)
+
+
+@dataclass
+class SessionStats:
+    """Counters for the AGE session lifecycle
+
+    initialized counts how often a physical connection was prepared for AGE
+    (LOAD 'age' + search_path), skipped counts how often a graph cursor was
+    handed out without having to run these statements again.
+    """
+
+    initialized: int = 0
+    skipped: int = 0
+
+
+@dataclass
+class OperationCursor:
+    """Holds the cursor that is shared by all graph calls of one operation"""
+
+    cursor: object | None = None
+
+
+session_stats = SessionStats()
+operation_cursor: ContextVar[OperationCursor | None] = ContextVar(
+    "operation_cursor", default=None
+)
+
+_stats_lock = threading.Lock()
+_prepared_connections: "weakref.WeakSet" = weakref.WeakSet()
+
+_pool_lock = threading.Lock()
+_graph_pool: ConnectionPool | None = None
+_async_graph_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncConnectionPool]" = weakref.WeakKeyDictionary()
+
+
+def get_session_stats() -> SessionStats:
+    """Get a snapshot of the AGE session counters"""
+    with _stats_lock:
+        return SessionStats(
+            initialized=session_stats.initialized, skipped=session_stats.skipped
+        )
+
+
+def _count(initialized: int = 0, skipped: int = 0) -> None:
+    with _stats_lock:
+        session_stats.initialized += initialized
+        session_stats.skipped += skipped
+
+
+def prepare_age_session(cursor) -> None:
+    """Load AGE and set the search path on the connection behind the cursor"""
+    for statement in AGE_SESSION_STATEMENTS:
+        cursor.execute(statement)
+    _count(initialized=1)
+
+
+async def aprepare_age_session(cursor) -> None:
+    """Load AGE and set the search path on an async connection"""
+    for statement in AGE_SESSION_STATEMENTS:
+        await cursor.execute(statement)
+    _count(initialized=1)
+
+
+def prepare_django_connection(connection) -> None:
+    """Prepare a django connection for AGE if it is a postgres connection
+
+    Besides loading AGE this registers the agtype loader, so agtype columns
+    arrive decoded (see core.agtype).
+
+    This is called from the connection_created signal, so every physical
+    connection is prepared exactly once, independent of CONN_MAX_AGE.
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        prepare_age_session(cursor)
+
+    _register_agtype(connection.connection)
+    _prepared_connections.add(connection.connection)
+
+
+def _register_agtype(connection) -> None:
+    from core.agtype import register_agtype
+
+    if isinstance(connection, psycopg.Connection):
+        register_agtype(connection)
+
+
+def _ensure_prepared(connection, cursor) -> None:
+    # Connections that were opened before the signal receiver was connected
+    # (e.g. during app loading) still need to be prepared once.
+    if connection.connection in _prepared_connections:
+        _count(skipped=1)
+        return
+
+    prepare_age_session(cursor)
+    _register_agtype(connection.connection)
+    _prepared_connections.add(connection.connection)
+
+
+def graph_pool_enabled() -> bool:
+    """Check if graph queries should run on the dedicated graph pool"""
+    return bool(settings.GRAPH_POOL.get("ENABLED", False))
+
+
+def get_graph_conninfo() -> str:
+    """Build the conninfo for graph connections from the default database"""
+    db = settings.DATABASES["default"]
+    return make_conninfo(
+        dbname=db["NAME"],
+        user=db["USER"],
+        password=db["PASSWORD"],
+        host=db["HOST"],
+        port=db["PORT"],
+        application_name=settings.GRAPH_POOL.get("APPLICATION_NAME", "kraph-graph"),
+    )
+
+
+def configure_graph_connection(connection: psycopg.Connection) -> None:
+    """Pool configure callback, runs once for every new physical connection"""
+    from core.agtype import register_agtype
+
+    with connection.cursor() as cursor:
+        prepare_age_session(cursor)
+
+    register_agtype(connection)
+
+
+async def aconfigure_graph_connection(connection: psycopg.AsyncConnection) -> None:
+    """Async pool configure callback, runs once for every new physical connection"""
+    from core.agtype import aregister_agtype
+
+    async with connection.cursor() as cursor:
+        await aprepare_age_session(cursor)
+
+    await aregister_agtype(connection)
+
+
+def _pool_options() -> dict:
+    config = settings.GRAPH_POOL
+    return dict(
+        min_size=config.get("MIN_SIZE", 1),
+        max_size=config.get("MAX_SIZE", 10),
+        timeout=config.get("TIMEOUT", 30.0),
+        max_idle=config.get("MAX_IDLE", 600.0),
+        max_lifetime=config.get("MAX_LIFETIME", 3600.0),
+    )
+
+
+def get_graph_pool() -> ConnectionPool:
+    """Get (and lazily open) the process wide pool for graph workloads
+
+    The pool is separate from the ORM connections so long running cypher
+    renders do not compete with regular ORM work, and its max size bounds the
+    number of graph connections a worker can open. Connections use
+    client side binding (like the django cursor) because parameters are
+    interpolated into the dollar quoted cypher text.
+    """
+    global _graph_pool
+
+    if _graph_pool is None:
+        with _pool_lock:
+            if _graph_pool is None:
+                _graph_pool = ConnectionPool(
+                    get_graph_conninfo(),
+                    **_pool_options(),
+                    kwargs={
+                        "autocommit": True,
+                        "cursor_factory": psycopg.ClientCursor,
+                    },
+                    configure=configure_graph_connection,
+                    name="graph",
+                    open=True,
+                )
+
+    return _graph_pool
+
+
+def close_graph_pool() -> None:
+    """Close the graph pool (e.g. on shutdown or in tests)"""
+    global _graph_pool
+
+    with _pool_lock:
+        if _graph_pool is not None:
+            _graph_pool.close()
+            _graph_pool = None
+
+
+async def aget_graph_pool() -> AsyncConnectionPool:
+    """Get (and lazily open) the async graph pool of the running event loop
+
+    Async pools are bound to the loop they were opened in, so every loop
+    (usually one per worker) gets its own pool with the GRAPH_POOL sizes.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _async_graph_pools.get(loop)
+
+    if pool is None:
+        pool = AsyncConnectionPool(
+            get_graph_conninfo(),
+            **_pool_options(),
+            kwargs={
+                "autocommit": True,
+                "cursor_factory": psycopg.AsyncClientCursor,
+            },
+            configure=aconfigure_graph_connection,
+            name="graph-async",
+            open=False,
+        )
+        _async_graph_pools[loop] = pool
+
+    await pool.open()
+    return pool
+
+
+def get_pool_stats() -> dict[str, int]:
+    """Get the metrics of the graph pools (empty if no pool is open)"""
+    stats: dict[str, int] = {}
+
+    pools = list(_async_graph_pools.values())
+    if _graph_pool is not None:
+        pools.append(_graph_pool)
+
+    for pool in pools:
+        for key, value in pool.get_stats().items():
+            stats[key] = stats.get(key, 0) + value
+
+    return stats
+
+
+@contextmanager
+def graph_connection():
+    """Get a connection from the graph pool
+
+    The connection is only checked out for the block, so an operation holds
+    a pool connection only while it runs graph queries. Pool connections are
+    prepared once when they are opened.
+    """
+    with get_graph_pool().connection() as connection:
+        _count(skipped=1)
+        yield connection
+
+
+@contextmanager
+def graph_cursor():
+    """Get a cursor that can be used to run AGE (cypher) queries
+
+    Uses the dedicated graph pool if enabled, checking a connection out per
+    cursor. Otherwise the default django connection is used, and if an
+    operation scope is active (see `operation_scope`) its cursor is shared
+    with all other graph calls within that scope and stays open until the
+    scope ends.
+    """
+    if graph_pool_enabled():
+        with graph_connection() as connection:
+            with OPEN_GRAPH_CURSORS.track_inprogress():
+                with connection.cursor() as cursor:
+                    yield traced(cursor)
+        return
+
+    scope = operation_cursor.get()
+    if scope is not None and scope.cursor is not None:
+        yield traced(scope.cursor)
+        return
+
+    connection = connections["default"]
+
+    if scope is not None:
+        cursor = connection.cursor()
+        _ensure_prepared(connection, cursor)
+        scope.cursor = cursor
+        OPEN_GRAPH_CURSORS.inc()
+        yield traced(cursor)
+        return
+
+    with OPEN_GRAPH_CURSORS.track_inprogress():
+        with connection.cursor() as cursor:
+            _ensure_prepared(connection, cursor)
+            yield traced(cursor)
+
+
+@asynccontextmanager
+async def agraph_connection():
+    """Get an async connection from the async graph pool
+
+    Every call checks out its own connection, so concurrent resolvers
+    overlap on database I/O instead of queuing on one connection. Only
+    available with the graph pool, see `agraph_cursor` for the fallback.
+    """
+    pool = await aget_graph_pool()
+
+    async with pool.connection() as connection:
+        _count(skipped=1)
+        yield connection
+
+
+class AsyncCursorAdapter:
+    """Async interface of a sync graph cursor
+
+    The calls run through sync_to_async (thread sensitive), so they use the
+    django connection of the request, which is prepared for AGE once.
+    """
+
+    def __init__(self, cursor):
+        self.sync_cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.sync_cursor, name)
+
+    async def execute(self, query, params=None):
+        return await sync_to_async(self.sync_cursor.execute)(query, params)
+
+    async def fetchone(self):
+        return await sync_to_async(self.sync_cursor.fetchone)()
+
+    async def fetchmany(self, size=None):
+        if size is None:
+            return await sync_to_async(self.sync_cursor.fetchmany)()
+        return await sync_to_async(self.sync_cursor.fetchmany)(size)
+
+    async def fetchall(self):
+        return await sync_to_async(self.sync_cursor.fetchall)()
+
+
+@asynccontextmanager
+async def agraph_cursor():
+    """Get an async cursor that can be used to run AGE (cypher) queries
+
+    Uses the async graph pool if enabled. Otherwise the sync graph cursor of
+    the django connection is used through sync_to_async, instead of opening
+    (and preparing) a new connection for every call.
+    """
+    if not graph_pool_enabled():
+        manager = graph_cursor()
+        cursor = await sync_to_async(manager.__enter__)()
+        try:
+            yield AsyncCursorAdapter(cursor)
+        except BaseException as e:
+            if not await sync_to_async(manager.__exit__)(type(e), e, e.__traceback__):
+                raise
+        else:
+            await sync_to_async(manager.__exit__)(None, None, None)
+        return
+
+    async with agraph_connection() as connection:
+        with OPEN_GRAPH_CURSORS.track_inprogress():
+            async with connection.cursor() as cursor:
+                yield atraced(cursor)
+
+
+class ClientServerCursor(ClientCursorMixin, psycopg.ServerCursor):
+    """Named cursor with client side binding
+
+    Like for the regular graph cursors the parameters have to be
+    interpolated client side, as they end up in the dollar quoted cypher.
+    """
+
+
+class AsyncClientServerCursor(ClientCursorMixin, psycopg.AsyncServerCursor):
+    """Async named cursor with client side binding"""
+
+
+def get_fetch_size() -> int:
+    """Number of rows fetched per round trip when streaming graph results"""
+    return settings.GRAPH_POOL.get("FETCH_SIZE", 500)
+
+
+@contextmanager
+def graph_transaction():
+    """Get a graph cursor whose statements run in a single transaction
+
+    The transaction is committed when the block exits and rolled back if it
+    raises. The statements may also touch the django tables, as the graph
+    lives in the same database.
+    """
+    if graph_pool_enabled():
+        with graph_connection() as connection:
+            with connection.transaction(), OPEN_GRAPH_CURSORS.track_inprogress():
+                with connection.cursor() as cursor:
+                    yield traced(cursor)
+        return
+
+    connection = connections["default"]
+
+    with transaction.atomic(), OPEN_GRAPH_CURSORS.track_inprogress():
+        with connection.cursor() as cursor:
+            _ensure_prepared(connection, cursor)
+            yield traced(cursor)
+
+
+def _cursor_name() -> str:
+    return f"graph_{uuid.uuid4().hex}"
+
+
+@contextmanager
+def graph_server_cursor():
+    """Get a named (server side) cursor for streaming AGE (cypher) results
+
+    The cursor lives in its own transaction, rows are only transferred when
+    they are fetched.
+    """
+    if graph_pool_enabled():
+        with graph_connection() as connection:
+            with connection.transaction(), OPEN_GRAPH_CURSORS.track_inprogress():
+                with ClientServerCursor(connection, _cursor_name()) as raw:
+                    with traced_stream(raw) as cursor:
+                        yield cursor
+        return
+
+    connection = connections["default"]
+
+    with connection.cursor() as cursor:
+        _ensure_prepared(connection, cursor)
+
+    with transaction.atomic(), OPEN_GRAPH_CURSORS.track_inprogress():
+        with connection.chunked_cursor() as raw:
+            with traced_stream(raw) as cursor:
+                yield cursor
+
+
+def _fetch_all(query: str, params: list, fetch_size: int) -> list:
+    with closing(stream_graph_rows(query, params, fetch_size)) as rows:
+        return list(rows)
+
+
+def stream_graph_rows(query: str, params: list, fetch_size: int | None = None):
+    """Execute a query on a server side cursor and yield its rows in batches
+
+    Memory and time to the first row are bounded by the fetch size instead
+    of the size of the result. The cursor's transaction stays open until the
+    generator is exhausted or closed, consumers that might stop early should
+    wrap it in `contextlib.closing`.
+    """
+    fetch_size = fetch_size or get_fetch_size()
+
+    with graph_server_cursor() as cursor:
+        cursor.execute(query, params)
+
+        while rows := cursor.fetchmany(fetch_size):
+            yield from rows
+
+
+async def astream_graph_rows(
+    query: str, params: list, fetch_size: int | None = None
+):
+    """Async version of `stream_graph_rows`
+
+    Without the graph pool the rows are read from the django connection in a
+    single sync_to_async call. The transaction of the server cursor then
+    begins and ends within that call, so concurrent streams of an operation
+    (which share the connection) cannot interleave their atomic blocks. The
+    result is held in memory, only the pool streams it. Consumers that might
+    stop early should wrap it in `contextlib.aclosing`.
+    """
+    fetch_size = fetch_size or get_fetch_size()
+
+    if not graph_pool_enabled():
+        rows = await sync_to_async(_fetch_all)(query, params, fetch_size)
+        for row in rows:
+            yield row
+        return
+
+    async with agraph_connection() as connection:
+        async with connection.transaction():
+            with OPEN_GRAPH_CURSORS.track_inprogress():
+                async with AsyncClientServerCursor(
+                    connection, _cursor_name()
+                ) as raw:
+                    async with atraced_stream(raw) as cursor:
+                        await cursor.execute(query, params)
+
+                        while rows := await cursor.fetchmany(fetch_size):
+                            for row in rows:
+                                yield row
+
+
+@contextmanager
+def operation_scope():
+    """Reuse one django graph cursor for all graph calls within this scope"""
+    scope = OperationCursor()
+    token = operation_cursor.set(scope)
+    try:
+        yield scope
+    finally:
+        operation_cursor.reset(token)
+        if scope.cursor is not None:
+            scope.cursor.close()
+            OPEN_GRAPH_CURSORS.dec()
+
+
+class GraphCursorExtension(SchemaExtension):
+    """Shares one graph cursor across all resolvers of a GraphQL operation
+
+    Only applies to the django connection, graph pool connections are
+    checked out per cursor. Subscriptions run for as long as the client
+    stays subscribed, so they never hold on to a cursor.
+    """
+
+    def on_execute(self):
+        if self.execution_context.operation_type == OperationType.SUBSCRIPTION:
+            yield
+            return
+
+        with operation_scope():
+            yield
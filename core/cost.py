@@ -0,0 +1,222 @@
+import logging
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    get_named_type,
+    is_list_type,
+    is_non_null_type,
+)
+from graphql.utilities import get_operation_ast, value_from_ast_untyped
+from strawberry.extensions import SchemaExtension
+from core.tracing import current_trace
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of AGE queries a single resolution of the field issues. Fields of
+# interfaces also apply to all types implementing them.
+DEFAULT_WEIGHTS = {
+    "Query.node": 1,
+    "Query.nodes": 1,
+    "Query.edges": 1,
+    "Query.entity": 1,
+    "Query.entities": 1,
+    "Query.reagent": 1,
+    "Query.reagents": 1,
+    "Query.structure": 1,
+    "Query.edge": 1,
+    "Query.renderNodeQuery": 5,
+    "Graph.latestNodes": 1,
+    "GraphQuery.render": 5,
+    "NodeQuery.render": 5,
+    "NodeQueryView.render": 5,
+    "Node.edges": 1,
+    "Node.rightEdges": 1,
+    "Node.leftEdges": 1,
+    "Edge.left": 1,
+    "Edge.right": 1,
+}
+
+
+def cost_analysis_settings() -> dict:
+    return getattr(settings, "COST_ANALYSIS", {})
+
+
+def _unwrap_list(type_) -> bool:
+    if is_non_null_type(type_):
+        type_ = type_.of_type
+    return is_list_type(type_)
+
+
+class CostEstimator:
+    """Estimates the AGE query cost of an operation from its document
+
+    Every field costs its weight once per time it is resolved. List fields
+    multiply the cost of their selections by their page size, taken from a
+    `limit` or `pagination: {limit}` argument or DEFAULT_LIST_SIZE. The
+    estimate is an upper bound, batched loaders usually issue fewer queries.
+    """
+
+    def __init__(
+        self,
+        schema,
+        document,
+        variables: dict | None,
+        weights: dict[str, float],
+        default_list_size: int,
+    ):
+        self.schema = schema
+        self.variables = variables or {}
+        self.weights = weights
+        self.default_list_size = default_list_size
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.document = document
+
+    def estimate(self, operation_name: str | None = None) -> float:
+        operation = get_operation_ast(self.document, operation_name)
+        if operation is None:
+            return 0
+
+        root = self.schema.get_root_type(operation.operation)
+        if root is None:
+            return 0
+
+        return self._selection_cost(root, operation.selection_set, 1, set())
+
+    def _weight(self, parent, field_name: str) -> float:
+        for type_ in (parent, *getattr(parent, "interfaces", ())):
+            weight = self.weights.get(f"{type_.name}.{field_name}")
+            if weight is not None:
+                return weight
+        return 0
+
+    def _list_size(self, field: FieldNode) -> int:
+        for argument in field.arguments or ():
+            value = value_from_ast_untyped(argument.value, self.variables)
+            if argument.name.value == "limit" and isinstance(value, int):
+                return value
+            if argument.name.value == "pagination" and isinstance(value, dict):
+                if isinstance(value.get("limit"), int):
+                    return value["limit"]
+        return self.default_list_size
+
+    def _selection_cost(self, parent, selection_set, multiplier, visited) -> float:
+        if selection_set is None:
+            return 0
+
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += self._field_cost(parent, selection, multiplier, visited)
+
+            elif isinstance(selection, InlineFragmentNode):
+                type_ = parent
+                if selection.type_condition is not None:
+                    type_ = self.schema.get_type(selection.type_condition.name.value)
+                cost += self._selection_cost(
+                    type_ or parent, selection.selection_set, multiplier, visited
+                )
+
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                type_ = self.schema.get_type(fragment.type_condition.name.value)
+                cost += self._selection_cost(
+                    type_ or parent,
+                    fragment.selection_set,
+                    multiplier,
+                    visited | {name},
+                )
+
+        return cost
+
+    def _field_cost(self, parent, field: FieldNode, multiplier, visited) -> float:
+        name = field.name.value
+        definition = getattr(parent, "fields", {}).get(name)
+        if definition is None:
+            return 0
+
+        cost = multiplier * self._weight(parent, name)
+        if field.selection_set is None:
+            return cost
+
+        if _unwrap_list(definition.type):
+            multiplier *= self._list_size(field)
+
+        return cost + self._selection_cost(
+            get_named_type(definition.type), field.selection_set, multiplier, visited
+        )
+
+
+class CostAnalysisExtension(SchemaExtension):
+    """Rejects operations whose estimated AGE query cost exceeds the budget
+
+    The estimate runs before validation, so no resolver runs for rejected
+    operations. With MODE "report" (the default) operations are never
+    rejected, those over the budget are logged instead. If REPORT
+    is set, the estimated cost (and the actual number of cypher executions,
+    if tracing is enabled) is added to the response extensions.
+    """
+
+    estimated: float | None = None
+    trace = None
+
+    def on_validate(self):
+        config = cost_analysis_settings()
+        context = self.execution_context
+
+        if config.get("ENABLED", False) and context.graphql_document is not None:
+            self.estimated = CostEstimator(
+                context.schema._schema,
+                context.graphql_document,
+                context.variables,
+                {**DEFAULT_WEIGHTS, **config.get("WEIGHTS", {})},
+                config.get("DEFAULT_LIST_SIZE", 200),
+            ).estimate(context.operation_name)
+
+            budget = config.get("MAX_COST", 10000)
+            if self.estimated > budget:
+                if config.get("MODE", "report") == "reject":
+                    context.pre_execution_errors = [
+                        GraphQLError(
+                            f"Operation is too expensive: estimated cost "
+                            f"{self.estimated:g} exceeds the budget of {budget:g}",
+                            extensions={"cost": self.estimated, "budget": budget},
+                        )
+                    ]
+                else:
+                    logger.warning(
+                        "Operation %s exceeds the cost budget: estimated %g > %g",
+                        context.operation_name,
+                        self.estimated,
+                        budget,
+                    )
+
+        yield
+
+    def on_execute(self):
+        self.trace = current_trace.get()
+        yield
+
+    def get_results(self):
+        if self.estimated is None or not cost_analysis_settings().get("REPORT"):
+            return {}
+
+        return {
+            "cost": {
+                "estimated": self.estimated,
+                "budget": cost_analysis_settings().get("MAX_COST", 10000),
+                "actual": len(self.trace.executions) if self.trace else None,
+            }
+        }
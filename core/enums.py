@@ -134,3 +134,22 @@ class EdgeCategoryKind(str, Enum):
     DESCRIPTION = "DESCRIPTION"
     IN_EVENT = "IN_EVENT"
     OUT_EVENT = "OUT_EVENT"
+
+
+class ExportStatusChoices(TextChoices):
+    """The state of a background export"""
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+@strawberry.enum
+class ExportStatus(str, Enum):
+    """The state of a background export"""
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
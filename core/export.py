@@ -0,0 +1,222 @@
+"""Columnar (Parquet) export of TABLE graph query results
+
+Exports run in a background thread (see `start_export`), the request only
+creates the GraphQueryExport and returns it for polling. The rows are
+streamed from a server side cursor into a temporary newline delimited JSON
+file and converted to Parquet by duckdb, so memory stays bounded by the
+fetch size no matter how large the result is.
+
+Columns are typed by their kind: NODE and EDGE columns hold the age id of
+the element, VALUE columns the type of their value_kind (vectors become
+DOUBLE lists). VALUE columns without a value_kind keep the type duckdb
+infers from the data, so agtype lists and maps become LIST and STRUCT
+columns instead of JSON text.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+import duckdb
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from core import age, agtype, enums, inputs, models
+from core.connection import stream_graph_rows
+from core.datalayer import Datalayer, get_current_datalayer
+
+
+logger = logging.getLogger(__name__)
+
+VECTOR_TYPE = "DOUBLE[]"
+
+VALUE_TYPES = {
+    enums.MetricKind.INT: "BIGINT",
+    enums.MetricKind.FLOAT: "DOUBLE",
+    enums.MetricKind.BOOLEAN: "BOOLEAN",
+    enums.MetricKind.DATETIME: "TIMESTAMPTZ",
+    enums.MetricKind.STRING: "VARCHAR",
+    enums.MetricKind.CATEGORY: "VARCHAR",
+    enums.MetricKind.ONE_D_VECTOR: VECTOR_TYPE,
+    enums.MetricKind.TWO_D_VECTOR: VECTOR_TYPE,
+    enums.MetricKind.THREE_D_VECTOR: VECTOR_TYPE,
+    enums.MetricKind.FOUR_D_VECTOR: VECTOR_TYPE,
+    enums.MetricKind.N_VECTOR: VECTOR_TYPE,
+}
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_type(column: inputs.ColumnInput) -> str | None:
+    """The duckdb type of the column, None if it is inferred from the data"""
+    if column.kind in (enums.ColumnKind.NODE, enums.ColumnKind.EDGE):
+        return "BIGINT"
+    return VALUE_TYPES.get(column.value_kind)
+
+
+def to_cell(value):
+    """Convert a decoded agtype value to its JSON cell"""
+    if isinstance(value, (age.RetrievedEntity, age.RetrievedRelation)):
+        return value.id
+    return agtype.to_jsonable(value)
+
+
+def select_columns(columns: list[inputs.ColumnInput], empty: bool = False) -> str:
+    """The select list casting the JSON fields to their column types
+
+    Without rows there is nothing to infer from, untyped columns are then
+    exported as JSON.
+    """
+    selected = []
+    for column in columns:
+        name = _identifier(column.name)
+        cast = column_type(column) or ("JSON" if empty else None)
+        if empty:
+            selected.append(f"CAST(NULL AS {cast}) AS {name}")
+        elif cast:
+            selected.append(f"CAST({name} AS {cast}) AS {name}")
+        else:
+            selected.append(name)
+    return ", ".join(selected)
+
+
+def write_parquet(graph_query: models.GraphQuery, path: str) -> int:
+    """Stream the results of the query into a Parquet file, returns the row count"""
+    from core.renderers.graph.table import table_query
+
+    columns = graph_query.input_columns
+    query, params = table_query(graph_query.graph, graph_query.query, columns)
+
+    row_count = 0
+    json_path = f"{path}.ndjson"
+    try:
+        with open(json_path, "w") as file:
+            rows = stream_graph_rows(query.strip().rstrip(";"), params)
+            with closing(rows):
+                for row in rows:
+                    record = {
+                        column.name: to_cell(value)
+                        for column, value in zip(columns, row)
+                    }
+                    file.write(json.dumps(record, default=str))
+                    file.write("\n")
+                    row_count += 1
+
+        with duckdb.connect() as connection:
+            if row_count == 0:
+                connection.execute(
+                    f"COPY (SELECT {select_columns(columns, empty=True)} LIMIT 0) "
+                    f"TO $path (FORMAT PARQUET)",
+                    {"path": path},
+                )
+            else:
+                connection.execute(
+                    f"COPY (SELECT {select_columns(columns)} FROM read_json($rows, "
+                    f"format = 'newline_delimited', sample_size = -1)) "
+                    f"TO $path (FORMAT PARQUET)",
+                    {"rows": json_path, "path": path},
+                )
+    finally:
+        if os.path.exists(json_path):
+            os.remove(json_path)
+
+    return row_count
+
+
+def export_graph_query(
+    graph_query: models.GraphQuery, datalayer: Datalayer
+) -> tuple[models.MediaStore, int]:
+    """Export the results of a TABLE query as Parquet to the media bucket"""
+    if graph_query.kind != enums.ViewKind.TABLE:
+        raise ValueError("Only TABLE graph queries can be exported")
+
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    key = f"exports/graph_queries/{graph_query.id}/{timestamp}-{uuid.uuid4().hex}.parquet"
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.parquet")
+        row_count = write_parquet(graph_query, path)
+        datalayer.s3.upload_file(path, settings.MEDIA_BUCKET, key)
+
+    store = models.MediaStore.objects.create(
+        path=f"s3://{settings.MEDIA_BUCKET}/{key}",
+        key=key,
+        bucket=settings.MEDIA_BUCKET,
+        populated=True,
+    )
+    return store, row_count
+
+
+def run_export(export_id: int) -> None:
+    """Build the Parquet file of an export and record the outcome"""
+    export = models.GraphQueryExport.objects.select_related("query__graph").get(
+        id=export_id
+    )
+    export.status = enums.ExportStatusChoices.RUNNING
+    export.save(update_fields=["status"])
+
+    try:
+        export.store, export.row_count = export_graph_query(
+            export.query, get_current_datalayer()
+        )
+        export.status = enums.ExportStatusChoices.DONE
+    except Exception as e:
+        logger.exception("Export %s of graph query %s failed", export.id, export.query_id)
+        export.status = enums.ExportStatusChoices.FAILED
+        export.error = str(e)
+
+    export.finished_at = timezone.now()
+    export.save(
+        update_fields=["status", "store", "row_count", "error", "finished_at"]
+    )
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="graph-export"
+                )
+    return _executor
+
+
+def _run_in_background(export_id: int) -> None:
+    try:
+        run_export(export_id)
+    except Exception as e:
+        logger.warning("Could not run export %s: %s", export_id, e)
+    finally:
+        connections.close_all()
+
+
+def start_export(
+    graph_query: models.GraphQuery, creator
+) -> models.GraphQueryExport:
+    """Create an export of the query and build it in the export thread
+
+    The job is submitted once the surrounding transaction commits, so the
+    thread always sees the export it should build.
+    """
+    if graph_query.kind != enums.ViewKind.TABLE:
+        raise ValueError("Only TABLE graph queries can be exported")
+
+    export = models.GraphQueryExport.objects.create(
+        query=graph_query, creator=creator
+    )
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run_in_background, export.id)
+    )
+    return export
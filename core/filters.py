@@ -433,6 +433,30 @@ class NodeQueryFilter(IDFilterMixin, SearchFilterMixin):
     id: auto
 
 
+@strawberry_django.filter(models.MaterializedView)
+class MaterializedViewFilter(IDFilterMixin):
+    query: auto
+
+
+@strawberry_django.filter(models.GraphQueryExport)
+class GraphQueryExportFilter(IDFilterMixin):
+    query: auto
+    status: auto
+
+
+@strawberry_django.filter(models.SlowCypherQuery)
+class SlowCypherQueryFilter(IDFilterMixin):
+    graph_name: auto
+    min_duration: float | None = strawberry.field(
+        default=None, description="Only executions slower than this (in ms)"
+    )
+
+    def filter_min_duration(self, queryset, info):
+        if self.min_duration is None:
+            return queryset
+        return queryset.filter(duration__gte=self.min_duration)
+
+
 @strawberry.input(description="Filter for entities in the graph")
 class EntityFilter:
     ids: list[strawberry.ID] | None = strawberry.field(
@@ -1,149 +1,107 @@
-from strawberry.dataloader import DataLoader
-from core import models
+from asgiref.sync import sync_to_async
+from contextvars import ContextVar
+import functools
+from typing import Literal, NamedTuple
+from django.db.models import Exists, F, OuterRef, Q
+from strawberry.extensions import SchemaExtension
+from core import age, metadata, models
+from core.metrics import DATALOADER_LOADS, InstrumentedDataLoader
 
 
-async def load_expressions(age_names):
+def in_key_order(keys, objects, key, model):
+    """Order the loaded objects like the requested keys
+
+    Keys without a matching object get a DoesNotExist error of their own,
+    so a single missing key does not fail the whole batch.
     """
-    Asynchronously loads linked expressions based on the provided age names.
+    by_key = {str(key(obj)): obj for obj in objects}
+    return [
+        by_key.get(str(k))
+        or model.DoesNotExist(f"{model.__name__} matching {k} does not exist")
+        for k in keys
+    ]
+
+
+async def load_by_ids(model, ids):
+    """Load the objects of one batch with a single id__in query"""
+    objects = [
+        obj
+        async for obj in model.objects.select_related("graph", "sequence").filter(
+            id__in=ids
+        )
+    ]
+    return in_key_order(ids, objects, lambda obj: obj.id, model)
 
-    Args:
-        age_names (list of str): A list of strings where each string is in the format "graph_name:age_name".
 
-    Returns:
-        list: A list of LinkedExpression objects that match the provided age names.
+async def load_by_graph_and_age_name(model, keys):
+    """Load the objects of one batch by their "graph_name:age_name" keys
 
-    Raises:
-        models.LinkedExpression.DoesNotExist: If no LinkedExpression object is found for the given age names.
+    Issues a single query, with one condition per graph in the batch.
     """
+    age_names_by_graph = {}
+    for key in keys:
+        graph_name, age_name = key.split(":")
+        age_names_by_graph.setdefault(graph_name, set()).add(age_name)
+
+    condition = Q()
+    for graph_name, age_names in age_names_by_graph.items():
+        condition |= Q(graph__age_name=graph_name, age_name__in=age_names)
+
+    objects = [
+        obj
+        async for obj in model.objects.select_related("graph", "sequence").filter(
+            condition
+        )
+    ]
+    return in_key_order(
+        keys, objects, lambda obj: f"{obj.graph.age_name}:{obj.age_name}", model
+    )
 
-    gotten = []
-    graphs = {}
-
-    for i in age_names:
-        graph_name, age_name = i.split(":")
 
-        if graph_name not in graphs:
-            graphs[graph_name] = await models.Graph.objects.select_related(
-                "ontology"
-            ).aget(age_name=graph_name)
+async def load_expressions(age_names):
+    """
+    Asynchronously loads the categories (expressions) of the provided age names.
 
-        gotten.append(
-            await models.Expression.objects.aget(
-                ontology=graphs[graph_name].ontology,
-                age_name=age_name,
-            )
-        )
+    Args:
+        age_names (list of str): A list of strings where each string is in the format "graph_name:age_name".
 
-    return gotten
+    Returns:
+        list: The Category objects in the order of the age names, or a
+        DoesNotExist error for every age name without a category.
+    """
+    return await load_by_graph_and_age_name(models.Category, age_names)
 
 
 async def load_reagent_categories(ids):
+    return await load_by_ids(models.ReagentCategory, ids)
 
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.ReagentCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
 
 async def load_metric_categories(ids):
-
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.MetricCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
+    return await load_by_ids(models.MetricCategory, ids)
 
 
 async def load_entity_categories(ids):
-
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.EntityCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
+    return await load_by_ids(models.EntityCategory, ids)
 
 
 async def load_structure_categories(ids):
+    return await load_by_ids(models.StructureCategory, ids)
 
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.StructureCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
 
 async def load_natural_event_categories(ids):
-
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.NaturalEventCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
-
+    return await load_by_ids(models.NaturalEventCategory, ids)
 
 
 async def load_protocol_event_categories(ids):
+    return await load_by_ids(models.ProtocolEventCategory, ids)
 
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.ProtocolEventCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
 
 async def load_measurement_categories(ids):
-
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.MeasurementCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
+    return await load_by_ids(models.MeasurementCategory, ids)
 
 
 async def load_relation_categories(ids):
-    gotten = []
-    for i in ids:
-
-        gotten.append(
-            await models.RelationCategory.objects.aget(
-                id=i,
-            )
-        )
-
-    return gotten
+    return await load_by_ids(models.RelationCategory, ids)
 
 
 async def load_generic_cateogries(age_names):
@@ -290,42 +248,26 @@ async def load_step_category(age_names):
 
 
 async def graph_loader_func(graph_names):
-
-    gotten = []
-
-    for i in graph_names:
-        gotten.append(await models.Graph.objects.aget(age_name=i))
-
-    return gotten
+    objects = [
+        graph async for graph in models.Graph.objects.filter(age_name__in=graph_names)
+    ]
+    return in_key_order(
+        graph_names, objects, lambda graph: graph.age_name, models.Graph
+    )
 
 
 async def metric_key_loader(keys):
     """
-    Asynchronously loads metric keys and retrieves corresponding LinkedExpression objects.
+    Asynchronously loads the metric categories of the provided metric keys.
 
     Args:
         keys (list of str): A list of keys where each key is a string in the format "graph_name:age_name".
 
     Returns:
-        list: A list of LinkedExpression objects corresponding to the provided keys.
-
-    Raises:
-        DoesNotExist: If no LinkedExpression object is found for a given key.
-        MultipleObjectsReturned: If multiple LinkedExpression objects are found for a given key.
+        list: The MetricCategory objects in the order of the keys, or a
+        DoesNotExist error for every key without a metric category.
     """
-    gotten = []
-
-    for i in keys:
-        graph_name, age_name = i.split(":")
-
-        gotten.append(
-            await models.Expression.objects.aget(
-                graph__age_name=graph_name,
-                age_name=age_name,
-            )
-        )
-
-    return gotten
+    return await load_by_graph_and_age_name(models.MetricCategory, keys)
 
 
 async def node_view_loaders(node_ids):
@@ -349,18 +291,335 @@ async def load_protocolstep_templates(node_ids):
     return gotten
 
 
-reagent_category_loader = DataLoader(load_fn=load_reagent_categories)
-entity_category_loader = DataLoader(load_fn=load_entity_categories)
-structure_category_loader = DataLoader(load_fn=load_structure_categories)
-natural_event_category_loader = DataLoader(load_fn=load_natural_event_categories)
-metric_category_loader = DataLoader(load_fn=load_metric_categories)
-protocol_event_category_loader = DataLoader(load_fn=load_protocol_event_categories)
-expression_loader = DataLoader(load_fn=load_expressions)
-relation_category_loader = DataLoader(load_fn=load_relation_categories)
-protocolstep_template_loader = DataLoader(load_fn=load_protocolstep_templates)
-measurement_category_loader = DataLoader(load_fn=load_measurement_categories)
-step_category_loader = DataLoader(load_fn=load_step_category)
-graph_loader = DataLoader(load_fn=graph_loader_func)
-
-metric_key_loader = DataLoader(load_fn=metric_key_loader)
-node_view_loader = DataLoader(load_fn=node_view_loaders)
+async def load_vertices(keys):
+    """
+    Asynchronously loads vertices by their "graph_name:id" keys.
+
+    All ids of a graph are retrieved together (one query per label).
+
+    Returns:
+        list: The RetrievedEntity objects in the order of the keys, or a
+        ValueError for every key without a vertex.
+    """
+    ids_by_graph = {}
+    for key in keys:
+        graph_name, entity_id = key.split(":")
+        ids_by_graph.setdefault(graph_name, set()).add(entity_id)
+
+    by_key = {}
+    for graph_name, entity_ids in ids_by_graph.items():
+        for entity in await age.aget_age_entities(graph_name, entity_ids):
+            by_key[f"{graph_name}:{entity.id}"] = entity
+
+    return [
+        by_key.get(key) or ValueError(f"No entity with id {key}") for key in keys
+    ]
+
+
+class NeighbourhoodKey(NamedTuple):
+    """The incident edges of a node in one direction (optionally of one label)"""
+
+    node_id: str
+    direction: Literal["both", "right", "left"] = "both"
+    label: str | None = None
+    with_self: bool = True
+    limit: int | None = None
+
+
+async def load_neighbourhoods(keys):
+    """
+    Asynchronously loads the incident edges of many nodes.
+
+    Keys that only differ in their node are fetched together, so a list of
+    nodes with their edges costs one query per graph (and direction).
+
+    Returns:
+        list: A list of RetrievedRelation lists in the order of the keys.
+    """
+    groups = {}
+    for key in keys:
+        graph_name, entity_id = key.node_id.split(":")
+        group = (graph_name, key.direction, key.label, key.with_self, key.limit)
+        groups.setdefault(group, set()).add(entity_id)
+
+    by_key = {}
+    for (graph_name, direction, label, with_self, limit), ids in groups.items():
+        neighbourhoods = await age.aget_neighbourhoods(
+            graph_name, ids, direction, label, with_self, limit
+        )
+        for entity_id, edges in neighbourhoods.items():
+            key = NeighbourhoodKey(
+                f"{graph_name}:{entity_id}", direction, label, with_self, limit
+            )
+            by_key[key] = edges
+
+    return [by_key.get(key, []) for key in keys]
+
+
+class NodeQueryKey(NamedTuple):
+    """The node queries of a graph that are relevant for a category, for a user"""
+
+    graph_name: str
+    category_id: str
+    user_id: int | None
+
+
+async def load_node_queries(keys):
+    """
+    Asynchronously loads the relevant node queries of (graph, category, user) keys.
+
+    Issues one query per user in the batch (usually one per operation). The
+    queries of every key are ordered pinned first (by the user of the key).
+
+    Returns:
+        list: A list of NodeQuery lists in the order of the keys.
+    """
+    by_key = {}
+
+    for user_id in {key.user_id for key in keys}:
+        condition = Q()
+        for key in keys:
+            if key.user_id == user_id:
+                condition |= Q(
+                    graph__age_name=key.graph_name,
+                    relevant_for_nodes=key.category_id,
+                )
+
+        queryset = (
+            models.NodeQuery.objects.filter(condition)
+            .annotate(
+                graph_name=F("graph__age_name"),
+                category_id=F("relevant_for_nodes"),
+                pinned=Exists(
+                    models.NodeQuery.objects.filter(
+                        pk=OuterRef("pk"), pinned_by=user_id
+                    )
+                ),
+            )
+            .order_by("-pinned", "id")
+        )
+
+        async for query in queryset:
+            key = (query.graph_name, str(query.category_id), user_id)
+            by_key.setdefault(key, []).append(query)
+
+    return [
+        by_key.get((key.graph_name, str(key.category_id), key.user_id), [])
+        for key in keys
+    ]
+
+
+async def load_pinned(model, keys):
+    """
+    Asynchronously checks which objects of a model are pinned by a user.
+
+    Args:
+        keys (list of tuple): (user_id, object_id) pairs.
+
+    Returns:
+        list: A bool per key, one query per user in the batch.
+    """
+    pinned = set()
+    for user_id in {user_id for user_id, _ in keys}:
+        ids = [object_id for key_user_id, object_id in keys if key_user_id == user_id]
+        async for object_id in model.objects.filter(
+            pinned_by=user_id, id__in=ids
+        ).values_list("id", flat=True):
+            pinned.add((user_id, str(object_id)))
+
+    return [(user_id, str(object_id)) in pinned for user_id, object_id in keys]
+
+
+async def load_active_reagents(category_ids):
+    """
+    Asynchronously loads the active reagents of many reagent categories.
+
+    Returns:
+        list: The active RetrievedEntity per category id (in key order), or
+        None for categories without an active reagent.
+    """
+    categories = [
+        category
+        async for category in models.ReagentCategory.objects.select_related(
+            "graph"
+        ).filter(id__in=category_ids)
+    ]
+    active = await sync_to_async(age.get_active_reagents_for_reagent_categories)(
+        categories
+    )
+    return [active.get(int(category_id)) for category_id in category_ids]
+
+
+def shared(name: str, model, field: str, load_fn):
+    """Read a batch load function through the metadata cache (core.metadata)
+
+    Graphs and categories are cached, and invalidated across workers, in
+    one place. Only the keys that are not cached are passed on to `load_fn`,
+    errors are never cached.
+    """
+    hits = DATALOADER_LOADS.labels(name, "shared_hit")
+    misses = DATALOADER_LOADS.labels(name, "shared_miss")
+
+    async def load(keys):
+        if not metadata.metadata_cache_enabled():
+            return await load_fn(keys)
+
+        results = await sync_to_async(metadata.get_cached)(model, field, keys)
+        missing = [key for key, result in zip(keys, results) if result is None]
+        hits.inc(len(keys) - len(missing))
+        misses.inc(len(missing))
+
+        if missing:
+            loaded = dict(zip(map(str, missing), await load_fn(missing)))
+            await sync_to_async(metadata.put)(
+                model,
+                field,
+                {
+                    key: result
+                    for key, result in loaded.items()
+                    if not isinstance(result, Exception)
+                },
+            )
+
+            results = [
+                loaded[str(key)] if result is None else result
+                for key, result in zip(keys, results)
+            ]
+
+        return results
+
+    return load
+
+
+class Loaders:
+    """The DataLoaders of one GraphQL operation
+
+    A fresh set is created for every operation by `LoaderExtension`, so the
+    DataLoader caches only live as long as the operation. Graphs and
+    categories are additionally served from the metadata cache (see
+    `shared`).
+    """
+
+    def __init__(self):
+        def loader(name, model, field, load_fn):
+            return InstrumentedDataLoader(
+                load_fn=shared(name, model, field, load_fn), name=name
+            )
+
+        self.reagent_category_loader = loader(
+            "reagent_category", models.ReagentCategory, "id", load_reagent_categories
+        )
+        self.entity_category_loader = loader(
+            "entity_category", models.EntityCategory, "id", load_entity_categories
+        )
+        self.structure_category_loader = loader(
+            "structure_category",
+            models.StructureCategory,
+            "id",
+            load_structure_categories,
+        )
+        self.natural_event_category_loader = loader(
+            "natural_event_category",
+            models.NaturalEventCategory,
+            "id",
+            load_natural_event_categories,
+        )
+        self.metric_category_loader = loader(
+            "metric_category", models.MetricCategory, "id", load_metric_categories
+        )
+        self.protocol_event_category_loader = loader(
+            "protocol_event_category",
+            models.ProtocolEventCategory,
+            "id",
+            load_protocol_event_categories,
+        )
+        self.relation_category_loader = loader(
+            "relation_category",
+            models.RelationCategory,
+            "id",
+            load_relation_categories,
+        )
+        self.measurement_category_loader = loader(
+            "measurement_category",
+            models.MeasurementCategory,
+            "id",
+            load_measurement_categories,
+        )
+        self.expression_loader = loader(
+            "expression", models.Category, "age_name", load_expressions
+        )
+        self.metric_key_loader = loader(
+            "metric_key", models.MetricCategory, "age_name", metric_key_loader
+        )
+        self.graph_loader = loader(
+            "graph", models.Graph, "age_name", graph_loader_func
+        )
+        self.vertex_loader = InstrumentedDataLoader(
+            load_fn=load_vertices, name="vertex"
+        )
+        self.neighbourhood_loader = InstrumentedDataLoader(
+            load_fn=load_neighbourhoods, name="neighbourhood"
+        )
+        self.node_query_loader = InstrumentedDataLoader(
+            load_fn=load_node_queries, name="node_query"
+        )
+        self.active_reagent_loader = InstrumentedDataLoader(
+            load_fn=load_active_reagents, name="active_reagent"
+        )
+        self.protocolstep_template_loader = InstrumentedDataLoader(
+            load_fn=load_protocolstep_templates, name="protocolstep_template"
+        )
+        self.step_category_loader = InstrumentedDataLoader(
+            load_fn=load_step_category, name="step_category"
+        )
+        self.node_view_loader = InstrumentedDataLoader(
+            load_fn=node_view_loaders, name="node_view"
+        )
+        self._pinned_loaders = {}
+
+    def pinned_loader(self, model) -> InstrumentedDataLoader:
+        """The pinned status loader of the model that defines `pinned_by`
+
+        Category subclasses share the loader of Category, as their ids are
+        the ids of their Category row.
+        """
+        model = model._meta.get_field("pinned_by").model
+        if model not in self._pinned_loaders:
+            self._pinned_loaders[model] = InstrumentedDataLoader(
+                load_fn=functools.partial(load_pinned, model),
+                name=f"pinned_{model._meta.model_name}",
+            )
+        return self._pinned_loaders[model]
+
+    async def is_pinned(self, instance, user) -> bool:
+        """Whether the user pinned the instance, batched per model type"""
+        return await self.pinned_loader(type(instance)).load((user.id, instance.id))
+
+
+current_loaders: ContextVar[Loaders | None] = ContextVar(
+    "current_loaders", default=None
+)
+
+
+def get_loaders() -> Loaders:
+    """The loaders of the current operation
+
+    Outside of an operation (e.g. in scripts) every call gets a fresh set.
+    """
+    loaders = current_loaders.get()
+    if loaders is None:
+        return Loaders()
+    return loaders
+
+
+class LoaderExtension(SchemaExtension):
+    """Creates the DataLoaders for every operation and attaches them to the context"""
+
+    def on_operation(self):
+        loaders = Loaders()
+        self.execution_context.context.loaders = loaders
+        token = current_loaders.set(loaders)
+        try:
+            yield
+        finally:
+            current_loaders.reset(token)
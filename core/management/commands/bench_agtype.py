@@ -0,0 +1,117 @@
+from django.core.management.base import BaseCommand
+from core import agtype
+import re
+import timeit
+import tracemalloc
+import ujson
+
+
+# The regex based extraction that parse_age_path used before, kept here as
+# the baseline of the benchmark
+legacy_vertex_pattern = re.compile(r"(\{(?:[^{}]|(?:\{[^{}]*\}))*\})::vertex(?=[,\]])")
+legacy_edge_pattern = re.compile(r"(\{(?:[^{}]|(?:\{[^{}]*\}))*\})::edge(?=[,\]])")
+
+
+def legacy_parse(raw_path):
+    return [ujson.loads(match) for match in legacy_vertex_pattern.findall(raw_path)] + [
+        ujson.loads(match) for match in legacy_edge_pattern.findall(raw_path)
+    ]
+
+
+def build_path(length: int, nested: bool) -> str:
+    """Build an agtype path with `length` vertices (and length - 1 edges)"""
+    properties = {"__type": "ENTITY", "__label": "cell {1}", "note": "a::vertex"}
+    if nested:
+        properties["__structure"] = {"object": "x", "meta": {"shape": [1, 2, 3]}}
+
+    elements = []
+    for i in range(length):
+        if i:
+            edge = {
+                "id": 2_000_000 + i,
+                "label": "derived_from",
+                "start_id": 1_000_000 + i - 1,
+                "end_id": 1_000_000 + i,
+                "properties": {"__type": "RELATION"},
+            }
+            elements.append(ujson.dumps(edge) + "::edge")
+
+        vertex = {"id": 1_000_000 + i, "label": "Cell", "properties": properties}
+        elements.append(ujson.dumps(vertex) + "::vertex")
+
+    return "[" + ", ".join(elements) + "]::path"
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the agtype path tokenizer on paths of growing length"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lengths",
+            nargs="+",
+            type=int,
+            default=[10, 100, 1000, 5000, 20000],
+            help="Path lengths (number of vertices) to benchmark",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=100_000,
+            help="Number of vertices decoded for the memory comparison",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'length':>8} {'tokenizer ms':>14} {'us/element':>12} "
+            f"{'bytes ms':>10} {'legacy ms':>10}"
+        )
+
+        for length in options["lengths"]:
+            text = build_path(length, nested=False)
+            raw = text.encode()
+            elements = 2 * length - 1
+
+            tokenizer = self._time(lambda: list(agtype.iter_path(text)), options)
+            from_bytes = self._time(lambda: list(agtype.iter_path(raw)), options)
+            legacy = self._time(lambda: legacy_parse(text), options)
+
+            self.stdout.write(
+                f"{length:>8} {tokenizer * 1000:>14.2f} "
+                f"{tokenizer * 1e6 / elements:>12.2f} "
+                f"{from_bytes * 1000:>10.2f} {legacy * 1000:>10.2f}"
+            )
+
+        nested = build_path(1000, nested=True)
+        found = sum(1 for _ in agtype.iter_path(nested))
+        legacy_found = len(legacy_parse(nested))
+        self.stdout.write(
+            f"nested properties (1000 vertices): tokenizer found {found} "
+            f"elements, legacy regex found {legacy_found}"
+        )
+
+        self._memory(options["rows"])
+
+    def _memory(self, rows: int) -> None:
+        vertex = build_path(1, nested=True)[1:-7]
+        vertices = [vertex.replace("1000000", str(1_000_000 + i)) for i in range(rows)]
+
+        tracemalloc.start()
+        decoded = [ujson.loads(text[: -len(agtype.VERTEX_SUFFIX)]) for text in vertices]
+        eager, _ = tracemalloc.get_traced_memory()
+        del decoded
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        decoded = [agtype.decode_agtype(text, "graph") for text in vertices]
+        lazy, _ = tracemalloc.get_traced_memory()
+        del decoded
+        tracemalloc.stop()
+
+        self.stdout.write(
+            f"memory for {rows} vertices: fully decoded dicts {eager / rows:.0f} "
+            f"bytes/row, lazy entities {lazy / rows:.0f} bytes/row"
+        )
+
+    def _time(self, func, options) -> float:
+        return min(timeit.repeat(func, number=1, repeat=options["repeat"]))
@@ -0,0 +1,374 @@
+"""Snapshots of TABLE graph query results in postgres tables
+
+A MaterializedView of a GraphQuery stores the result rows of the query in
+its own table (one agtype column per column of the query, plus a "__row"
+column keeping the result order). Renders of the query read the snapshot
+instead of running the cypher, as long as the snapshot is fresh: it was
+taken with the current query definition and is younger than its max_age.
+
+Snapshots are rebuilt into a new table that replaces the old one in the
+same transaction as the update of the view, so renders never see a
+partially built snapshot. The tables live in the public schema: graph
+connections put ag_catalog first on the search path, and tables created
+there would be dropped together with the AGE extension.
+
+Refreshes are incremental where possible: if all relevant changes in the
+graph change log (see core.changelog) since the last refresh created
+elements that the query returns as a NODE or EDGE column (e.g. new metrics
+on structures or new measurements), only the rows containing them are
+queried and appended. Any other relevant change falls back to a rebuild.
+"""
+
+from dataclasses import dataclass
+import re
+from django.utils import timezone
+from core import agtype, changelog, enums, models, render_cache, pagination as p
+from core.connection import agraph_cursor, graph_transaction
+
+
+TABLE_PREFIX = "kraph_mv_"
+SCHEMA = "public"
+
+_return_pattern = re.compile(r"\bRETURN\b", re.IGNORECASE)
+# Clauses after which rows depend on more than the bindings they contain,
+# so newly created elements can also change or remove existing rows
+_not_appendable_pattern = re.compile(
+    r"\b(OPTIONAL|NOT|EXISTS|UNION|ORDER\s+BY|SKIP|LIMIT|DISTINCT|CALL)\b"
+    r"|\b(count|collect|sum|avg|min|max|stDev|stDevP|percentileCont"
+    r"|percentileDisc)\s*\(",
+    re.IGNORECASE,
+)
+_alias_pattern = re.compile(r"\s+AS\s+`?\w+`?\s*$", re.IGNORECASE)
+_variable_pattern = re.compile(r"^`?(\w+)`?$")
+_labeled_pattern = re.compile(r"[(\[]\s*(?:`?(\w+)`?)?\s*:\s*`?(\w+)`?")
+# (n), (n {a: 1}), -[r]-, --> and friends match elements of any label
+_unlabeled_pattern = re.compile(
+    r"(?<![\w.`])\(\s*`?\w*`?\s*(\{[^}]*\})?\s*\)"
+    r"|-\[\s*`?\w*`?\s*(\{[^}]*\})?\s*\]-"
+    r"|<?-->?"
+)
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def qualified(table: str) -> str:
+    return f"{quote(SCHEMA)}.{quote(table)}"
+
+
+def table_name(view: models.MaterializedView) -> str:
+    return f"{TABLE_PREFIX}{view.id}"
+
+
+def _update_view(cursor, view: models.MaterializedView, **fields) -> None:
+    """Write fields of the view through the cursor of the snapshot transaction
+
+    The view is saved together with the snapshot it describes, instead of
+    on the django connection after the snapshot was committed.
+    """
+    for name, value in fields.items():
+        setattr(view, name, value)
+
+    meta = models.MaterializedView._meta
+    assignments = ", ".join(
+        f"{quote(meta.get_field(name).column)} = %s" for name in fields
+    )
+    cursor.execute(
+        f"UPDATE {quote(meta.db_table)} SET {assignments} "
+        f"WHERE {quote(meta.pk.column)} = %s",
+        [*fields.values(), view.pk],
+    )
+    if cursor.rowcount != 1:
+        # e.g. the view was created in a transaction that is not committed
+        raise ValueError(f"Materialized view {view.pk} does not exist")
+
+
+@dataclass
+class AppendPlan:
+    """How rows containing newly created elements can be queried"""
+
+    head: str
+    items: list[str]
+    anchors: dict[str, str]
+    labels: set[str]
+    matches_any_label: bool
+
+    def is_relevant(self, change) -> bool:
+        return self.matches_any_label or change.label in self.labels
+
+    def returns_ids(self) -> str:
+        ids = ", ".join(f"id({variable})" for variable in self.anchors)
+        return f"RETURN {', '.join(self.items)}, [{ids}] AS __ids"
+
+
+def _split_items(text: str) -> list[str]:
+    """Split a RETURN clause at its top level commas"""
+    items, depth, quote_char, start = [], 0, None, 0
+    for index, char in enumerate(text):
+        if quote_char:
+            if char == quote_char:
+                quote_char = None
+        elif char in "'\"":
+            quote_char = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        elif char == "," and depth == 0:
+            items.append(text[start:index].strip())
+            start = index + 1
+    items.append(text[start:].strip())
+    return items
+
+
+def append_plan(query: str, column_count: int) -> AppendPlan | None:
+    """Analyse the query for incremental refreshes, None if not possible"""
+    returns = list(_return_pattern.finditer(query))
+    if len(returns) != 1 or _not_appendable_pattern.search(query):
+        return None
+
+    head = query[: returns[0].start()]
+    items = _split_items(query[returns[0].end() :].strip().rstrip(";"))
+    if len(items) != column_count:
+        return None
+
+    labeled = _labeled_pattern.findall(head)
+    variable_labels = {}
+    for variable, label in labeled:
+        if variable:
+            variable_labels.setdefault(variable, label)
+
+    anchors = {}
+    for item in items:
+        match = _variable_pattern.match(_alias_pattern.sub("", item).strip())
+        if match and match.group(1) in variable_labels:
+            anchors[match.group(1)] = variable_labels[match.group(1)]
+
+    if not anchors:
+        return None
+
+    return AppendPlan(
+        head=head,
+        items=items,
+        anchors=anchors,
+        labels={label for _, label in labeled},
+        matches_any_label=_unlabeled_pattern.search(head) is not None,
+    )
+
+
+def _anchor_ids(plan: AppendPlan, changes) -> dict[str, list[int]] | None:
+    """The new elements per returned variable, None if a rebuild is needed"""
+    anchor_ids = {variable: [] for variable in plan.anchors}
+
+    for change in changes:
+        if not plan.is_relevant(change):
+            continue
+        if change.operation != changelog.CREATED:
+            return None
+
+        variables = [v for v, label in plan.anchors.items() if label == change.label]
+        if not variables:
+            return None
+        for variable in variables:
+            anchor_ids[variable].append(change.element_id)
+
+    return {variable: ids for variable, ids in anchor_ids.items() if ids}
+
+
+def _cypher_select(
+    graph_query: models.GraphQuery,
+    plan: AppendPlan | None = None,
+    anchor_ids: dict[str, list[int]] | None = None,
+) -> str:
+    from core.renderers.graph.table import columns_to_age_string
+
+    columns = columns_to_age_string(graph_query.input_columns)
+    if plan is None:
+        return f"""
+        SELECT * FROM cypher(%s, $$
+            {graph_query.query}
+        $$) as ({columns})
+        """
+
+    where = ""
+    if anchor_ids is not None:
+        conditions = " OR ".join(
+            f"id({variable}) IN [{', '.join(str(i) for i in ids)}]"
+            for variable, ids in anchor_ids.items()
+        )
+        where = f"WITH * WHERE {conditions}"
+
+    return f"""
+    SELECT * FROM cypher(%s, $$
+        {plan.head} {where} {plan.returns_ids()}
+    $$) as ({columns}, __ids agtype)
+    """
+
+
+def _can_increment(view: models.MaterializedView, graph_query) -> bool:
+    return (
+        changelog.change_log_enabled()
+        and bool(view.table_name)
+        and view.change_snapshot is not None
+        and view.row_count is not None
+        and view.query_hash == render_cache.query_hash(graph_query)
+        and view.refreshed_at is not None
+        # Older changes may have been pruned from the log
+        and view.refreshed_at > timezone.now() - changelog.retention()
+    )
+
+
+def _rebuild(view, graph_query, plan: AppendPlan | None, snapshot: str) -> None:
+    table = table_name(view)
+    build = f"{table}_build"
+
+    with graph_transaction() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {qualified(build)}")
+        cursor.execute(
+            f"CREATE TABLE {qualified(build)} AS "
+            f'SELECT row_number() OVER () AS "__row", * '
+            f"FROM ({_cypher_select(graph_query, plan)}) AS results",
+            [graph_query.graph.age_name],
+        )
+        row_count = cursor.rowcount
+        # Pages are read by row number ranges
+        cursor.execute(f'CREATE INDEX ON {qualified(build)} ("__row")')
+        cursor.execute(f"DROP TABLE IF EXISTS {qualified(table)}")
+        cursor.execute(f"ALTER TABLE {qualified(build)} RENAME TO {quote(table)}")
+
+        _update_view(
+            cursor,
+            view,
+            table_name=table,
+            query_hash=render_cache.query_hash(graph_query),
+            row_count=row_count,
+            change_snapshot=snapshot,
+            refreshed_at=timezone.now(),
+        )
+
+
+def _append(view, graph_query, plan: AppendPlan, anchor_ids, snapshot: str) -> None:
+    table = qualified(view.table_name)
+
+    with graph_transaction() as cursor:
+        if anchor_ids:
+            # Changes that committed while the change log was read are read
+            # again by the next refresh, rows already in the snapshot are
+            # skipped.
+            cursor.execute(
+                f"INSERT INTO {table} "
+                f'SELECT (SELECT coalesce(max("__row"), 0) FROM {table}) '
+                "+ row_number() OVER (), results.* "
+                f"FROM ({_cypher_select(graph_query, plan, anchor_ids)}) AS results "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} AS existing "
+                'WHERE existing."__ids" = results."__ids")',
+                [graph_query.graph.age_name],
+            )
+            row_count = view.row_count + cursor.rowcount
+        else:
+            row_count = view.row_count
+
+        _update_view(
+            cursor,
+            view,
+            row_count=row_count,
+            change_snapshot=snapshot,
+            refreshed_at=timezone.now(),
+        )
+
+
+def refresh(
+    view: models.MaterializedView, full: bool = False
+) -> models.MaterializedView:
+    """Bring the snapshot of the view up to date with the graph
+
+    Appends the rows of newly created elements if possible (and `full` is
+    not set), rebuilds the snapshot otherwise.
+    """
+    graph_query = view.query
+    if graph_query.kind != enums.ViewKind.TABLE:
+        raise ValueError("Only TABLE graph queries can be materialized")
+
+    graph_name = graph_query.graph.age_name
+    # Taken before anything is read, see changelog.changes_since
+    snapshot = changelog.current_snapshot()
+    plan = append_plan(graph_query.query, len(graph_query.input_columns))
+
+    anchor_ids = None
+    if not full and plan is not None and _can_increment(view, graph_query):
+        anchor_ids = _anchor_ids(
+            plan, changelog.changes_since(graph_name, view.change_snapshot)
+        )
+
+    if anchor_ids is None:
+        _rebuild(view, graph_query, plan, snapshot)
+        changelog.prune()
+    else:
+        _append(view, graph_query, plan, anchor_ids, snapshot)
+
+    # Cached renders may still hold the previous snapshot
+    render_cache.bump_graph_version(graph_name)
+    return view
+
+
+def drop(view: models.MaterializedView) -> None:
+    if not view.table_name:
+        return
+
+    with graph_transaction() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {qualified(view.table_name)}")
+
+
+def is_fresh(view: models.MaterializedView, graph_query: models.GraphQuery) -> bool:
+    if view.refreshed_at is None or not view.table_name:
+        return False
+    if view.query_hash != render_cache.query_hash(graph_query):
+        return False
+    if view.max_age is None:
+        return True
+    return (timezone.now() - view.refreshed_at).total_seconds() < view.max_age
+
+
+async def afresh_view(
+    graph_query: models.GraphQuery,
+) -> models.MaterializedView | None:
+    """The most recently refreshed snapshot of the query, if it is fresh"""
+    view = await (
+        models.MaterializedView.objects.filter(
+            query_id=graph_query.id, refreshed_at__isnull=False
+        )
+        .order_by("-refreshed_at")
+        .afirst()
+    )
+    if view is None or not is_fresh(view, graph_query):
+        return None
+    return view
+
+
+async def aread(
+    view: models.MaterializedView,
+    column_count: int,
+    pagination: p.TablePaginationInput | None = None,
+) -> list:
+    """The rows of the snapshot, in the order the query returned them
+
+    Rows are numbered without gaps, so pages are read as row number ranges
+    from the index instead of skipping over the preceding rows.
+    """
+    query = f"SELECT * FROM {qualified(view.table_name)}"
+    params = []
+    if pagination is not None:
+        offset = pagination.offset or 0
+        query += ' WHERE "__row" > %s'
+        params.append(offset)
+        if pagination.limit is not None:
+            query += ' AND "__row" <= %s'
+            params.append(offset + pagination.limit)
+
+    async with agraph_cursor() as cursor:
+        await cursor.execute(f'{query} ORDER BY "__row"', params)
+        return [
+            agtype.to_jsonable(row[1 : column_count + 1])
+            for row in await cursor.fetchall()
+        ]
@@ -0,0 +1,242 @@
+"""Cache for the graph, category and sequence metadata used on every write
+
+Lookups go through an in-process L1 (TTLCache) and a shared L2 (the django
+cache, redis). Saving or deleting an object invalidates both (see
+core.signals) once the transaction commits and broadcasts the invalidated
+keys over redis pub/sub, so the L1 caches of the other workers drop them
+too.
+
+Cached instances are shared between requests and must be treated as read
+only. Code that modifies an object has to load it from the ORM.
+"""
+
+import json
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from core import models
+from core.cache import TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+_l1 = TTLCache(
+    max_size=settings.METADATA_CACHE.get("L1_MAX_SIZE", 5000),
+    ttl=settings.METADATA_CACHE.get("L1_TTL", 300),
+)
+_subscriber: threading.Thread | None = None
+_subscriber_lock = threading.Lock()
+
+
+def metadata_cache_enabled() -> bool:
+    return bool(settings.METADATA_CACHE.get("ENABLED", False))
+
+
+def _channel() -> str:
+    return settings.METADATA_CACHE.get("CHANNEL", "kraph:metadata:invalidate")
+
+
+def _key(model, field: str, value) -> str:
+    return f"meta:{model._meta.label_lower}:{field}:{value}"
+
+
+def _fetch(model, lookup: dict):
+    queryset = model.objects.all()
+    if issubclass(model, models.Category):
+        queryset = queryset.select_related("graph", "sequence")
+    elif issubclass(model, models.GraphSequence):
+        queryset = queryset.select_related("graph")
+    return queryset.get(**lookup)
+
+
+def _get(model, field: str, value, lookup: dict):
+    if not metadata_cache_enabled():
+        return _fetch(model, lookup)
+
+    _ensure_subscriber()
+    key = _key(model, field, value)
+
+    instance = _l1.get(key)
+    if instance is not None:
+        return instance
+
+    try:
+        instance = cache.get(key)
+    except Exception as e:
+        logger.warning("Could not read metadata from the shared cache: %s", e)
+
+    if instance is None:
+        instance = _fetch(model, lookup)
+        try:
+            cache.set(key, instance, settings.METADATA_CACHE.get("L2_TTL", 3600))
+        except Exception as e:
+            logger.warning("Could not write metadata to the shared cache: %s", e)
+
+    _l1.set(key, instance)
+    return instance
+
+
+def get_graph(id) -> models.Graph:
+    return _get(models.Graph, "id", id, {"id": id})
+
+
+def get_graph_by_age_name(age_name: str) -> models.Graph:
+    return _get(models.Graph, "age_name", age_name, {"age_name": age_name})
+
+
+def get_category(model, id):
+    """Get a category (of the given Category subclass) with its graph and sequence"""
+    return _get(model, "id", id, {"id": id})
+
+
+def get_category_by_age_name(model, graph_age_name: str, age_name: str):
+    return _get(
+        model,
+        "age_name",
+        f"{graph_age_name}:{age_name}",
+        {"graph__age_name": graph_age_name, "age_name": age_name},
+    )
+
+
+def get_sequence(id) -> models.GraphSequence:
+    return _get(models.GraphSequence, "id", id, {"id": id})
+
+
+def get_cached(model, field: str, values: list) -> list:
+    """The cached instances (L1, then L2) of the values, None where not cached
+
+    Used by the shared DataLoaders (see `core.loaders.shared`), which batch
+    load the misses themselves and hand them back through `put`.
+    """
+    _ensure_subscriber()
+    keys = [_key(model, field, value) for value in values]
+    results = [_l1.get(key) for key in keys]
+    missing = [key for key, instance in zip(keys, results) if instance is None]
+
+    if missing:
+        try:
+            found = cache.get_many(missing)
+        except Exception as e:
+            logger.warning("Could not read metadata from the shared cache: %s", e)
+            found = {}
+
+        for key, instance in found.items():
+            _l1.set(key, instance)
+        results = [
+            found.get(key) if instance is None else instance
+            for key, instance in zip(keys, results)
+        ]
+
+    return results
+
+
+def put(model, field: str, instances: dict) -> None:
+    """Cache the instances under their value of the field"""
+    entries = {
+        _key(model, field, value): instance for value, instance in instances.items()
+    }
+    try:
+        cache.set_many(entries, settings.METADATA_CACHE.get("L2_TTL", 3600))
+    except Exception as e:
+        logger.warning("Could not write metadata to the shared cache: %s", e)
+
+    for key, instance in entries.items():
+        _l1.set(key, instance)
+
+
+def _instance_keys(instance) -> list[str]:
+    if isinstance(instance, models.Graph):
+        return [
+            _key(models.Graph, "id", instance.id),
+            _key(models.Graph, "age_name", instance.age_name),
+        ]
+
+    if isinstance(instance, models.Category):
+        # A category can be looked up through any class of its hierarchy
+        age_name = f"{instance.graph.age_name}:{instance.age_name}"
+        return [
+            key
+            for model in type(instance).__mro__
+            if isinstance(model, type)
+            and issubclass(model, models.Category)
+            and not model._meta.abstract
+            for key in (
+                _key(model, "id", instance.id),
+                _key(model, "age_name", age_name),
+            )
+        ]
+
+    if isinstance(instance, models.GraphSequence):
+        return [_key(models.GraphSequence, "id", instance.id)]
+
+    return []
+
+
+def invalidate(instance) -> None:
+    """Drop the instance from all cache levels, in this and all other workers
+
+    Until the running transaction commits, readers still get the old row
+    and would put it back into the cache. So the levels are dropped (and
+    the other workers told) again after the commit.
+    """
+    keys = _instance_keys(instance)
+    if not keys:
+        return
+
+    for key in keys:
+        _l1.delete(key)
+
+    transaction.on_commit(lambda: _invalidate_keys(keys))
+
+
+def _invalidate_keys(keys: list[str]) -> None:
+    for key in keys:
+        _l1.delete(key)
+
+    if not metadata_cache_enabled():
+        return
+
+    try:
+        cache.delete_many(keys)
+        _redis().publish(_channel(), json.dumps(keys))
+    except Exception as e:
+        logger.warning("Could not broadcast metadata invalidation: %s", e)
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+def _listen() -> None:
+    while True:
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_channel())
+            # Invalidations may have been missed while not subscribed
+            _l1.clear()
+
+            for message in pubsub.listen():
+                for key in json.loads(message["data"]):
+                    _l1.delete(key)
+        except Exception as e:
+            logger.warning("Metadata invalidation subscriber failed: %s", e)
+            time.sleep(5)
+
+
+def _ensure_subscriber() -> None:
+    global _subscriber
+
+    if _subscriber is not None:
+        return
+
+    with _subscriber_lock:
+        if _subscriber is None:
+            _subscriber = threading.Thread(
+                target=_listen, name="metadata-invalidation", daemon=True
+            )
+            _subscriber.start()
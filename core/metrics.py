@@ -0,0 +1,188 @@
+import functools
+from contextlib import aclosing
+import inspect
+import time
+import typing
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from strawberry.dataloader import DataLoader
+
+
+AGE_CALL_SECONDS = Histogram(
+    "kraph_age_call_seconds",
+    "Latency of the graph access functions in core.age",
+    ["function"],
+)
+RENDER_SECONDS = Histogram(
+    "kraph_render_seconds",
+    "Latency of graph and node query renders",
+    ["renderer", "kind"],
+)
+RENDER_CACHE_LOOKUPS = Counter(
+    "kraph_render_cache_lookups_total",
+    "Render cache lookups, by whether the render was served from the cache",
+    ["renderer", "result"],
+)
+DECODED_ELEMENTS = Counter(
+    "kraph_agtype_decoded_total",
+    "Number of vertices and edges decoded from agtype",
+    ["kind"],
+)
+DATALOADER_BATCH_SIZE = Histogram(
+    "kraph_dataloader_batch_size",
+    "Number of keys per DataLoader batch",
+    ["loader"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+DATALOADER_LOADS = Counter(
+    "kraph_dataloader_loads_total",
+    "DataLoader loads, by whether they were answered from the loader cache",
+    ["loader", "result"],
+)
+OPEN_GRAPH_CURSORS = Gauge(
+    "kraph_graph_open_cursors",
+    "Number of graph cursors that are currently open",
+)
+
+VERTICES_DECODED = DECODED_ELEMENTS.labels("vertex")
+EDGES_DECODED = DECODED_ELEMENTS.labels("edge")
+
+F = typing.TypeVar("F", bound=typing.Callable)
+
+
+def observe_age_function(func: F) -> F:
+    """Record the latency of a core.age function in AGE_CALL_SECONDS
+
+    Generators (sync and async) are timed until they are exhausted or
+    closed, so streamed selects are measured over the whole stream.
+    """
+    histogram = AGE_CALL_SECONDS.labels(func.__name__)
+
+    if inspect.isasyncgenfunction(func):
+
+        @functools.wraps(func)
+        async def async_gen_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                async with aclosing(func(*args, **kwargs)) as items:
+                    async for item in items:
+                        yield item
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return async_gen_wrapper
+
+    if inspect.isgeneratorfunction(func):
+
+        @functools.wraps(func)
+        def gen_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return (yield from func(*args, **kwargs))
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return gen_wrapper
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def observe_render(renderer: str):
+    """Record the latency of a render function in RENDER_SECONDS
+
+    The view kind is taken from the query that is passed as first argument.
+    """
+
+    def kind(query) -> str:
+        return str(getattr(query.kind, "value", query.kind))
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(query, *args, **kwargs):
+                with RENDER_SECONDS.labels(renderer, kind(query)).time():
+                    return await func(query, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(query, *args, **kwargs):
+            with RENDER_SECONDS.labels(renderer, kind(query)).time():
+                return func(query, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class InstrumentedDataLoader(DataLoader):
+    """DataLoader that reports its batch sizes and cache hits"""
+
+    def __init__(self, load_fn, name: str, **kwargs):
+        batch_size = DATALOADER_BATCH_SIZE.labels(name)
+
+        async def instrumented_load_fn(keys):
+            batch_size.observe(len(keys))
+            return await load_fn(keys)
+
+        super().__init__(load_fn=instrumented_load_fn, **kwargs)
+        self.name = name
+        self._hits = DATALOADER_LOADS.labels(name, "hit")
+        self._misses = DATALOADER_LOADS.labels(name, "miss")
+
+    def load(self, key):
+        if self.cache and self.cache_map.get(key) is not None:
+            self._hits.inc()
+        else:
+            self._misses.inc()
+        return super().load(key)
+
+
+class GraphPoolCollector:
+    """Exposes the graph pool and AGE session counters as gauges"""
+
+    def collect(self):
+        from core.connection import get_pool_stats, get_session_stats
+
+        pool = GaugeMetricFamily(
+            "kraph_graph_pool",
+            "Statistics of the graph connection pools",
+            labels=["stat"],
+        )
+        for key, value in get_pool_stats().items():
+            pool.add_metric([key], value)
+        yield pool
+
+        stats = get_session_stats()
+        session = GaugeMetricFamily(
+            "kraph_age_sessions",
+            "AGE session preparations (initialized) and reuses (skipped)",
+            labels=["state"],
+        )
+        session.add_metric(["initialized"], stats.initialized)
+        session.add_metric(["skipped"], stats.skipped)
+        yield session
+
+
+REGISTRY.register(GraphPoolCollector())
@@ -0,0 +1,100 @@
+# Generated by Django 5.2 on 2026-10-17 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowCypherQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "graph_name",
+                    models.CharField(
+                        help_text="The age name of the graph the query ran against",
+                        max_length=1000,
+                        null=True,
+                    ),
+                ),
+                (
+                    "function",
+                    models.CharField(
+                        help_text="The function that issued the query",
+                        max_length=1000,
+                    ),
+                ),
+                (
+                    "template",
+                    models.TextField(
+                        help_text="The normalized query (literals are replaced with ?)"
+                    ),
+                ),
+                (
+                    "fingerprint",
+                    models.CharField(
+                        help_text="A hash of the parameters of the execution",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "duration",
+                    models.FloatField(help_text="The execution time in milliseconds"),
+                ),
+                (
+                    "plan",
+                    models.JSONField(
+                        blank=True,
+                        help_text="The EXPLAIN (ANALYZE, BUFFERS) plan, if it was captured",
+                        null=True,
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="The time the execution was recorded",
+                    ),
+                ),
+                (
+                    "graph_query",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The graph query that was rendered, if any",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="slow_queries",
+                        to="core.graphquery",
+                    ),
+                ),
+                (
+                    "node_query",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The node query that was rendered, if any",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="slow_queries",
+                        to="core.nodequery",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_slowcypherquery"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reagentcategory",
+            name="active_reagent_id",
+            field=models.BigIntegerField(
+                blank=True,
+                help_text="The age id of the active reagent of this class (new protocol events use it by default)",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_reagentcategory_active_reagent_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="graphquery",
+            name="cache_render",
+            field=models.BooleanField(
+                default=True,
+                help_text="Whether renders of this query are served from the render cache",
+            ),
+        ),
+        migrations.AddField(
+            model_name="nodequery",
+            name="cache_render",
+            field=models.BooleanField(
+                default=True,
+                help_text="Whether renders of this query are served from the render cache",
+            ),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_graphquery_cache_render_nodequery_cache_render"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="materializedview",
+            name="table_name",
+            field=models.CharField(
+                blank=True,
+                help_text="The postgres table holding the snapshot of the query results",
+                max_length=63,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="materializedview",
+            name="query_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="The hash of the query definition the snapshot was taken with",
+                max_length=64,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="materializedview",
+            name="refreshed_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="The time the snapshot was last (re)built",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="materializedview",
+            name="row_count",
+            field=models.IntegerField(
+                blank=True,
+                help_text="The number of rows in the snapshot",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="materializedview",
+            name="max_age",
+            field=models.IntegerField(
+                blank=True,
+                help_text="The number of seconds the snapshot is served to renders after a refresh. If null, it is served until the query changes",
+                null=True,
+            ),
+        ),
+    ]
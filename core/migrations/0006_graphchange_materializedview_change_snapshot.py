@@ -0,0 +1,100 @@
+# Generated by Django 5.2 on 2026-10-17 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_materializedview_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GraphChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "graph_name",
+                    models.CharField(
+                        help_text="The age name of the graph that was changed",
+                        max_length=1000,
+                    ),
+                ),
+                (
+                    "element_id",
+                    models.BigIntegerField(
+                        help_text="The age id of the vertex or edge that was changed"
+                    ),
+                ),
+                (
+                    "label",
+                    models.CharField(
+                        help_text="The age label of the vertex or edge",
+                        max_length=1000,
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("VERTEX", "Vertex"), ("EDGE", "Edge")],
+                        help_text="Whether a vertex or an edge was changed",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "operation",
+                    models.CharField(
+                        choices=[
+                            ("CREATE", "Create"),
+                            ("UPDATE", "Update"),
+                            ("DELETE", "Delete"),
+                        ],
+                        help_text="How the element was changed",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, help_text="The time the change was recorded"
+                    ),
+                ),
+                (
+                    "transaction_id",
+                    models.BigIntegerField(
+                        help_text="The id of the transaction that recorded the change (txid_current)"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["graph_name", "id"],
+                        name="core_graphchange_graph_id",
+                    ),
+                    models.Index(
+                        fields=["graph_name", "transaction_id"],
+                        name="core_graphchange_graph_txid",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="materializedview",
+            name="change_snapshot",
+            field=models.TextField(
+                blank=True,
+                help_text="The transaction snapshot (txid_current_snapshot) the graph changes were read in. Changes of transactions that are not visible in it are not part of the snapshot",
+                null=True,
+            ),
+        ),
+    ]
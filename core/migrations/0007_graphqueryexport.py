@@ -0,0 +1,107 @@
+# Generated by Django 5.2 on 2026-10-17 18:20
+
+import core.enums
+import django.db.models.deletion
+import django_choices_field.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_graphchange_materializedview_change_snapshot"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GraphQueryExport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    django_choices_field.fields.TextChoicesField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("RUNNING", "Running"),
+                            ("DONE", "Done"),
+                            ("FAILED", "Failed"),
+                        ],
+                        choices_enum=core.enums.ExportStatusChoices,
+                        default="PENDING",
+                        help_text="The state of the export",
+                        max_length=7,
+                    ),
+                ),
+                (
+                    "row_count",
+                    models.IntegerField(
+                        blank=True, help_text="The number of exported rows", null=True
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True,
+                        help_text="Why the export failed, if it did",
+                        null=True,
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, help_text="The time the export was requested"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True,
+                        help_text="The time the export finished or failed",
+                        null=True,
+                    ),
+                ),
+                (
+                    "creator",
+                    models.ForeignKey(
+                        help_text="The user that requested the export",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="graph_query_exports",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "query",
+                    models.ForeignKey(
+                        help_text="The query whose results are exported",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="exports",
+                        to="core.graphquery",
+                    ),
+                ),
+                (
+                    "store",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The media store holding the Parquet file, once the export is done",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="graph_query_exports",
+                        to="core.mediastore",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -640,6 +640,11 @@ class ReagentCategory(NodeCategory):
         max_length=1000,
         help_text="The label of the entity class",
     )
+    active_reagent_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="The age id of the active reagent of this class (new protocol events use it by default)",
+    )
 
     def get_age_vertex_name(self):
         return "Reagent"
@@ -779,6 +784,10 @@ class GraphQuery(models.Model):
         related_name="relevant_graph_queries",
         help_text="The expression that this query should be mostly used for",
     )
+    cache_render = models.BooleanField(
+        default=True,
+        help_text="Whether renders of this query are served from the render cache",
+    )
 
     @property
     def input_columns(self):
@@ -824,6 +833,10 @@ class NodeQuery(models.Model):
         related_name="relevant_node_queries",
         help_text="The entities that this query should be mostly used for",
     )
+    cache_render = models.BooleanField(
+        default=True,
+        help_text="Whether renders of this query are served from the render cache",
+    )
 
     @property
     def input_columns(self):
@@ -866,6 +879,169 @@ class MaterializedView(models.Model):
         null=True,
         blank=True,
     )
+    table_name = models.CharField(
+        max_length=63,
+        null=True,
+        blank=True,
+        help_text="The postgres table holding the snapshot of the query results",
+    )
+    query_hash = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        help_text="The hash of the query definition the snapshot was taken with",
+    )
+    refreshed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="The time the snapshot was last (re)built",
+    )
+    row_count = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="The number of rows in the snapshot",
+    )
+    max_age = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="The number of seconds the snapshot is served to renders after a refresh. If null, it is served until the query changes",
+    )
+    change_snapshot = models.TextField(
+        null=True,
+        blank=True,
+        help_text="The transaction snapshot (txid_current_snapshot) the graph changes were read in. Changes of transactions that are not visible in it are not part of the snapshot",
+    )
+
+
+class GraphChange(models.Model):
+    """A vertex or edge that was written to a graph (see core.changelog)"""
+
+    graph_name = models.CharField(
+        max_length=1000, help_text="The age name of the graph that was changed"
+    )
+    element_id = models.BigIntegerField(
+        help_text="The age id of the vertex or edge that was changed"
+    )
+    label = models.CharField(
+        max_length=1000, help_text="The age label of the vertex or edge"
+    )
+    kind = models.CharField(
+        max_length=10,
+        choices=[("VERTEX", "Vertex"), ("EDGE", "Edge")],
+        help_text="Whether a vertex or an edge was changed",
+    )
+    operation = models.CharField(
+        max_length=10,
+        choices=[("CREATE", "Create"), ("UPDATE", "Update"), ("DELETE", "Delete")],
+        help_text="How the element was changed",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="The time the change was recorded"
+    )
+    transaction_id = models.BigIntegerField(
+        help_text="The id of the transaction that recorded the change (txid_current)",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["graph_name", "id"], name="core_graphchange_graph_id"),
+            models.Index(
+                fields=["graph_name", "transaction_id"],
+                name="core_graphchange_graph_txid",
+            ),
+        ]
+
+
+class SlowCypherQuery(models.Model):
+    """A cypher execution that ran longer than the slow query threshold"""
+
+    graph_name = models.CharField(
+        max_length=1000,
+        null=True,
+        help_text="The age name of the graph the query ran against",
+    )
+    function = models.CharField(
+        max_length=1000, help_text="The function that issued the query"
+    )
+    template = models.TextField(
+        help_text="The normalized query (literals are replaced with ?)"
+    )
+    fingerprint = models.CharField(
+        max_length=100, help_text="A hash of the parameters of the execution"
+    )
+    duration = models.FloatField(help_text="The execution time in milliseconds")
+    plan = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="The EXPLAIN (ANALYZE, BUFFERS) plan, if it was captured",
+    )
+    graph_query = models.ForeignKey(
+        GraphQuery,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="slow_queries",
+        help_text="The graph query that was rendered, if any",
+    )
+    node_query = models.ForeignKey(
+        NodeQuery,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="slow_queries",
+        help_text="The node query that was rendered, if any",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="The time the execution was recorded"
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class GraphQueryExport(models.Model):
+    """A Parquet export of the results of a TABLE graph query, built in the background"""
+
+    query = models.ForeignKey(
+        GraphQuery,
+        on_delete=models.CASCADE,
+        related_name="exports",
+        help_text="The query whose results are exported",
+    )
+    creator = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="graph_query_exports",
+        help_text="The user that requested the export",
+    )
+    status = TextChoicesField(
+        choices_enum=enums.ExportStatusChoices,
+        default=enums.ExportStatusChoices.PENDING,
+        help_text="The state of the export",
+    )
+    store = models.ForeignKey(
+        MediaStore,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="graph_query_exports",
+        help_text="The media store holding the Parquet file, once the export is done",
+    )
+    row_count = models.IntegerField(
+        null=True, blank=True, help_text="The number of exported rows"
+    )
+    error = models.TextField(
+        null=True, blank=True, help_text="Why the export failed, if it did"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="The time the export was requested"
+    )
+    finished_at = models.DateTimeField(
+        null=True, blank=True, help_text="The time the export finished or failed"
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
 
 
 class ScatterPlot(models.Model):
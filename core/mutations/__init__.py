@@ -12,6 +12,8 @@ from .protocol_event import *
 from .structure import *
 from .graph_query import *
 from .node_query import *
+from .materialized_view import *
+from .export import *
 from .structure_category import *
 from .metric_category import *
 from .natural_event_category import *
@@ -1,6 +1,6 @@
 from kante.types import Info
 import strawberry
-from core import types, models, age
+from core import types, models, age, metadata
 import uuid
 
 
@@ -28,7 +28,7 @@ def create_entity(
     input: EntityInput,
 ) -> types.Entity:
 
-    entity_category = models.EntityCategory.objects.get(id=input.entity_category)
+    entity_category = metadata.get_category(models.EntityCategory, input.entity_category)
 
     id = age.create_age_entity(
         entity_category, name=input.name, external_id=input.external_id
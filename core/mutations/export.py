@@ -0,0 +1,28 @@
+from kante.types import Info
+
+import strawberry
+from django.core.exceptions import PermissionDenied
+from core import types, models, enums, export
+from core.permissions import has_graph_access
+
+
+@strawberry.input(description="Input for exporting a TABLE graph query")
+class ExportGraphQueryInput:
+    query: strawberry.ID = strawberry.field(
+        description="The ID of the graph query to export"
+    )
+
+
+def export_graph_query(
+    info: Info,
+    input: ExportGraphQueryInput,
+) -> types.GraphQueryExport:
+    query = models.GraphQuery.objects.select_related("graph").get(id=input.query)
+
+    if not has_graph_access(info.context.request.user, query.graph):
+        raise PermissionDenied("You do not have access to the graph of this query")
+
+    if query.kind != enums.ViewKind.TABLE:
+        raise ValueError("Only TABLE graph queries can be exported")
+
+    return export.start_export(query, info.context.request.user)
@@ -36,6 +36,10 @@ class GraphQueryInput:
         default=None,
         description="Whether to pin this expression for the current user",
     )
+    cache_render: bool = strawberry.field(
+        default=True,
+        description="Whether renders of this query may be served from the render cache. Disable for queries whose result changes without writes to the graph",
+    )
 
 
 @strawberry.input(description="Input for updating an existing expression")
@@ -71,6 +75,7 @@ def create_graph_query(
             columns=(
                 [strawberry.asdict(c) for c in input.columns] if input.columns else []
             ),
+            cache_render=input.cache_render,
         ),
     )
 
@@ -0,0 +1,74 @@
+from kante.types import Info
+
+import strawberry
+from core import types, models, enums, materialized
+
+
+@strawberry.input(description="Input for materializing a TABLE graph query")
+class MaterializeGraphQueryInput:
+    query: strawberry.ID = strawberry.field(
+        description="The ID of the graph query to materialize"
+    )
+    max_age: int | None = strawberry.field(
+        default=None,
+        description="The number of seconds the snapshot is served to renders after a refresh. If not provided, it is served until the query changes",
+    )
+
+
+@strawberry.input(description="Input for refreshing a materialized view")
+class RefreshMaterializedViewInput:
+    id: strawberry.ID = strawberry.field(
+        description="The ID of the materialized view to refresh"
+    )
+    full: bool = strawberry.field(
+        default=False,
+        description="Rebuild the snapshot even if it could be refreshed incrementally",
+    )
+
+
+@strawberry.input(description="Input for deleting a materialized view")
+class DeleteMaterializedViewInput:
+    id: strawberry.ID = strawberry.field(
+        description="The ID of the materialized view to delete"
+    )
+
+
+def materialize_graph_query(
+    info: Info,
+    input: MaterializeGraphQueryInput,
+) -> types.MaterializedView:
+    query = models.GraphQuery.objects.select_related("graph").get(id=input.query)
+
+    if query.kind != enums.ViewKind.TABLE:
+        raise ValueError("Only TABLE graph queries can be materialized")
+
+    view = models.MaterializedView.objects.create(
+        query=query,
+        creator=info.context.request.user,
+        max_age=input.max_age,
+    )
+
+    try:
+        return materialized.refresh(view)
+    except Exception as e:
+        view.delete()
+        raise Exception(f"Failed to materialize graph query: {e}")
+
+
+def refresh_materialized_view(
+    info: Info,
+    input: RefreshMaterializedViewInput,
+) -> types.MaterializedView:
+    view = models.MaterializedView.objects.select_related("query__graph").get(
+        id=input.id
+    )
+    return materialized.refresh(view, full=input.full)
+
+
+def delete_materialized_view(
+    info: Info,
+    input: DeleteMaterializedViewInput,
+) -> strawberry.ID:
+    item = models.MaterializedView.objects.get(id=input.id)
+    item.delete()
+    return input.id
@@ -5,7 +5,7 @@ from core.utils import (
     scalar_string_to_graph_name,
 )
 import strawberry
-from core import types, models, age, inputs, scalars, enums
+from core import types, models, age, inputs, scalars, enums, metadata
 import uuid
 import datetime
 import re
@@ -33,7 +33,7 @@ def create_measurement(
     input: MeasurementInput,
 ) -> types.Measurement:
 
-    input_kind = models.MeasurementCategory.objects.get(id=input.category)
+    input_kind = metadata.get_category(models.MeasurementCategory, input.category)
 
     entity_graph_name = node_id_to_graph_name(input.entity)
     entity_id = node_id_to_graph_id(input.entity)
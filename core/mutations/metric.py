@@ -5,7 +5,7 @@ from core.utils import (
     scalar_string_to_graph_name,
 )
 import strawberry
-from core import types, models, age, inputs, scalars, enums
+from core import types, models, age, inputs, scalars, enums, metadata
 import uuid
 import datetime
 import re
@@ -39,7 +39,7 @@ def create_metric(
     structure_id = node_id_to_graph_id(input.structure)
     structure_graph_name = node_id_to_graph_name(input.structure)
 
-    metric_category = models.MetricCategory.objects.get(id=input.category)
+    metric_category = metadata.get_category(models.MetricCategory, input.category)
     assert metric_category.graph.age_name == structure_graph_name, f"Graph names do not match {metric_category.graph.age_name} != {structure_graph_name}"
 
     value = age.create_age_metric(
@@ -6,7 +6,7 @@ from core.utils import (
 )
 from .utils import get_nessessary_inedges, get_nessessary_outedges
 import strawberry
-from core import types, models, age, inputs, scalars, enums, inputs
+from core import types, models, age, inputs, scalars, enums, inputs, metadata
 import uuid
 import datetime
 import re
@@ -34,7 +34,7 @@ def record_natural_event(
 ) -> types.NaturalEvent:
 
     
-    natural_event = models.NaturalEventCategory.objects.get(id=input.category)
+    natural_event = metadata.get_category(models.NaturalEventCategory, input.category)
 
     # TODO: VALIDATE EVERYTHING
 
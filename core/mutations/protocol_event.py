@@ -6,7 +6,7 @@ from core.utils import (
 )
 from .utils import get_nessessary_inedges, get_nessessary_outedges
 import strawberry
-from core import types, models, age, inputs, scalars, enums, inputs
+from core import types, models, age, inputs, scalars, enums, inputs, metadata
 import uuid
 import datetime
 import re
@@ -36,7 +36,7 @@ def record_protocol_event(
     input: RecordProtocolEventInput,
 ) -> types.ProtocolEvent:
 
-    protocol_event = models.ProtocolEventCategory.objects.get(id=input.category)
+    protocol_event = metadata.get_category(models.ProtocolEventCategory, input.category)
 
     # TODO: VALIDATE EVERYTHING
 
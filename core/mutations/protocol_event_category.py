@@ -242,7 +242,7 @@ def update_protocol_event_category(
 
     item.save()
     
-    loaders.protocol_event_category_loader.clear(item.id)
+    loaders.get_loaders().protocol_event_category_loader.clear(item.id)
     return item
 
 
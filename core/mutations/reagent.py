@@ -1,6 +1,6 @@
 from kante.types import Info
 import strawberry
-from core import types, models, age
+from core import types, models, age, metadata
 import uuid
 
 
@@ -31,7 +31,7 @@ def create_reagent(
     input: ReagentInput,
 ) -> types.Reagent:
 
-    input_kind = models.ReagentCategory.objects.get(id=input.reagent_category)
+    input_kind = metadata.get_category(models.ReagentCategory, input.reagent_category)
 
     print(input_kind.graph.age_name)
     id = age.create_age_reagent(
@@ -39,7 +39,11 @@ def create_reagent(
     )
 
     if input.set_active:
-        age.set_as_active_reagent_for_category(input_kind, id)
+        # Cached categories are shared and read only, the write needs its own
+        category = models.ReagentCategory.objects.select_related("graph").get(
+            id=input_kind.id
+        )
+        age.set_as_active_reagent_for_category(category, id.id)
 
     return types.Reagent(_value=id)
 
@@ -1,7 +1,7 @@
 from kante.types import Info
 from core.utils import node_id_to_graph_id, node_id_to_graph_name
 import strawberry
-from core import types, models, age, inputs
+from core import types, models, age, inputs, metadata
 
 
 @strawberry.input(description="Input type for creating a relation between two entities")
@@ -34,7 +34,7 @@ def create_relation(
     input: RelationInput,
 ) -> types.Relation:
 
-    category = models.RelationCategory.objects.get(id=input.category)
+    category = metadata.get_category(models.RelationCategory, input.category)
 
     left_graph = node_id_to_graph_name(input.source)
     right_graph = node_id_to_graph_name(input.target)
@@ -43,7 +43,7 @@ def create_relation(
         left_graph == right_graph
     ), "Cannot create a relation between entities in different graphs"
 
-    tleft_graph = models.Graph.objects.get(age_name=left_graph)
+    tleft_graph = metadata.get_graph_by_age_name(left_graph)
 
     retrieve = age.create_age_relation(
         category,
@@ -1,6 +1,6 @@
 from kante.types import Info
 import strawberry
-from core import types, models, age, inputs, scalars, enums, manager
+from core import types, models, age, inputs, scalars, enums, manager, metadata
 import uuid
 import datetime
 import re
@@ -56,17 +56,24 @@ def create_structure(
     input: StructureInput,
 ) -> types.Structure:
 
-    graph = models.Graph.objects.get(id=input.graph)
+    graph = metadata.get_graph(input.graph)
 
     age_name, identifier, object_id = scalar_string_to_graph_name(input.structure)
 
-    category, created = models.StructureCategory.objects.get_or_create(
-        age_name=manager.build_structure_age_name(identifier),
-        graph=graph,
-        defaults=dict(
-            identifier=identifier,
-        ),
-    )
+    try:
+        category = metadata.get_category_by_age_name(
+            models.StructureCategory,
+            graph.age_name,
+            manager.build_structure_age_name(identifier),
+        )
+    except models.StructureCategory.DoesNotExist:
+        category, created = models.StructureCategory.objects.get_or_create(
+            age_name=manager.build_structure_age_name(identifier),
+            graph=graph,
+            defaults=dict(
+                identifier=identifier,
+            ),
+        )
 
     structure = age.create_age_structure(
         category,
@@ -1,9 +1,47 @@
-from core import age, inputs
+from core import age, inputs, models
+
+
+def get_active_defaults(
+    role_definitions, mappings: list[inputs.NodeMapping], queryset
+):
+    """Get the active reagents of all roles that default to them, by category id
+
+    All defaults of the role definitions are retrieved together instead of
+    once per role. Only reagent categories have an active reagent, roles of
+    other categories (e.g. entity roles) get no default.
+    """
+    if queryset.model is not models.ReagentCategory:
+        return {}
+
+    category_ids = {
+        int(role_definition["category_definition"]["default_use_active"])
+        for role_definition in role_definitions
+        if not role_definition["optional"]
+        and role_definition["category_definition"].get("default_use_active")
+        and not any(x.key == role_definition["role"] for x in mappings)
+    }
+    if not category_ids:
+        return {}
+
+    return age.get_active_reagents_for_reagent_categories(
+        list(queryset.select_related("graph").filter(id__in=category_ids))
+    )
+
+
+def _active_default(active_defaults, category_id, role):
+    active = active_defaults.get(int(category_id))
+    if active is None:
+        raise ValueError(
+            f"No active reagent to default to for role {role}. Only roles of "
+            "reagent categories can default to the active reagent"
+        )
+    return active
 
 def get_nessessary_inedges(
     role_definitions, sources: list[inputs.NodeMapping], queryset
 ):
     necessary_edges = []
+    active_defaults = get_active_defaults(role_definitions, sources, queryset)
 
     for role_definition in role_definitions:
 
@@ -22,10 +60,8 @@ def get_nessessary_inedges(
                     role_fullfillers = [
                         inputs.NodeMapping(
                             key=role,
-                            node=age.get_active_reagent_for_reagent_category(
-                                queryset.get(
-                                    id=default_use_active,
-                                )
+                            node=_active_default(
+                                active_defaults, default_use_active, role
                             ).unique_id,
                             quantity=None,
                         )
@@ -65,6 +101,7 @@ def get_nessessary_outedges(
     role_definitions, target: list[inputs.NodeMapping], queryset
 ):
     necessary_edges = []
+    active_defaults = get_active_defaults(role_definitions, target, queryset)
 
     for role_definition in role_definitions:
 
@@ -83,10 +120,8 @@ def get_nessessary_outedges(
                     role_fullfillers = [
                         inputs.NodeMapping(
                             key=role,
-                            node=age.get_active_reagent_for_reagent_category(
-                                queryset.get(
-                                    id=default_use_active,
-                                )
+                            node=_active_default(
+                                active_defaults, default_use_active, role
                             ).unique_id,
                             quantity=None,
                         )
@@ -1,3 +1,4 @@
+from contextlib import closing
 from core import models, types, enums, filters as f, pagination as p, age
 import strawberry
 from kante.types import Info
@@ -24,7 +25,6 @@ def nodes(
     )
     print(graph.name)
 
-    return [
-        types.Entity(_value=entity)
-        for entity in age.select_all_entities(graph.age_name, pagination, filters)
-    ]
+    entities = age.select_all_entities(graph.age_name, pagination, filters)
+    with closing(entities):
+        return [types.Entity(_value=entity) for entity in entities]
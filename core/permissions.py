@@ -0,0 +1,19 @@
+from strawberry.permission import BasePermission
+from kante.types import Info
+
+
+class IsAdmin(BasePermission):
+    """Only allows staff users"""
+
+    message = "You need to be an admin to access this"
+
+    def has_permission(self, source, info: Info, **kwargs) -> bool:
+        user = info.context.request.user
+        return user is not None and user.is_staff
+
+
+def has_graph_access(user, graph) -> bool:
+    """Whether the user owns the graph or was granted view access to it"""
+    if user is None or not user.is_authenticated:
+        return False
+    return graph.user_id == user.id or user.has_perm("core.view_graph", graph)
@@ -1,3 +1,4 @@
+from contextlib import closing
 from core import models, types, enums, filters as f, pagination as p, age
 import strawberry
 
@@ -24,7 +25,6 @@ def edges(
 
     print("Called")
 
-    return [
-        types.Edge(_value=rel)
-        for rel in age.select_all_relations(graph.age_name, pagination, filters)
-    ]
+    relations = age.select_all_relations(graph.age_name, pagination, filters)
+    with closing(relations):
+        return [types.Edge(_value=rel) for rel in relations]
@@ -0,0 +1,150 @@
+"""Cache for the results of GraphQuery and NodeQuery renders
+
+Rendered results are stored in the django cache (redis) under a key made of
+the query id, a hash of the query text, the node id and the write-version of
+the graph. Every core.age function that writes to a graph bumps its
+write-version (see `invalidates_graph`), so cached renders of a graph are
+never served after it changed, and the stale entries simply expire.
+
+Queries with `cache_render` disabled are always rendered.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import typing
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from core.metrics import RENDER_CACHE_LOOKUPS
+
+
+logger = logging.getLogger(__name__)
+
+
+def render_cache_enabled() -> bool:
+    return bool(settings.RENDER_CACHE.get("ENABLED", False))
+
+
+def _version_key(graph_name: str) -> str:
+    return f"render:version:{graph_name}"
+
+
+def graph_version(graph_name: str) -> int:
+    return cache.get(_version_key(graph_name), 0)
+
+
+def _bump(graph_name: str) -> None:
+    key = _version_key(graph_name)
+    try:
+        # add is a no-op if the version exists, incr is atomic in redis
+        cache.add(key, 0, None)
+        cache.incr(key)
+    except Exception as e:
+        logger.warning("Could not bump the write-version of %s: %s", graph_name, e)
+
+
+def bump_graph_version(graph_name: str) -> None:
+    """Invalidate all cached renders of the graph
+
+    Inside a transaction the version is bumped again on commit, so renders
+    that were cached while the transaction was still running (and did not
+    see its writes) are not served afterwards.
+    """
+    if not render_cache_enabled():
+        return
+
+    _bump(graph_name)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(graph_name))
+
+
+def query_hash(query) -> str:
+    """A hash of everything that defines the result of a saved query"""
+    definition = json.dumps(
+        [query.query, str(getattr(query.kind, "value", query.kind)), query.columns],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.blake2b(definition.encode(), digest_size=16).hexdigest()
+
+
+def render_key(
+    renderer: str, query, node_id: str | None, version: int, page: str | None = None
+) -> str:
+    return (
+        f"render:{renderer}:{query.id}:{query_hash(query)}:"
+        f"{node_id or '-'}:{page or '-'}:{version}"
+    )
+
+
+def page_key(pagination) -> str | None:
+    if pagination is None:
+        return None
+    return f"{pagination.limit}+{pagination.offset or 0}"
+
+
+async def acached_render(
+    renderer: str, query, node_id: str | None, render, pagination=None
+):
+    """Return the cached render of the query or render (and cache) it"""
+    if not render_cache_enabled() or not query.cache_render:
+        return await render()
+
+    from core import metadata
+
+    graph = await sync_to_async(metadata.get_graph)(query.graph_id)
+
+    try:
+        version = await cache.aget(_version_key(graph.age_name), 0)
+        key = render_key(renderer, query, node_id, version, page_key(pagination))
+        result = await cache.aget(key)
+    except Exception as e:
+        logger.warning("Could not read from the render cache: %s", e)
+        return await render()
+
+    if result is not None:
+        RENDER_CACHE_LOOKUPS.labels(renderer, "hit").inc()
+        return result
+
+    RENDER_CACHE_LOOKUPS.labels(renderer, "miss").inc()
+    result = await render()
+
+    try:
+        await cache.aset(key, result, settings.RENDER_CACHE.get("TTL", 300))
+    except Exception as e:
+        logger.warning("Could not write to the render cache: %s", e)
+
+    return result
+
+
+def _graph_name(target) -> str | None:
+    """The graph written by a core.age function, taken from its first argument
+
+    The first argument is either the age name of the graph or an object
+    belonging to it (a category or sequence).
+    """
+    if isinstance(target, str):
+        return target
+    return getattr(getattr(target, "graph", None), "age_name", None)
+
+
+F = typing.TypeVar("F", bound=typing.Callable)
+
+
+def invalidates_graph(func: F) -> F:
+    """Decorate a core.age write function to bump the graph's write-version"""
+    first = next(iter(inspect.signature(func).parameters))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        graph_name = _graph_name(args[0] if args else kwargs.get(first))
+        if graph_name is not None:
+            bump_graph_version(graph_name)
+        return result
+
+    return typing.cast(F, wrapper)
@@ -2,6 +2,7 @@ import json
 from core.age import (
     RetrievedEntity,
     graph_cursor,
+    agraph_cursor,
     RetrievedRelation,
     vertex_ag_to_retrieved_entity,
 )
@@ -15,6 +16,16 @@ from kante.types import Info
 from core.renderers.utils import parse_age_path
 
 
+def path_query(tgraph: models.Graph, query: str):
+    real_query = f"""
+    SELECT *
+    FROM cypher(%s, $$
+        {query}
+    $$) as (path agtype);
+    """
+    return real_query, [tgraph.age_name]
+
+
 def path(graph_query: models.GraphQuery) -> types.Path:
     """
     Query the knowledge graph for information about a given entity.
@@ -29,34 +40,35 @@ def path(graph_query: models.GraphQuery) -> types.Path:
     all_nodes = []
     all_edges = []
 
-    print("Called")
-
     tgraph = graph_query.graph
     query = graph_query.query
 
-    # First set the timeout
-    real_query = f"""
-    SELECT *
-    FROM cypher(%s, $$
-        {query}
-    $$) as (path agtype);
-    """
-
-    print(real_query)
+    real_query, params = path_query(tgraph, query)
 
     with graph_cursor() as cursor:
-        cursor.execute(
-            real_query,
-            [tgraph.age_name],
-        )
+        cursor.execute(real_query, params)
         all_results = cursor.fetchall()
 
-        print("The result", all_results)
+        for result in all_results:
+            nodes, edges = parse_age_path(tgraph.age_name, result[0])
+            all_nodes.extend(nodes)
+            all_edges.extend(edges)
+
+    return types.Path(nodes=all_nodes, edges=all_edges)
 
-        # Convert AGTYPE (JSON string) to Python dict
 
-        for result in all_results:
+async def apath(graph_query: models.GraphQuery) -> types.Path:
+    """Async version of `path`, runs on the async graph pool"""
+
+    all_nodes = []
+    all_edges = []
+
+    tgraph = await models.Graph.objects.aget(id=graph_query.graph_id)
+
+    async with agraph_cursor() as cursor:
+        await cursor.execute(*path_query(tgraph, graph_query.query))
 
+        for result in await cursor.fetchall():
             nodes, edges = parse_age_path(tgraph.age_name, result[0])
             all_nodes.extend(nodes)
             all_edges.extend(edges)
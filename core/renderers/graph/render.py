@@ -6,25 +6,63 @@ from core.age import (
     vertex_ag_to_retrieved_entity,
 )
 import strawberry
-from core import models, types, enums
+from core import models, types, enums, metrics, slowlog, render_cache, materialized
+from core import pagination as p
 import re
 import json
 import re
 import json
 from kante.types import Info
 from core.renderers.utils import parse_age_path
-from .path import path
-from .table import table
+from .path import path, apath
+from .table import table, atable, asnapshot
 from .pairs import pairs
 
 
+@metrics.observe_render("graph")
 def render_graph_query(graph_query: models.GraphQuery):
+    with slowlog.saved_query(graph_query):
+        if graph_query.kind == enums.ViewKind.PATH:
+            return path(graph_query)
+        if graph_query.kind == enums.ViewKind.TABLE:
+            return table(graph_query)
+        if graph_query.kind == enums.ViewKind.PAIRS:
+            return pairs(graph_query)
 
-    if graph_query.kind == enums.ViewKind.PATH:
-        return path(graph_query)
-    if graph_query.kind == enums.ViewKind.TABLE:
-        return table(graph_query)
-    if graph_query.kind == enums.ViewKind.PAIRS:
-        return pairs(graph_query)
+        raise ValueError("Unknown view kind")
 
-    raise ValueError("Unknown view kind")
+
+@metrics.observe_render("graph")
+async def arender_graph_query(
+    graph_query: models.GraphQuery,
+    pagination: p.TablePaginationInput | None = None,
+):
+    """Render the query, served from the render cache if possible
+
+    The pagination only applies to TABLE queries.
+    """
+    if graph_query.kind != enums.ViewKind.TABLE:
+        pagination = None
+
+    return await render_cache.acached_render(
+        "graph",
+        graph_query,
+        None,
+        lambda: _arender_graph_query(graph_query, pagination),
+        pagination,
+    )
+
+
+async def _arender_graph_query(graph_query: models.GraphQuery, pagination=None):
+    with slowlog.saved_query(graph_query):
+        if graph_query.kind == enums.ViewKind.PATH:
+            return await apath(graph_query)
+        if graph_query.kind == enums.ViewKind.TABLE:
+            view = await materialized.afresh_view(graph_query)
+            if view is not None:
+                return await asnapshot(graph_query, view, pagination)
+            return await atable(graph_query, pagination)
+        if graph_query.kind == enums.ViewKind.PAIRS:
+            return pairs(graph_query)
+
+        raise ValueError("Unknown view kind")
@@ -2,16 +2,24 @@ import json
 from core.age import (
     RetrievedEntity,
     graph_cursor,
+    agraph_cursor,
     RetrievedRelation,
     vertex_ag_to_retrieved_entity,
 )
 import strawberry
-from core import models, types, inputs
+from core import models, types, inputs, agtype, materialized, pagination as p
 import re
 import json
 import re
 import json
 from kante.types import Info
+from core.renderers.utils import (
+    aestimate_plan,
+    estimate_plan,
+    needs_estimate,
+    page_total,
+    paginate_query,
+)
 
 
 def columns_to_age_string(columns: list[inputs.ColumnInput]):
@@ -22,7 +30,20 @@ def input_to_columns(columns: list[inputs.ColumnInput]) -> list[types.Column]:
     return [types.Column(**strawberry.asdict(column)) for column in columns]
 
 
-def table(graph_query: models.GraphQuery) -> types.Table:
+def table_query(tgraph: models.Graph, query: str, columns: list[inputs.ColumnInput]):
+    real_query = f"""
+    SELECT *
+    FROM cypher(%s, $$
+        {query}
+    $$) as ({columns_to_age_string(columns)});
+    """
+    return real_query, [tgraph.age_name]
+
+
+def table(
+    graph_query: models.GraphQuery,
+    pagination: p.TablePaginationInput | None = None,
+) -> types.Table:
     """
     Query the knowledge graph for information about a given entity.
 
@@ -34,35 +55,76 @@ def table(graph_query: models.GraphQuery) -> types.Table:
     """
 
     rows = []
-    print("Called")
 
     tgraph = graph_query.graph
     query = graph_query.query
     columns = graph_query.input_columns
-    print(tgraph.age_name)
 
-    # First set the timeout
-    real_query = f"""
-    SELECT *
-    FROM cypher(%s, $$
-        {query}
-    $$) as ({columns_to_age_string(columns)});
-    """
-
-    print(real_query)
+    real_query, params = table_query(tgraph, query, columns)
+    estimate = None
 
     with graph_cursor() as cursor:
         cursor.execute(
-            real_query,
-            [tgraph.age_name],
+            *paginate_query(real_query, params, pagination, len(columns))
         )
         all_results = cursor.fetchall()
 
-        print("The result", all_results)
+        for result in all_results:
+            rows.append(agtype.to_jsonable(result))
+
+        if needs_estimate(pagination, rows):
+            estimate = estimate_plan(cursor, real_query, params)
 
-        # Convert AGTYPE (JSON string) to Python dict
+    return types.Table(
+        rows=rows,
+        columns=input_to_columns(columns),
+        graph=tgraph,
+        total=page_total(pagination, rows, estimate),
+    )
 
-        for result in all_results:
-            rows.append(result)
 
-    return types.Table(rows=rows, columns=input_to_columns(columns), graph=tgraph)
+async def atable(
+    graph_query: models.GraphQuery,
+    pagination: p.TablePaginationInput | None = None,
+) -> types.Table:
+    """Async version of `table`, runs on the async graph pool"""
+
+    tgraph = await models.Graph.objects.aget(id=graph_query.graph_id)
+    columns = graph_query.input_columns
+    real_query, params = table_query(tgraph, graph_query.query, columns)
+    estimate = None
+
+    async with agraph_cursor() as cursor:
+        await cursor.execute(
+            *paginate_query(real_query, params, pagination, len(columns))
+        )
+        rows = [agtype.to_jsonable(result) for result in await cursor.fetchall()]
+
+        if needs_estimate(pagination, rows):
+            estimate = await aestimate_plan(cursor, real_query, params)
+
+    return types.Table(
+        rows=rows,
+        columns=input_to_columns(columns),
+        graph=tgraph,
+        total=page_total(pagination, rows, estimate),
+    )
+
+
+async def asnapshot(
+    graph_query: models.GraphQuery,
+    view: models.MaterializedView,
+    pagination: p.TablePaginationInput | None = None,
+) -> types.Table:
+    """Async version of `table` that reads the rows from a materialized view"""
+
+    tgraph = await models.Graph.objects.aget(id=graph_query.graph_id)
+    columns = graph_query.input_columns
+    rows = await materialized.aread(view, len(columns), pagination)
+
+    return types.Table(
+        rows=rows,
+        columns=input_to_columns(columns),
+        graph=tgraph,
+        total=view.row_count,
+    )
@@ -2,6 +2,7 @@ import json
 from core.age import (
     RetrievedEntity,
     graph_cursor,
+    agraph_cursor,
     RetrievedRelation,
     vertex_ag_to_retrieved_entity,
 )
@@ -15,6 +16,16 @@ from kante.types import Info
 from core.renderers.utils import parse_age_path
 
 
+def path_query(tgraph: models.Graph, query: str, node_id: str):
+    real_query = f"""
+    SELECT *
+    FROM cypher(%s, $$
+        {query}
+    $$) as (path agtype);
+    """
+    return real_query, [tgraph.age_name, int(age.to_entity_id(node_id))]
+
+
 def path(node_query: models.NodeQuery, node_id: str) -> types.Path:
     """
     Query the knowledge graph for information about a given entity.
@@ -29,36 +40,36 @@ def path(node_query: models.NodeQuery, node_id: str) -> types.Path:
     all_nodes = []
     all_edges = []
 
-    print("Called")
-
     tgraph = node_query.graph
     query = node_query.query
-    print(tgraph.age_name)
     node = node_id
 
-    # First set the timeout
-    real_query = f"""
-    SELECT *
-    FROM cypher(%s, $$
-        {query}
-    $$) as (path agtype);
-    """
-
-    print(real_query, age.to_entity_id(node))
+    real_query, params = path_query(tgraph, query, node)
 
     with graph_cursor() as cursor:
-        cursor.execute(
-            real_query,
-            [tgraph.age_name, int(age.to_entity_id(node))],
-        )
+        cursor.execute(real_query, params)
         all_results = cursor.fetchall()
 
-        print("The result", all_results)
+        for result in all_results:
+            nodes, edges = parse_age_path(tgraph.age_name, result[0])
+            all_nodes.extend(nodes)
+            all_edges.extend(edges)
+
+    return types.Path(nodes=all_nodes, edges=all_edges)
 
-        # Convert AGTYPE (JSON string) to Python dict
 
-        for result in all_results:
+async def apath(node_query: models.NodeQuery, node_id: str) -> types.Path:
+    """Async version of `path`, runs on the async graph pool"""
+
+    all_nodes = []
+    all_edges = []
+
+    tgraph = await models.Graph.objects.aget(id=node_query.graph_id)
+
+    async with agraph_cursor() as cursor:
+        await cursor.execute(*path_query(tgraph, node_query.query, node_id))
 
+        for result in await cursor.fetchall():
             nodes, edges = parse_age_path(tgraph.age_name, result[0])
             all_nodes.extend(nodes)
             all_edges.extend(edges)
@@ -6,25 +6,63 @@ from core.age import (
     vertex_ag_to_retrieved_entity,
 )
 import strawberry
-from core import models, types, enums
+from core import models, types, enums, metrics, slowlog, render_cache
+from core import pagination as p
 import re
 import json
 import re
 import json
 from kante.types import Info
 from core.renderers.utils import parse_age_path
-from .path import path
-from .table import table
+from .path import path, apath
+from .table import table, atable
 from .pairs import pairs
 
 
+@metrics.observe_render("node")
 def render_node_view(node_query: models.NodeQuery, node_id: str):
+    with slowlog.saved_query(node_query):
+        if node_query.kind == enums.ViewKind.PATH:
+            return path(node_query, node_id)
+        if node_query.kind == enums.ViewKind.TABLE:
+            return table(node_query, node_id)
+        if node_query.kind == enums.ViewKind.PAIRS:
+            return pairs(node_query, node_id)
 
-    if node_query.kind == enums.ViewKind.PATH:
-        return path(node_query, node_id)
-    if node_query.kind == enums.ViewKind.TABLE:
-        return table(node_query, node_id)
-    if node_query.kind == enums.ViewKind.PAIRS:
-        return pairs(node_query, node_id)
+        raise ValueError("Unknown view kind")
 
-    raise ValueError("Unknown view kind")
+
+@metrics.observe_render("node")
+async def arender_node_view(
+    node_query: models.NodeQuery,
+    node_id: str,
+    pagination: p.TablePaginationInput | None = None,
+):
+    """Render the query, served from the render cache if possible
+
+    The pagination only applies to TABLE queries.
+    """
+    if node_query.kind != enums.ViewKind.TABLE:
+        pagination = None
+
+    return await render_cache.acached_render(
+        "node",
+        node_query,
+        node_id,
+        lambda: _arender_node_view(node_query, node_id, pagination),
+        pagination,
+    )
+
+
+async def _arender_node_view(
+    node_query: models.NodeQuery, node_id: str, pagination=None
+):
+    with slowlog.saved_query(node_query):
+        if node_query.kind == enums.ViewKind.PATH:
+            return await apath(node_query, node_id)
+        if node_query.kind == enums.ViewKind.TABLE:
+            return await atable(node_query, node_id, pagination)
+        if node_query.kind == enums.ViewKind.PAIRS:
+            return pairs(node_query, node_id)
+
+        raise ValueError("Unknown view kind")
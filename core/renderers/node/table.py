@@ -2,17 +2,25 @@ import json
 from core.age import (
     RetrievedEntity,
     graph_cursor,
+    agraph_cursor,
     RetrievedRelation,
     vertex_ag_to_retrieved_entity,
     to_entity_id,
 )
 import strawberry
-from core import models, types, inputs
+from core import models, types, inputs, agtype, pagination as p
 import re
 import json
 import re
 import json
 from kante.types import Info
+from core.renderers.utils import (
+    aestimate_plan,
+    estimate_plan,
+    needs_estimate,
+    page_total,
+    paginate_query,
+)
 
 
 def columns_to_age_string(columns: list[inputs.ColumnInput]):
@@ -23,7 +31,22 @@ def input_to_columns(columns: list[inputs.ColumnInput]) -> list[types.Column]:
     return [types.Column(**strawberry.asdict(column)) for column in columns]
 
 
-def table(node_query: models.NodeQuery, node_id: str) -> types.Table:
+def table_query(
+    tgraph: models.Graph, query: str, columns: list[inputs.ColumnInput], node_id: str
+):
+    real_query = f"""
+    SELECT *
+    FROM cypher(%s, $$
+        {query}
+    $$) as ({columns_to_age_string(columns)});
+    """
+    return real_query, [tgraph.age_name, int(to_entity_id(node_id))]
+
+
+def table(
+    node_query: models.NodeQuery, node_id: str,
+    pagination: p.TablePaginationInput | None = None,
+) -> types.Table:
     """
     Query the knowledge graph for information about a given entity.
 
@@ -35,36 +58,57 @@ def table(node_query: models.NodeQuery, node_id: str) -> types.Table:
     """
 
     rows = []
-    print("Called")
 
     tgraph = node_query.graph
     query = node_query.query
     columns = node_query.input_columns
-    node_id = to_entity_id(node_id)
-    print(tgraph.age_name)
 
-    # First set the timeout
-    real_query = f"""
-    SELECT *
-    FROM cypher(%s, $$
-        {query}
-    $$) as ({columns_to_age_string(columns)});
-    """
-
-    print(real_query, node_id)
+    real_query, params = table_query(tgraph, query, columns, node_id)
+    estimate = None
 
     with graph_cursor() as cursor:
         cursor.execute(
-            real_query,
-            [tgraph.age_name, int(node_id)],
+            *paginate_query(real_query, params, pagination, len(columns))
         )
         all_results = cursor.fetchall()
 
-        print("The result", all_results)
+        for result in all_results:
+            rows.append(agtype.to_jsonable(result))
 
-        # Convert AGTYPE (JSON string) to Python dict
+        if needs_estimate(pagination, rows):
+            estimate = estimate_plan(cursor, real_query, params)
 
-        for result in all_results:
-            rows.append(result)
+    return types.Table(
+        rows=rows,
+        columns=input_to_columns(columns),
+        graph=tgraph,
+        total=page_total(pagination, rows, estimate),
+    )
+
+
+async def atable(
+    node_query: models.NodeQuery, node_id: str,
+    pagination: p.TablePaginationInput | None = None,
+) -> types.Table:
+    """Async version of `table`, runs on the async graph pool"""
+
+    tgraph = await models.Graph.objects.aget(id=node_query.graph_id)
+    columns = node_query.input_columns
+    real_query, params = table_query(tgraph, node_query.query, columns, node_id)
+    estimate = None
+
+    async with agraph_cursor() as cursor:
+        await cursor.execute(
+            *paginate_query(real_query, params, pagination, len(columns))
+        )
+        rows = [agtype.to_jsonable(result) for result in await cursor.fetchall()]
+
+        if needs_estimate(pagination, rows):
+            estimate = await aestimate_plan(cursor, real_query, params)
 
-    return types.Table(rows=rows, columns=input_to_columns(columns), graph=tgraph)
+    return types.Table(
+        rows=rows,
+        columns=input_to_columns(columns),
+        graph=tgraph,
+        total=page_total(pagination, rows, estimate),
+    )
@@ -1,4 +1,7 @@
 import json
+import logging
+import re
+from asgiref.sync import sync_to_async
 from core.age import (
     RetrievedEntity,
     graph_cursor,
@@ -6,57 +9,140 @@ from core.age import (
     vertex_ag_to_retrieved_entity,
 )
 import strawberry
-from core import models, types, age
-import re
-import json
-import re
+from core import models, types, age, agtype, pagination as p
+from core.connection import AsyncCursorAdapter
 import json
 from kante.types import Info
 
 
-# Regular expressions to extract vertices and edges
-vertex_pattern = re.compile(
-    r"(\{(?:[^{}]|(?:\{[^{}]*\}))*\})::vertex(?=[,\]])"
-)  # Match balanced JSON for vertices
-edge_pattern = re.compile(
-    r"(\{(?:[^{}]|(?:\{[^{}]*\}))*\})::edge(?=[,\]])"
-)  # Match balanced JSON for edges
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+RETURN = re.compile(r"\bRETURN\b", re.IGNORECASE)
+ORDER_BY = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
 
 
 def parse_age_path(graph_name, raw_path) -> tuple[set[types.Node], set[types.Edge]]:
     nodes = set()
     edges = set()
 
-    # Extract all vertex JSON strings
-    for match in vertex_pattern.findall(raw_path):
-        print(match)
-        vertex_data = json.loads(match)  # Convert JSON string to dict
-        nodes.add(
-            types.entity_to_node_subtype(
-                RetrievedEntity(
-                    graph_name=graph_name,
-                    id=vertex_data["id"],
-                    kind_age_name=vertex_data["label"],
-                    properties=vertex_data.get("properties", {}),
-                )
-            )
-        )
-
-    # Extract all edge JSON strings
-    for match in edge_pattern.findall(raw_path):
-        print(match)
-        edge_data = json.loads(match)  # Convert JSON string to dict
-        edges.add(
-            types.relation_to_edge_subtype(
-                RetrievedRelation(
-                    graph_name=graph_name,
-                    id=edge_data["id"],
-                    kind_age_name=edge_data["label"],
-                    left_id=edge_data["start_id"],
-                    right_id=edge_data["end_id"],
-                    properties=edge_data["properties"],
-                )
-            )
-        )
+    if isinstance(raw_path, (str, bytes)):
+        elements = agtype.iter_path(raw_path, graph_name)
+    else:
+        elements = agtype.iter_elements(raw_path)
+
+    for element in elements:
+        element = agtype.canonical(graph_name, element)
+        if isinstance(element, RetrievedEntity):
+            nodes.add(types.entity_to_node_subtype(element))
+        else:
+            edges.add(types.relation_to_edge_subtype(element))
 
     return nodes, edges
+
+
+def is_ordered(query: str) -> bool:
+    """Whether the final RETURN clause of the query orders its rows
+
+    An ORDER BY of a WITH clause before it does not order the result.
+    """
+    query = STRING_LITERAL.sub("''", query)
+    returns = list(RETURN.finditer(query))
+    if not returns:
+        return False
+    return ORDER_BY.search(query, returns[-1].end()) is not None
+
+
+def paginate_query(
+    query: str,
+    params: list,
+    pagination: p.TablePaginationInput | None,
+    columns: int = 0,
+) -> tuple[str, list]:
+    """Wrap a table query so postgres stops after the requested page
+
+    Pages are only stable under a fixed order, queries whose RETURN has no
+    ORDER BY of its own are ordered by all of their `columns`. That sorts
+    the whole result for every page (a top-N sort for the first pages).
+    """
+    if pagination is None:
+        return query, params
+
+    query = query.strip().rstrip(";")
+    order = ""
+    if columns and not is_ordered(query):
+        order = " ORDER BY " + ", ".join(str(i) for i in range(1, columns + 1))
+
+    return (
+        f"SELECT * FROM ({query}) AS page{order} LIMIT %s OFFSET %s",
+        [*params, pagination.limit, pagination.offset or 0],
+    )
+
+
+def _plan_rows(plan) -> int:
+    if isinstance(plan, (str, bytes)):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def page_total(
+    pagination: p.TablePaginationInput | None, rows: list, estimate
+) -> int | None:
+    """The number of rows of the whole table
+
+    Exact if the page reached the end of the table, otherwise the planner
+    estimate is used (it is at least as large as the rows seen so far).
+    Only the first page is estimated (see `needs_estimate`), later pages
+    have no total until they reach the end.
+    """
+    if pagination is None:
+        return len(rows)
+
+    seen = (pagination.offset or 0) + len(rows)
+    if pagination.limit is None or len(rows) < pagination.limit:
+        return seen
+    if estimate is None:
+        return None
+    return max(_plan_rows(estimate), seen)
+
+
+def needs_estimate(pagination: p.TablePaginationInput | None, rows: list) -> bool:
+    """Whether the page needs the planner estimate for its total
+
+    Only a full first page does, clients keep that total while paging.
+    """
+    return (
+        pagination is not None
+        and not pagination.offset
+        and pagination.limit is not None
+        and len(rows) >= pagination.limit
+    )
+
+
+def estimate_query(query: str) -> str:
+    """The EXPLAIN of a table query, whose plan holds the row estimate"""
+    return "EXPLAIN (FORMAT JSON) " + query.strip().rstrip(";")
+
+
+def estimate_plan(cursor, query: str, params: list):
+    try:
+        with cursor.connection.transaction():
+            cursor.execute(estimate_query(query), params)
+            return cursor.fetchone()[0]
+    except Exception as e:
+        logger.warning("Could not estimate the rows of a table query: %s", e)
+        return None
+
+
+async def aestimate_plan(cursor, query: str, params: list):
+    """Async version of `estimate_plan`"""
+    if isinstance(cursor, AsyncCursorAdapter):
+        return await sync_to_async(estimate_plan)(cursor.sync_cursor, query, params)
+
+    try:
+        async with cursor.connection.transaction():
+            await cursor.execute(estimate_query(query), params)
+            return (await cursor.fetchone())[0]
+    except Exception as e:
+        logger.warning("Could not estimate the rows of a table query: %s", e)
+        return None
@@ -1,4 +1,21 @@
+from django.db.backends.signals import connection_created
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
-from core import models
-from core import models
+from core import materialized, metadata, models
+from core.connection import prepare_django_connection
+
+
+@receiver(connection_created)
+def prepare_age_on_connection_created(sender, connection, **kwargs):
+    prepare_django_connection(connection)
+
+
+@receiver(post_save)
+@receiver(pre_delete)
+def invalidate_metadata_cache(sender, instance, **kwargs):
+    metadata.invalidate(instance)
+
+
+@receiver(pre_delete, sender=models.MaterializedView)
+def drop_materialized_view_table(sender, instance, **kwargs):
+    materialized.drop(instance)
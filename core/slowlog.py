@@ -0,0 +1,204 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import random
+import re
+import threading
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger("kraph.cypher")
+
+# Cypher clauses that write to the graph. Statements containing them are
+# never re-run with EXPLAIN ANALYZE, as that would execute the write again.
+_write_pattern = re.compile(
+    r"\b(CREATE|MERGE|SET|DELETE|REMOVE|DROP|INSERT|UPDATE)\b", re.IGNORECASE
+)
+
+current_saved_query: ContextVar[object | None] = ContextVar(
+    "current_saved_query", default=None
+)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(1)
+
+
+@contextmanager
+def saved_query(query):
+    """Attribute the cypher executed within this block to a GraphQuery/NodeQuery"""
+    token = current_saved_query.set(query)
+    try:
+        yield query
+    finally:
+        current_saved_query.reset(token)
+
+
+def slow_log_enabled() -> bool:
+    return bool(settings.SLOW_CYPHER.get("ENABLED", False))
+
+
+def threshold() -> float:
+    """The duration (in seconds) above which a cypher execution is logged"""
+    return settings.SLOW_CYPHER.get("THRESHOLD_MS", 500) / 1000
+
+
+def is_read_only(query: str) -> bool:
+    return _write_pattern.search(query) is None
+
+
+def should_explain(query: str) -> bool:
+    """Whether to capture a plan for a slow execution of this query
+
+    Plans of saved (user authored) queries are always captured, for all
+    other queries only a sample of the slow executions is explained.
+    """
+    if not settings.SLOW_CYPHER.get("EXPLAIN", True) or not is_read_only(query):
+        return False
+
+    if current_saved_query.get() is not None:
+        return True
+
+    return random.random() < settings.SLOW_CYPHER.get("SAMPLE_RATE", 0.1)
+
+
+def graph_name_from_params(params) -> str | None:
+    """Cypher queries pass the graph name as their first parameter"""
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], str):
+        return params[0]
+    return None
+
+
+def _explain_query(query: str) -> str:
+    return "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query
+
+
+@contextmanager
+def _explain_connection():
+    """A connection of its own for explaining, never the one of the request"""
+    from core.connection import get_graph_pool, graph_pool_enabled
+
+    if graph_pool_enabled():
+        with get_graph_pool().connection() as connection:
+            yield connection
+        return
+
+    # The django connection of the explain thread, prepared for AGE by the
+    # connection_created signal
+    connection = connections["default"]
+    connection.ensure_connection()
+    try:
+        yield connection.connection
+    finally:
+        connection.close()
+
+
+def explain(query: str, params):
+    """Re-run the query with EXPLAIN ANALYZE and return the JSON plan"""
+    try:
+        with _explain_connection() as connection:
+            with connection.transaction():
+                with connection.cursor() as cursor:
+                    cursor.execute(_explain_query(query), params)
+                    return cursor.fetchone()[0]
+    except Exception as e:
+        logger.warning("Could not explain slow cypher query: %s", e)
+        return None
+
+
+def _build(execution, params, plan, saved):
+    from core import models
+
+    return models.SlowCypherQuery(
+        graph_name=graph_name_from_params(params),
+        function=execution.function,
+        template=execution.template,
+        fingerprint=execution.fingerprint,
+        duration=execution.duration * 1000,
+        plan=plan,
+        graph_query=saved if isinstance(saved, models.GraphQuery) else None,
+        node_query=saved if isinstance(saved, models.NodeQuery) else None,
+    )
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="slow-cypher"
+                )
+    return _executor
+
+
+def _explain_and_store(execution, query: str, params, saved) -> None:
+    try:
+        plan = explain(query, params)
+        _build(execution, params, plan, saved).save()
+    except Exception as e:
+        logger.warning("Could not store slow cypher query: %s", e)
+    finally:
+        _pending.release()
+        connections.close_all()
+
+
+def _explain_in_background(execution, query: str, params, saved) -> bool:
+    """Capture the plan and store the execution in the explain thread
+
+    Returns False if the query is not sampled or a plan is already being
+    captured.
+    """
+    if not should_explain(query) or not _pending.acquire(blocking=False):
+        return False
+
+    try:
+        _get_executor().submit(_explain_and_store, execution, query, params, saved)
+    except Exception:
+        _pending.release()
+        raise
+    return True
+
+
+def _log(execution) -> None:
+    logger.warning(
+        "Slow cypher in %s (%.3fms): %s",
+        execution.function,
+        execution.duration * 1000,
+        execution.template,
+    )
+
+
+def record(execution, query: str, params) -> None:
+    """Store a slow execution, capturing its plan if sampled
+
+    The plan is captured in a background thread on a connection of its own,
+    so the request does not wait for the query to run a second time. While
+    a plan is being captured, further slow executions are stored without
+    one.
+    """
+    _log(execution)
+    saved = current_saved_query.get()
+    if _explain_in_background(execution, query, params, saved):
+        return
+
+    try:
+        _build(execution, params, None, saved).save()
+    except Exception as e:
+        logger.warning("Could not store slow cypher query: %s", e)
+
+
+async def arecord(execution, query: str, params) -> None:
+    """Async version of `record`"""
+    _log(execution)
+    saved = current_saved_query.get()
+    if _explain_in_background(execution, query, params, saved):
+        return
+
+    try:
+        await _build(execution, params, None, saved).asave()
+    except Exception as e:
+        logger.warning("Could not store slow cypher query: %s", e)
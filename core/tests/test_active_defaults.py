@@ -0,0 +1,24 @@
+import pytest
+from core import models
+from core.mutations.utils import get_active_defaults, get_nessessary_inedges
+
+
+def role(name, default_use_active=None):
+    return {
+        "role": name,
+        "optional": False,
+        "variable_amount": False,
+        "category_definition": {
+            "default_use_active": default_use_active,
+            "default_use_new": None,
+        },
+    }
+
+
+def test_entity_roles_do_not_default_to_active_reagents():
+    roles = [role("sample", default_use_active="3")]
+
+    assert get_active_defaults(roles, [], models.EntityCategory.objects) == {}
+
+    with pytest.raises(ValueError, match="reagent categories"):
+        get_nessessary_inedges(roles, [], models.EntityCategory.objects)
@@ -0,0 +1,104 @@
+from core.age import RetrievedEntity, RetrievedRelation
+from core import agtype
+from core.agtype import (
+    AgtypeLoader,
+    canonical,
+    decode_agtype,
+    identity_map,
+    iter_elements,
+    iter_path,
+    to_jsonable,
+)
+
+
+VERTEX = '{"id": 844424930131969, "label": "Cell", "properties": {"__type": "ENTITY", "name": "a::vertex"}}::vertex'
+EDGE = '{"id": 1125899906842625, "label": "part_of", "end_id": 844424930131970, "start_id": 844424930131969, "properties": {}}::edge'
+
+
+def test_decode_vertex():
+    entity = decode_agtype(VERTEX, "graph")
+
+    assert isinstance(entity, RetrievedEntity)
+    assert entity.id == 844424930131969
+    assert entity.graph_name == "graph"
+    assert entity.properties["name"] == "a::vertex"
+
+
+def test_decode_edge():
+    relation = decode_agtype(EDGE)
+
+    assert isinstance(relation, RetrievedRelation)
+    assert relation.left_id == 844424930131969
+    assert relation.right_id == 844424930131970
+
+
+def test_decode_path():
+    path = decode_agtype(f"[{VERTEX}, {EDGE}, {VERTEX}]::path")
+
+    assert [type(element) for element in iter_elements(path)] == [
+        RetrievedEntity,
+        RetrievedRelation,
+        RetrievedEntity,
+    ]
+
+
+def test_decode_scalars():
+    assert decode_agtype('"a::b"') == "a::b"
+    assert decode_agtype("1.5::numeric") == 1.5
+    assert decode_agtype('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert to_jsonable(decode_agtype(f"[{VERTEX}]"))[0]["label"] == "Cell"
+
+
+def test_iter_path_nested_properties_and_bytes():
+    nested = VERTEX.replace('"name"', '"__structure": {"a": {"b": {"c": "}"}}}, "name"')
+    raw = f"[{nested}, {EDGE}, {nested}]::path"
+
+    for data in (raw, raw.encode()):
+        elements = list(iter_path(data, "graph"))
+        assert [type(element) for element in elements] == [
+            RetrievedEntity,
+            RetrievedRelation,
+            RetrievedEntity,
+        ]
+        assert elements[0].properties["__structure"]["a"]["b"]["c"] == "}"
+
+
+def test_identity_map_shares_elements():
+    token = identity_map.set({})
+    try:
+        path = f"[{VERTEX}, {EDGE}, {VERTEX}]::path"
+        first, _, last = iter_path(path, "graph")
+        assert first is last
+        assert decode_agtype(VERTEX, "graph") is first
+        assert canonical("graph", decode_agtype(VERTEX)) is first
+        assert decode_agtype(VERTEX, "other") is not first
+    finally:
+        identity_map.reset(token)
+
+    assert decode_agtype(VERTEX, "graph") is not decode_agtype(VERTEX, "graph")
+
+
+def test_loader_skips_decoding_of_shared_elements(monkeypatch):
+    decoded = []
+    to_entity = agtype.to_entity
+
+    def counting_to_entity(*args):
+        decoded.append(args)
+        return to_entity(*args)
+
+    monkeypatch.setattr(agtype, "to_entity", counting_to_entity)
+    loader = AgtypeLoader(0)
+    other = VERTEX.replace('"name": "a::vertex"', '"name": "b"')
+
+    token = identity_map.set({})
+    try:
+        first = canonical("graph", loader.load(VERTEX.encode()))
+        assert canonical("graph", loader.load(VERTEX.encode())) is first
+        assert len(decoded) == 1
+
+        # Same id, different text: an element of another graph
+        assert canonical("other", loader.load(other.encode())) is not first
+        assert len(decoded) == 2
+        assert first.graph_name == "graph"
+    finally:
+        identity_map.reset(token)
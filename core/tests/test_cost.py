@@ -0,0 +1,34 @@
+from graphql import build_schema, parse
+from core.cost import DEFAULT_WEIGHTS, CostEstimator
+
+
+SCHEMA = build_schema(
+    """
+    interface Node { id: ID! edges(pagination: Pagination): [Edge!]! }
+    interface Edge { id: ID! right: Node! }
+    type Entity implements Node { id: ID! edges(pagination: Pagination): [Edge!]! }
+    type Relation implements Edge { id: ID! right: Node! }
+    input Pagination { limit: Int offset: Int }
+    type Query { nodes(pagination: Pagination): [Entity!]! }
+    """
+)
+
+
+def test_nested_traversals_multiply_by_page_size():
+    document = parse(
+        """
+        query Nodes($limit: Int) {
+            nodes(pagination: {limit: $limit}) {
+                edges(pagination: {limit: 5}) {
+                    ... on Relation { right { ...Neighbours } }
+                }
+            }
+        }
+        fragment Neighbours on Node { edges { id } }
+        """
+    )
+
+    estimator = CostEstimator(SCHEMA, document, {"limit": 10}, DEFAULT_WEIGHTS, 200)
+
+    # nodes + 10 * edges + 50 * right + 50 * edges
+    assert estimator.estimate() == 111
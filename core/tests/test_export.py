@@ -0,0 +1,57 @@
+import types
+from core import age, enums, export, inputs, models, permissions
+
+
+def column(name="c", kind=enums.ColumnKind.VALUE, value_kind=None):
+    return inputs.ColumnInput(name=name, kind=kind, value_kind=value_kind)
+
+
+def test_columns_are_typed_by_their_kind():
+    assert export.column_type(column(kind=enums.ColumnKind.NODE)) == "BIGINT"
+    assert export.column_type(column(kind=enums.ColumnKind.EDGE)) == "BIGINT"
+    assert export.column_type(column(value_kind=enums.MetricKind.FLOAT)) == "DOUBLE"
+    assert (
+        export.column_type(column(value_kind=enums.MetricKind.ONE_D_VECTOR))
+        == "DOUBLE[]"
+    )
+    assert export.column_type(column()) is None
+
+
+def test_untyped_columns_keep_their_inferred_type():
+    columns = [
+        column("id", kind=enums.ColumnKind.NODE),
+        column("value"),
+        column('we"ird', value_kind=enums.MetricKind.INT),
+    ]
+
+    assert export.select_columns(columns) == (
+        'CAST("id" AS BIGINT) AS "id", "value", '
+        'CAST("we""ird" AS BIGINT) AS "we""ird"'
+    )
+    assert export.select_columns(columns, empty=True) == (
+        'CAST(NULL AS BIGINT) AS "id", CAST(NULL AS JSON) AS "value", '
+        'CAST(NULL AS BIGINT) AS "we""ird"'
+    )
+
+
+def test_cells_hold_element_ids_and_nested_values():
+    entity = age.RetrievedEntity("graph", 5, "Structure", {})
+
+    assert export.to_cell(entity) == 5
+    assert export.to_cell(None) is None
+    assert export.to_cell([1, {"a": [2.0]}]) == [1, {"a": [2.0]}]
+
+
+def test_only_owners_and_granted_users_can_export():
+    class User(types.SimpleNamespace):
+        is_authenticated = True
+
+        def has_perm(self, perm, obj=None):
+            return perm in self.perms
+
+    graph = models.Graph(id=1, user_id=1)
+
+    assert permissions.has_graph_access(User(id=1, perms=set()), graph)
+    assert permissions.has_graph_access(User(id=2, perms={"core.view_graph"}), graph)
+    assert not permissions.has_graph_access(User(id=2, perms=set()), graph)
+    assert not permissions.has_graph_access(None, graph)
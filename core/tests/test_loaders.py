@@ -0,0 +1,55 @@
+from core.loaders import InstrumentedDataLoader, Loaders, in_key_order
+from core.models import Graph
+
+
+class Row:
+    def __init__(self, id):
+        self.id = id
+
+
+def test_in_key_order_with_missing_keys():
+    rows = [Row(3), Row(1)]
+
+    result = in_key_order(["1", 2, 3, 1], rows, lambda row: row.id, Graph)
+
+    assert result[0] is rows[1]
+    assert isinstance(result[1], Graph.DoesNotExist)
+    assert result[2] is rows[0]
+    assert result[3] is rows[1]
+
+
+def test_loaders_create_all_loaders():
+    loaders = Loaders()
+
+    for name in (
+        "reagent_category_loader",
+        "entity_category_loader",
+        "structure_category_loader",
+        "natural_event_category_loader",
+        "metric_category_loader",
+        "protocol_event_category_loader",
+        "relation_category_loader",
+        "measurement_category_loader",
+        "expression_loader",
+        "metric_key_loader",
+        "graph_loader",
+        "vertex_loader",
+        "neighbourhood_loader",
+        "node_query_loader",
+        "active_reagent_loader",
+        "protocolstep_template_loader",
+        "step_category_loader",
+        "node_view_loader",
+    ):
+        assert isinstance(getattr(loaders, name), InstrumentedDataLoader), name
+
+
+def test_neighbourhoods_are_limited_in_the_database():
+    from core import age
+
+    query, _ = age._neighbourhood_query("graph", [1, 2], limit=5)
+    assert "collect(r)[0..5]" in query
+
+    # Without a limit all edges are returned
+    query, _ = age._neighbourhood_query("graph", [1, 2])
+    assert "collect(r)" not in query
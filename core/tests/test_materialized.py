@@ -0,0 +1,130 @@
+import contextlib
+import datetime
+import types
+import pytest
+from django.test import override_settings
+from django.utils import timezone
+from core import materialized, models, render_cache
+
+
+def test_snapshots_are_fresh_until_the_query_changes_or_they_expire():
+    query = models.GraphQuery(id=1, query="MATCH (n) RETURN n", kind="TABLE")
+    view = models.MaterializedView(
+        id=2,
+        query=query,
+        table_name="kraph_mv_2",
+        query_hash=render_cache.query_hash(query),
+        refreshed_at=timezone.now() - datetime.timedelta(seconds=30),
+    )
+
+    assert materialized.is_fresh(view, query)
+
+    view.max_age = 10
+    assert not materialized.is_fresh(view, query)
+
+    view.max_age = None
+    query.query = "MATCH (n) RETURN n LIMIT 1"
+    assert not materialized.is_fresh(view, query)
+
+
+def test_quote_escapes_identifiers():
+    assert materialized.quote('a"b') == '"a""b"'
+
+
+def test_snapshot_tables_are_created_outside_the_age_schema():
+    assert materialized.qualified("kraph_mv_2") == '"public"."kraph_mv_2"'
+
+
+def test_new_metrics_are_appended_other_changes_rebuild():
+    plan = materialized.append_plan(
+        "MATCH (s:Structure)<-[:DESCRIBES]-(m:Metric) RETURN s, m, m.__value AS value",
+        3,
+    )
+    assert plan.anchors == {"s": "Structure", "m": "Metric"}
+
+    def change(label, operation="CREATE", element_id=1):
+        return models.GraphChange(
+            label=label, operation=operation, element_id=element_id
+        )
+
+    assert materialized._anchor_ids(plan, [change("Metric", element_id=5)]) == {
+        "m": [5]
+    }
+    assert materialized._anchor_ids(plan, [change("Cell", "UPDATE")]) == {}
+    assert materialized._anchor_ids(plan, [change("Structure", "UPDATE")]) is None
+
+
+def test_aggregating_queries_are_not_appendable():
+    assert materialized.append_plan("MATCH (a:Cell) RETURN count(a)", 1) is None
+    assert materialized.append_plan("MATCH (a) RETURN a", 1) is None
+
+
+def test_changes_are_read_in_commit_order():
+    from core import changelog
+
+    # Transaction 102 was still running when the last refresh read the log
+    snapshot = "100:105:102"
+
+    assert changelog.is_visible(99, snapshot)
+    assert changelog.is_visible(101, snapshot)
+    # It commits after 101 and 104 were read, and is read by the next refresh
+    assert not changelog.is_visible(102, snapshot)
+    assert changelog.is_visible(104, snapshot)
+    assert not changelog.is_visible(105, snapshot)
+
+
+EDGE = '{"id": 1125899906842625, "label": "part_of", "end_id": 844424930131970, "start_id": 844424930131969, "properties": {}}::edge'
+
+
+class FakeCursor:
+    """Collects the statements of a transaction, fails the change log insert on demand"""
+
+    def __init__(self, fail_change_log=False):
+        self.statements = []
+        self.fail_change_log = fail_change_log
+
+    def execute(self, query, params=None):
+        if "core_graphchange" in query and self.fail_change_log:
+            raise RuntimeError("connection lost")
+        self.statements.append(query)
+
+    def fetchone(self):
+        return (EDGE,)
+
+
+def fake_graph_transaction(cursor, committed):
+    @contextlib.contextmanager
+    def graph_transaction():
+        yield cursor
+        committed.extend(cursor.statements)
+
+    return graph_transaction
+
+
+@override_settings(CHANGE_LOG={"ENABLED": True})
+@pytest.mark.parametrize("fail_change_log", [False, True])
+def test_writes_and_their_changes_commit_together(monkeypatch, fail_change_log):
+    from core import age
+
+    category = types.SimpleNamespace(
+        id=3,
+        graph=types.SimpleNamespace(age_name="graph"),
+        get_age_edge_name=lambda: "part_of",
+        get_age_type_name=lambda: "RELATION",
+    )
+    cursor = FakeCursor(fail_change_log)
+    committed = []
+    monkeypatch.setattr(
+        age, "graph_transaction", fake_graph_transaction(cursor, committed)
+    )
+
+    if fail_change_log:
+        with pytest.raises(RuntimeError):
+            age.create_age_relation(category, 1, 2)
+        # The edge is rolled back with the change that failed to be logged
+        assert committed == []
+    else:
+        age.create_age_relation(category, 1, 2)
+        assert len(committed) == 2
+        assert "CREATE (a)-[r:part_of" in committed[0]
+        assert "core_graphchange" in committed[1]
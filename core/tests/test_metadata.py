@@ -0,0 +1,48 @@
+from django.test import override_settings
+from core import metadata, models
+
+
+def test_category_keys_cover_the_whole_hierarchy():
+    graph = models.Graph(id=1, age_name="graph")
+    category = models.ReagentCategory(id=3, age_name="buffer", graph=graph)
+
+    keys = metadata._instance_keys(category)
+
+    assert "meta:core.reagentcategory:id:3" in keys
+    assert "meta:core.nodecategory:id:3" in keys
+    assert "meta:core.category:age_name:graph:buffer" in keys
+    assert metadata._instance_keys(graph) == [
+        "meta:core.graph:id:1",
+        "meta:core.graph:age_name:graph",
+    ]
+
+
+def test_shared_levels_are_invalidated_on_commit(monkeypatch):
+    graph = models.Graph(id=1, age_name="graph")
+    committed = []
+    monkeypatch.setattr(metadata.transaction, "on_commit", committed.append)
+    metadata._l1.set("meta:core.graph:id:1", graph)
+
+    metadata.invalidate(graph)
+
+    assert metadata._l1.get("meta:core.graph:id:1") is None
+    assert len(committed) == 1
+
+
+@override_settings(METADATA_CACHE={"ENABLED": True})
+def test_loaders_read_through_the_metadata_levels(monkeypatch):
+    graph = models.Graph(id=1, age_name="graph")
+    monkeypatch.setattr(metadata, "_ensure_subscriber", lambda: None)
+    monkeypatch.setattr(metadata, "_redis", lambda: None)
+    metadata._l1.clear()
+
+    assert metadata.get_cached(models.Graph, "age_name", ["graph"]) == [None]
+
+    metadata.put(models.Graph, "age_name", {"graph": graph})
+    assert metadata.get_cached(models.Graph, "age_name", ["graph", "other"]) == [
+        graph,
+        None,
+    ]
+
+    metadata._invalidate_keys(metadata._instance_keys(graph))
+    assert metadata.get_cached(models.Graph, "age_name", ["graph"])[0] is None
@@ -0,0 +1,22 @@
+from django.test import override_settings
+from core import models, render_cache
+
+
+def test_render_key_changes_with_the_query_text():
+    query = models.GraphQuery(id=1, query="MATCH (n) RETURN n", kind="TABLE")
+    key = render_cache.render_key("graph", query, None, 3)
+
+    query.query = "MATCH (n) RETURN n LIMIT 1"
+    assert render_cache.render_key("graph", query, None, 3) != key
+    assert key.endswith(":-:3")
+
+
+@override_settings(RENDER_CACHE={"ENABLED": True})
+def test_writes_bump_the_graph_version():
+    @render_cache.invalidates_graph
+    def write(graph_name, value):
+        return value
+
+    version = render_cache.graph_version("graph")
+    assert write("graph", value=1) == 1
+    assert render_cache.graph_version("graph") == version + 1
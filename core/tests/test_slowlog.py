@@ -0,0 +1,49 @@
+from core.slowlog import graph_name_from_params, is_read_only
+
+
+def test_only_read_queries_are_explained():
+    assert is_read_only("MATCH (n:Cell)-[r]->(m) RETURN n, r, m LIMIT 10")
+    assert not is_read_only("MATCH (n) WHERE id(n) = 1 SET n.name = 'a' RETURN n")
+    assert not is_read_only("CREATE (n:Cell {name: 'a'}) RETURN n")
+    assert not is_read_only("match (n) detach delete n")
+
+
+def test_graph_name_from_params():
+    assert graph_name_from_params(("my_graph", 1)) == "my_graph"
+    assert graph_name_from_params([]) is None
+    assert graph_name_from_params(None) is None
+
+
+class NamedCursor:
+    name = "graph_1"
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchmany(self, size=None):
+        return self.batches.pop(0) if self.batches else []
+
+
+def test_streamed_executions_are_checked_after_the_last_fetch(monkeypatch):
+    from core import slowlog, tracing
+
+    recorded = []
+    monkeypatch.setattr(slowlog, "slow_log_enabled", lambda: True)
+    monkeypatch.setattr(slowlog, "threshold", lambda: -1)
+    monkeypatch.setattr(
+        slowlog, "record", lambda execution, query, params: recorded.append(execution)
+    )
+
+    cursor = tracing.TracedCursor(NamedCursor([[1, 2], [3]]), tracing.OperationTrace())
+    cursor.execute("MATCH (n) RETURN n", ["graph"])
+    assert recorded == []
+
+    cursor.fetchmany(2)
+    assert recorded == []
+
+    cursor.fetchmany(2)
+    assert len(recorded) == 1
+    assert recorded[0].rows == 3
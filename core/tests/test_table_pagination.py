@@ -0,0 +1,62 @@
+from core.pagination import TablePaginationInput
+from core.renderers.utils import needs_estimate, page_total, paginate_query
+
+PLAN = [{"Plan": {"Plan Rows": 1000000}}]
+
+
+def test_pagination_is_pushed_into_the_query():
+    query, params = paginate_query(
+        "SELECT * FROM cypher(%s, $$ MATCH (n) RETURN n $$) as (n agtype);",
+        ["graph"],
+        TablePaginationInput(limit=50, offset=100),
+    )
+
+    assert query.endswith(") AS page LIMIT %s OFFSET %s")
+    assert params == ["graph", 50, 100]
+    assert paginate_query("SELECT 1", [], None) == ("SELECT 1", [])
+
+
+def test_unordered_queries_are_ordered_by_all_columns():
+    pagination = TablePaginationInput(limit=50, offset=100)
+
+    query, _ = paginate_query(
+        "SELECT * FROM cypher(%s, $$ MATCH (n) RETURN n, n.name $$) as (n agtype, name agtype);",
+        ["graph"],
+        pagination,
+        2,
+    )
+    assert query.endswith(") AS page ORDER BY 1, 2 LIMIT %s OFFSET %s")
+
+    query, _ = paginate_query(
+        "SELECT * FROM cypher(%s, $$ MATCH (n) RETURN n ORDER BY n.name $$) as (n agtype);",
+        ["graph"],
+        pagination,
+        1,
+    )
+    assert query.endswith(") AS page LIMIT %s OFFSET %s")
+
+    # Only an ORDER BY of the final RETURN orders the result
+    query, _ = paginate_query(
+        "SELECT * FROM cypher(%s, $$ MATCH (n) WITH n ORDER BY n.name LIMIT 10 "
+        "MATCH (n)--(m) RETURN m $$) as (m agtype);",
+        ["graph"],
+        pagination,
+        1,
+    )
+    assert query.endswith(") AS page ORDER BY 1 LIMIT %s OFFSET %s")
+
+
+def test_totals_are_exact_at_the_end_and_estimated_before():
+    pagination = TablePaginationInput(limit=2, offset=4)
+
+    assert page_total(pagination, [1], PLAN) == 5
+    assert page_total(pagination, [1, 2], PLAN) == 1000000
+    assert page_total(pagination, [1, 2], None) is None
+    assert page_total(None, [1, 2, 3], None) == 3
+
+
+def test_only_full_first_pages_are_estimated():
+    assert needs_estimate(TablePaginationInput(limit=2, offset=0), [1, 2])
+    assert not needs_estimate(TablePaginationInput(limit=2, offset=0), [1])
+    assert not needs_estimate(TablePaginationInput(limit=2, offset=2), [1, 2])
+    assert not needs_estimate(None, [1, 2])
@@ -0,0 +1,335 @@
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import hashlib
+import logging
+import re
+import sys
+import time
+from django.conf import settings
+from strawberry.extensions import SchemaExtension
+from core import slowlog
+
+
+logger = logging.getLogger("kraph.cypher")
+
+# Modules that sit between the caller and the cursor, they are skipped when
+# looking for the function that issued a query
+_SKIPPED_MODULES = ("core.connection", "core.tracing", "contextlib")
+
+_whitespace_pattern = re.compile(r"\s+")
+_literal_pattern = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|\b\d+(?:\.\d+)?\b")
+
+
+@dataclass
+class CypherExecution:
+    """A single cypher execution within a traced operation"""
+
+    function: str
+    template: str
+    fingerprint: str
+    duration: float = 0.0
+    decode: float = 0.0
+    rows: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "function": self.function,
+            "template": self.template,
+            "fingerprint": self.fingerprint,
+            "durationMs": round(self.duration * 1000, 3),
+            "decodeMs": round(self.decode * 1000, 3),
+            "rows": self.rows,
+        }
+
+
+@dataclass
+class OperationTrace:
+    """All cypher executions of one GraphQL operation"""
+
+    executions: list[CypherExecution] = field(default_factory=list)
+
+    def start(self, query: str, params) -> CypherExecution:
+        execution = CypherExecution(
+            function=_caller(),
+            template=normalize_query(query),
+            fingerprint=fingerprint_params(params),
+        )
+        self.executions.append(execution)
+        return execution
+
+    def summary(self) -> dict:
+        return {
+            "count": len(self.executions),
+            "durationMs": round(sum(e.duration for e in self.executions) * 1000, 3),
+            "decodeMs": round(sum(e.decode for e in self.executions) * 1000, 3),
+            "rows": sum(e.rows for e in self.executions),
+            "executions": [e.to_dict() for e in self.executions],
+        }
+
+
+current_trace: ContextVar[OperationTrace | None] = ContextVar(
+    "current_trace", default=None
+)
+current_execution: ContextVar[CypherExecution | None] = ContextVar(
+    "current_execution", default=None
+)
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and replace inlined literals with ?"""
+    return _whitespace_pattern.sub(" ", _literal_pattern.sub("?", query)).strip()
+
+
+def fingerprint_params(params) -> str:
+    """A short, stable hash of the parameters (the values are not recorded)"""
+    return hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+
+
+def _caller() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_SKIPPED_MODULES):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class TracedCursor:
+    """Cursor proxy that records executions, fetched rows and decode time
+
+    An execution is checked against the slow log threshold once it is
+    finished: right after `execute` for regular cursors, after the last
+    fetch (or when the stream ends) for named cursors, whose `execute` only
+    declares them.
+    """
+
+    def __init__(self, cursor, trace: OperationTrace):
+        self._cursor = cursor
+        self._trace = trace
+        self._execution: CypherExecution | None = None
+        self._unchecked: tuple | None = None
+        self._streaming = getattr(cursor, "name", None) is not None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, query, params=None, **kwargs):
+        self.finish()
+        self._execution = self._trace.start(query, params)
+        self._unchecked = (query, params)
+        result = self._timed(self._cursor.execute, query, params, **kwargs)
+        if not self._streaming:
+            self.finish()
+        return result
+
+    def fetchone(self):
+        return self._fetched(self._timed(self._cursor.fetchone), 1)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._fetched(self._timed(self._cursor.fetchmany), None)
+        return self._fetched(self._timed(self._cursor.fetchmany, size), size)
+
+    def fetchall(self):
+        return self._fetched(self._timed(self._cursor.fetchall), None, last=True)
+
+    def finish(self) -> None:
+        """Check the current execution against the slow log threshold"""
+        unchecked = self._slow_unchecked()
+        if unchecked is not None:
+            slowlog.record(self._execution, *unchecked)
+
+    def _slow_unchecked(self) -> tuple | None:
+        unchecked, self._unchecked = self._unchecked, None
+        if unchecked is None or not self._is_slow():
+            return None
+        return unchecked
+
+    def _is_last(self, result, size, last) -> bool:
+        if last or not result:
+            return True
+        return size is not None and isinstance(result, list) and len(result) < size
+
+    def _fetched(self, result, size, last=False):
+        self._counted(result)
+        if self._streaming and self._is_last(result, size, last):
+            self.finish()
+        return result
+
+    def _is_slow(self) -> bool:
+        return (
+            slowlog.slow_log_enabled()
+            and self._execution.duration > slowlog.threshold()
+        )
+
+    def _counted(self, result):
+        if self._execution is not None and result is not None:
+            self._execution.rows += len(result) if isinstance(result, list) else 1
+        return result
+
+    def _timed(self, func, *args, **kwargs):
+        execution = self._execution
+        if execution is None:
+            return func(*args, **kwargs)
+
+        token = current_execution.set(execution)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            execution.duration += time.perf_counter() - start
+            current_execution.reset(token)
+
+
+class AsyncTracedCursor(TracedCursor):
+    """Async version of `TracedCursor`"""
+
+    def __iter__(self):
+        raise TypeError("Use async iteration on async cursors")
+
+    async def execute(self, query, params=None, **kwargs):
+        await self.finish()
+        self._execution = self._trace.start(query, params)
+        self._unchecked = (query, params)
+        result = await self._timed(self._cursor.execute, query, params, **kwargs)
+        if not self._streaming:
+            await self.finish()
+        return result
+
+    async def fetchone(self):
+        return await self._fetched(await self._timed(self._cursor.fetchone), 1)
+
+    async def fetchmany(self, size=None):
+        if size is None:
+            return await self._fetched(await self._timed(self._cursor.fetchmany), None)
+        return await self._fetched(
+            await self._timed(self._cursor.fetchmany, size), size
+        )
+
+    async def fetchall(self):
+        return await self._fetched(
+            await self._timed(self._cursor.fetchall), None, last=True
+        )
+
+    async def finish(self) -> None:
+        unchecked = self._slow_unchecked()
+        if unchecked is not None:
+            await slowlog.arecord(self._execution, *unchecked)
+
+    async def _fetched(self, result, size, last=False):
+        self._counted(result)
+        if self._streaming and self._is_last(result, size, last):
+            await self.finish()
+        return result
+
+    async def _timed(self, func, *args, **kwargs):
+        execution = self._execution
+        if execution is None:
+            return await func(*args, **kwargs)
+
+        token = current_execution.set(execution)
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            execution.duration += time.perf_counter() - start
+            current_execution.reset(token)
+
+
+def _trace_for_cursor() -> OperationTrace | None:
+    trace = current_trace.get()
+    if trace is None and slowlog.slow_log_enabled():
+        # Not part of a traced operation, but executions still have to be
+        # timed to detect slow ones. The trace is discarded with the cursor.
+        return OperationTrace()
+    return trace
+
+
+def traced(cursor):
+    """Wrap the cursor for tracing if a traced operation is active
+
+    The cursor is also wrapped if the slow cypher log is enabled.
+    """
+    trace = _trace_for_cursor()
+    if trace is None:
+        return cursor
+    return TracedCursor(cursor, trace)
+
+
+def atraced(cursor):
+    """Wrap the async cursor for tracing if a traced operation is active"""
+    trace = _trace_for_cursor()
+    if trace is None:
+        return cursor
+    return AsyncTracedCursor(cursor, trace)
+
+
+@contextmanager
+def traced_stream(cursor):
+    """Trace a named cursor, a stream that ends early is checked on exit"""
+    cursor = traced(cursor)
+    try:
+        yield cursor
+    finally:
+        if isinstance(cursor, TracedCursor):
+            cursor.finish()
+
+
+@asynccontextmanager
+async def atraced_stream(cursor):
+    """Async version of `traced_stream`"""
+    cursor = atraced(cursor)
+    try:
+        yield cursor
+    finally:
+        if isinstance(cursor, AsyncTracedCursor):
+            await cursor.finish()
+
+
+def tracing_enabled() -> bool:
+    return bool(settings.CYPHER_TRACING.get("ENABLED", False))
+
+
+class CypherTracingExtension(SchemaExtension):
+    """Traces all cypher executions of a GraphQL operation
+
+    Every execution is logged to the "kraph.cypher" logger. If REPORT is
+    set in CYPHER_TRACING the aggregated trace is added to the response
+    extensions under "cypher".
+    """
+
+    trace: OperationTrace | None = None
+
+    def on_operation(self):
+        if not tracing_enabled():
+            yield
+            return
+
+        self.trace = OperationTrace()
+        token = current_trace.set(self.trace)
+        try:
+            yield
+        finally:
+            current_trace.reset(token)
+
+        for execution in self.trace.executions:
+            logger.debug(
+                "%s rows=%s duration=%.3fms decode=%.3fms params=%s %s",
+                execution.function,
+                execution.rows,
+                execution.duration * 1000,
+                execution.decode * 1000,
+                execution.fingerprint,
+                execution.template,
+            )
+
+    def get_results(self):
+        if self.trace is None or not settings.CYPHER_TRACING.get("REPORT", False):
+            return {}
+
+        return {"cypher": self.trace.summary()}
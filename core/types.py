@@ -10,12 +10,14 @@ from kante.types import Info
 import datetime
 from asgiref.sync import sync_to_async
 from itertools import chain
+from contextlib import aclosing
 from enum import Enum
 from core.datalayer import get_current_datalayer
 from strawberry.experimental import pydantic
 from typing import Union
 from strawberry import LazyType
-from core import age, pagination as p, filters as f
+from strawberry.scalars import JSON
+from core import age, agtype, pagination as p, filters as f
 from strawberry_django.pagination import OffsetPaginationInput
 from django.db.models import Q
 from authentikate.strawberry.types import Client, User
@@ -133,9 +135,32 @@ class GraphSequence:
 
 
 
+def _shared_wrapper(element, wrap):
+    """Reuse the strawberry wrapper of an element within a query operation"""
+    elements = agtype.identity_map.get()
+    if elements is None or element.graph_name is None:
+        return wrap(element)
+
+    key = ("wrapper", element.graph_name, element.id)
+    wrapper = elements.get(key)
+    if wrapper is None:
+        wrapper = elements[key] = wrap(element)
+    return wrapper
+
+
 def entity_to_node_subtype(
     entity: age.RetrievedEntity,
 ) -> Union["Structure", "Entity", "Metric", "NaturalEvent", "ProtocolEvent", "Reagent"]:
+    return _shared_wrapper(entity, _entity_to_node_subtype)
+
+
+def relation_to_edge_subtype(
+    relation: age.RetrievedRelation,
+) -> Union["Measurement", "Relation", "Participant", "Description"]:
+    return _shared_wrapper(relation, _relation_to_edge_subtype)
+
+
+def _entity_to_node_subtype(entity: age.RetrievedEntity):
     match entity.category_type:
         case "STRUCTURE":
             return Structure(_value=entity)
@@ -151,9 +176,7 @@ def entity_to_node_subtype(
             return ProtocolEvent(_value=entity)
 
 
-def relation_to_edge_subtype(
-    relation: age.RetrievedRelation,
-) -> Union["Measurement", "Relation", "Participant", "Description"]:
+def _relation_to_edge_subtype(relation: age.RetrievedRelation):
     match relation.category_type:
         case "MEASUREMENT":
             return Measurement(_value=relation)
@@ -257,7 +280,7 @@ class Graph:
         )
 
     @strawberry_django.field()
-    def latest_nodes(
+    async def latest_nodes(
         self,
         info: Info,
         filters: filters.EntityFilter | None = None,
@@ -267,14 +290,36 @@ class Graph:
         filters = filters or f.EntityFilter()
         pagination = pagination or p.GraphPaginationInput()
 
-        return [
-            entity_to_node_subtype(i)
-            for i in age.select_latest_nodes(self.age_name, pagination, filter=filters)
-        ]
+        nodes = age.aselect_latest_nodes(self.age_name, pagination, filter=filters)
+        async with aclosing(nodes):
+            return [entity_to_node_subtype(i) async for i in nodes]
 
     @strawberry_django.field()
-    def pinned(self, info: Info) -> bool:
-        return info.context.request.user in self.pinned_by.all()
+    async def pinned(self, info: Info) -> bool:
+        return await loaders.get_loaders().is_pinned(self, info.context.request.user)
+
+
+@strawberry_django.type(
+    models.SlowCypherQuery,
+    filters=filters.SlowCypherQueryFilter,
+    pagination=True,
+    description="A cypher execution that ran longer than the slow query threshold",
+)
+class SlowCypherQuery:
+    id: auto
+    graph_name: str | None
+    function: str
+    template: str
+    fingerprint: str
+    duration: float = strawberry_django.field(
+        description="The execution time in milliseconds"
+    )
+    plan: JSON | None = strawberry_django.field(
+        description="The EXPLAIN (ANALYZE, BUFFERS) plan, if it was captured"
+    )
+    graph_query: Optional["GraphQuery"]
+    node_query: Optional["NodeQuery"]
+    created_at: datetime.datetime
 
 
 @strawberry_django.type(
@@ -290,19 +335,48 @@ class GraphQuery:
     kind: enums.ViewKind
     graph: Graph
     query: str
+    cache_render: bool = strawberry_django.field(
+        description="Whether renders of this query are served from the render cache"
+    )
     scatter_plots: List["ScatterPlot"]  = strawberry_django.field(
         description="The list of metric expressions defined in this ontology"
     )
+    views: List["MaterializedView"] = strawberry_django.field(
+        description="The snapshots of the results of this query"
+    )
 
     @strawberry_django.field()
-    def pinned(self, info: Info) -> bool:
-        return info.context.request.user in self.pinned_by.all()
+    async def pinned(self, info: Info) -> bool:
+        return await loaders.get_loaders().is_pinned(self, info.context.request.user)
 
     @strawberry_django.field()
-    def render(self, info: Info) -> Union["Path", "Pairs", "Table"]:
-        from core.renderers.graph.render import render_graph_query
+    async def render(
+        self, info: Info, pagination: p.TablePaginationInput | None = None
+    ) -> Union["Path", "Pairs", "Table"]:
+        from core.renderers.graph.render import arender_graph_query
 
-        return render_graph_query(self)
+        return await arender_graph_query(self, pagination)
+
+
+@strawberry_django.type(
+    models.MaterializedView,
+    filters=filters.MaterializedViewFilter,
+    pagination=True,
+    description="A snapshot of the results of a TABLE graph query",
+)
+class MaterializedView:
+    id: auto
+    query: GraphQuery
+    materialized_at: datetime.datetime
+    refreshed_at: datetime.datetime | None = strawberry_django.field(
+        description="The time the snapshot was last (re)built"
+    )
+    row_count: int | None = strawberry_django.field(
+        description="The number of rows in the snapshot"
+    )
+    max_age: int | None = strawberry_django.field(
+        description="The number of seconds the snapshot is served to renders after a refresh"
+    )
 
 
 @strawberry_django.type(
@@ -338,18 +412,24 @@ class NodeQuery:
     kind: enums.ViewKind
     graph: Graph
     query: str
+    cache_render: bool = strawberry_django.field(
+        description="Whether renders of this query are served from the render cache"
+    )
 
     @strawberry_django.field()
-    def pinned(self, info: Info) -> bool:
-        return info.context.request.user in self.pinned_by.all()
+    async def pinned(self, info: Info) -> bool:
+        return await loaders.get_loaders().is_pinned(self, info.context.request.user)
 
     @strawberry_django.field()
-    def render(
-        self, info: Info, node_id: strawberry.ID
+    async def render(
+        self,
+        info: Info,
+        node_id: strawberry.ID,
+        pagination: p.TablePaginationInput | None = None,
     ) -> Union["Path", "Pairs", "Table"]:
-        from core.renderers.node.render import render_node_view
+        from core.renderers.node.render import arender_node_view
 
-        return render_node_view(self, node_id)
+        return await arender_node_view(self, node_id, pagination)
 
 @strawberry.type()
 class NodeQueryView:
@@ -362,9 +442,11 @@ class NodeQueryView:
         return self._query 
     
     @strawberry_django.field()
-    def render(self, info: Info) -> Union["Path", "Pairs", "Table"]:
-        from core.renderers.node.render import render_node_view
-        return render_node_view(self._query, self._node_id)
+    async def render(
+        self, info: Info, pagination: p.TablePaginationInput | None = None
+    ) -> Union["Path", "Pairs", "Table"]:
+        from core.renderers.node.render import arender_node_view
+        return await arender_node_view(self._query, self._node_id, pagination)
     
     
     @strawberry.field()
@@ -391,46 +473,34 @@ class Node:
     def local_id(self, info: Info) -> str | None:
         return self._value.local_id
 
-    @strawberry_django.field()
-    def relevant_queries(self, info: Info) -> List["NodeQuery"]:
-        from core.renderers.node.render import render_node_view
+    async def _relevant_queries(self, info: Info) -> list[models.NodeQuery]:
+        return await loaders.get_loaders().node_query_loader.load(
+            loaders.NodeQueryKey(
+                self._value.graph_name,
+                str(self._value.category_id),
+                info.context.request.user.id,
+            )
+        )
 
-        return [
-            q
-            for q in models.NodeQuery.objects.filter(
-               graph__age_name=self._value.graph_name,
-               relevant_for_nodes=self._value.category_id
-            ).all()
-        ]
-        
     @strawberry_django.field()
-    def views(self, info: Info) -> List["NodeQueryView"]:
-        from core.renderers.node.render import render_node_view
+    async def relevant_queries(self, info: Info) -> List["NodeQuery"]:
+        return await self._relevant_queries(info)
 
+    @strawberry_django.field()
+    async def views(self, info: Info) -> List["NodeQueryView"]:
         return [
-            q
-            for q in models.NodeQuery.objects.filter(
-               graph__age_name=self._value.graph_name,
-               relevant_for_nodes=self._value.category_id
-               
-            ).annotate(pinned=Q(pinned_by=info.context.request.user)).order_by('-pinned').all()
+            NodeQueryView(_query=q, _node_id=self._value.unique_id)
+            for q in await self._relevant_queries(info)
         ]
-        
-    @strawberry_django.field(description="The best view of the node given the current context")
-    def best_view(self, info: Info ) -> NodeQueryView | None:
-        from core.renderers.node.render import render_node_view
 
-        
-        best_query = models.NodeQuery.objects.filter(
-            graph__age_name=self._value.graph_name,
-            relevant_for_nodes=self._value.category_id
-        ).annotate(pinned=Q(pinned_by=info.context.request.user)).order_by('pinned').first()
-        
-        if not best_query:
+    @strawberry_django.field(description="The best view of the node given the current context")
+    async def best_view(self, info: Info) -> NodeQueryView | None:
+        queries = await self._relevant_queries(info)
+        if not queries:
             return None
-        
-        
-        return NodeQueryView(_query=best_query, _node_id=self._value.unique_id)
+
+        # The queries are ordered pinned first
+        return NodeQueryView(_query=queries[0], _node_id=self._value.unique_id)
         
         
         
@@ -442,7 +512,7 @@ class Node:
         description="The unique identifier of the entity within its graph"
     )
     async def graph(self, info: Info) -> "Graph":
-        return await loaders.graph_loader.load(self._value.graph_name)
+        return await loaders.get_loaders().graph_loader.load(self._value.graph_name)
 
     @strawberry_django.field()
     def label(self, info: Info, full: bool | None = None) -> str:
@@ -474,27 +544,27 @@ class Node:
         return f"{self._value.id}"
 
     @strawberry_django.field(
-        description="The unique identifier of the entity within its graph"
+        description="The outgoing edges of the entity ordered by their id. All of them unless a limit is given"
     )
-    def right_edges(self, info: Info) -> List["Edge"]:
-        return [
-            relation_to_edge_subtype(edge)
-            for edge in self._value.retrieve_right_relations()
-        ]
+    async def right_edges(self, info: Info, limit: int | None = None) -> List["Edge"]:
+        edges = await loaders.get_loaders().neighbourhood_loader.load(
+            loaders.NeighbourhoodKey(self._value.unique_id, "right", limit=limit)
+        )
+        return [relation_to_edge_subtype(edge) for edge in edges]
 
     @strawberry_django.field(
-        description="The unique identifier of the entity within its graph"
+        description="The incoming edges of the entity ordered by their id. All of them unless a limit is given"
     )
-    def left_edges(self, info: Info) -> List["Edge"]:
-        return [
-            relation_to_edge_subtype(edge)
-            for edge in self._value.retrieve_left_relations()
-        ]
+    async def left_edges(self, info: Info, limit: int | None = None) -> List["Edge"]:
+        edges = await loaders.get_loaders().neighbourhood_loader.load(
+            loaders.NeighbourhoodKey(self._value.unique_id, "left", limit=limit)
+        )
+        return [relation_to_edge_subtype(edge) for edge in edges]
 
     @strawberry.field(
         description="The unique identifier of the entity within its graph"
     )
-    def edges(
+    async def edges(
         self,
         info: Info,
         filter: filters.EntityRelationFilter | None = None,
@@ -507,15 +577,21 @@ class Node:
         if not filter:
             filter = filters.EntityRelationFilter()
 
+        if filter == filters.EntityRelationFilter() and not pagination.offset:
+            # The plain neighbourhood of the node, batched with all other nodes
+            edges = await loaders.get_loaders().neighbourhood_loader.load(
+                loaders.NeighbourhoodKey(
+                    self._value.unique_id, "both", with_self=False, limit=pagination.limit
+                )
+            )
+            return [Edge(_value=x) for x in edges]
+
         if not filter.left_id and not filter.right_id:
             filter.left_id = self._value.unique_id
 
-        return [
-            Edge(_value=x)
-            for x in age.select_all_relations(
-                self._value.graph_name, pagination, filter
-            )
-        ]
+        edges = age.aselect_all_relations(self._value.graph_name, pagination, filter)
+        async with aclosing(edges):
+            return [Edge(_value=x) async for x in edges]
 
 
 @strawberry.type(
@@ -531,7 +607,7 @@ class Structure(Node):
         description="Protocol steps where this entity was the target"
     )
     async def category(self) -> "StructureCategory":
-        return await loaders.structure_category_loader.load(self._value.category_id)
+        return await loaders.get_loaders().structure_category_loader.load(self._value.category_id)
 
     @strawberry.field(
         description="The unique identifier of the entity within its graph"
@@ -589,7 +665,7 @@ class PlayableEntityRoleInProtocolEvent:
     
     @strawberry.field(description="The unique identifier of the entity within its graph")
     async def category(self, info: Info) -> "ProtocolEventCategory":
-        return await loaders.protocol_event_category_loader.load(self._category)
+        return await loaders.get_loaders().protocol_event_category_loader.load(self._category)
     
 
 
@@ -607,7 +683,7 @@ class Entity(Node):
         description="Protocol steps where this entity was the target"
     )
     async def category(self) -> "EntityCategory":
-        return await loaders.entity_category_loader.load(self._value.category_id)
+        return await loaders.get_loaders().entity_category_loader.load(self._value.category_id)
     
     
     @strawberry_django.field(
@@ -727,7 +803,7 @@ class Reagent(Node):
         description="Protocol steps where this entity was the target"
     )
     async def category(self) -> "ReagentCategory":
-        return await loaders.reagent_category_loader.load(self._value.category_id)
+        return await loaders.get_loaders().reagent_category_loader.load(self._value.category_id)
     
     
     @strawberry.field(
@@ -771,7 +847,7 @@ class Metric(Node):
         description="Protocol steps where this entity was the target"
     )
     async def category(self) -> "MetricCategory":
-        return await loaders.metric_category_loader.load(self._value.category_id)
+        return await loaders.get_loaders().metric_category_loader.load(self._value.category_id)
 
     @strawberry_django.field(description="The value of the metric")
     async def value(self) -> float:
@@ -791,7 +867,7 @@ class NaturalEvent(Node):
         description="Protocol steps where this entity was the target"
     )
     async def category(self) -> "NaturalEventCategory":
-        return await loaders.natural_event_category_loader.load(self._value.category_id)
+        return await loaders.get_loaders().natural_event_category_loader.load(self._value.category_id)
         
 
     @strawberry_django.field(
@@ -821,7 +897,7 @@ class ProtocolEvent(Node):
         description="Protocol steps where this entity was the target"
     )
     async def category(self) -> "ProtocolEventCategory":
-        return await loaders.protocol_event_category_loader.load(
+        return await loaders.get_loaders().protocol_event_category_loader.load(
             self._value.category_id
         )
 
@@ -878,20 +954,18 @@ class Edge:
         return self._value.unique_right_id
 
     @strawberry_django.field()
-    def right(self, info: Info) -> Node:
+    async def right(self, info: Info) -> Node:
         return entity_to_node_subtype(
-            age.get_age_entity(
-                age.to_graph_id(self._value.unique_right_id),
-                age.to_entity_id((self._value.unique_right_id)),
+            await loaders.get_loaders().vertex_loader.load(
+                self._value.unique_right_id
             )
         )
 
     @strawberry_django.field()
-    def left(self, info: Info) -> Node:
+    async def left(self, info: Info) -> Node:
         return entity_to_node_subtype(
-            age.get_age_entity(
-                age.to_graph_id(self._value.unique_left_id),
-                age.to_entity_id((self._value.unique_left_id)),
+            await loaders.get_loaders().vertex_loader.load(
+                self._value.unique_left_id
             )
         )
 
@@ -919,7 +993,7 @@ class Measurement(Edge):
 
     @strawberry_django.field()
     async def category(self, info: Info) -> "MeasurementCategory":
-        return await loaders.measurement_category_loader.load(self._value.category_id)
+        return await loaders.get_loaders().measurement_category_loader.load(self._value.category_id)
 
 
 @strawberry.type(
@@ -949,7 +1023,7 @@ class Relation(Edge):
 
     @strawberry_django.field()
     async def category(self, info: Info) -> "RelationCategory":
-        return await loaders.relation_category_loader.load(self._value.category_id)
+        return await loaders.get_loaders().relation_category_loader.load(self._value.category_id)
 
 
 @strawberry.type(
@@ -1040,8 +1114,8 @@ class BaseCategory:
         ).first()
         
     @strawberry_django.field()
-    def pinned(self, info: Info) -> bool:
-        return info.context.request.user in self.pinned_by.all()
+    async def pinned(self, info: Info) -> bool:
+        return await loaders.get_loaders().is_pinned(self, info.context.request.user)
 
 
 @strawberry.interface()
@@ -1216,7 +1290,7 @@ class ReagentRoleDefinition:
     
     
     @strawberry_django.field()
-    def current_default(self, info: Info) -> Optional["Reagent"]:
+    async def current_default(self, info: Info) -> Optional["Reagent"]:
         cat_def = self._value.get("category_definition", None)
         if not cat_def:
             raise ValueError("No category definition found. Integrity error")
@@ -1225,9 +1299,11 @@ class ReagentRoleDefinition:
         if not default_use_active:
             return None
         
-        active = age.get_active_reagent_for_reagent_category(
-            models.ReagentCategory.objects.get(id=default_use_active),
+        active = await loaders.get_loaders().active_reagent_loader.load(
+            default_use_active
         )
+        if active is None:
+            return None
         
         return Reagent(_value=active)
         
@@ -1272,7 +1348,7 @@ class EntityRoleDefinition:
         return optional
     
     @strawberry_django.field()
-    def current_default(self, info: Info) -> Optional["Entity"]:
+    async def current_default(self, info: Info) -> Optional["Entity"]:
         cat_def = self._value.get("category_definition", None)
         if not cat_def:
             raise ValueError("No category definition found. Integrity error")
@@ -1281,9 +1357,11 @@ class EntityRoleDefinition:
         if not default_use_active:
             return None
         
-        active = age.get_active_reagent_for_reagent_category(
-            models.ReagentCategory.objects.get(id=default_use_active),
+        active = await loaders.get_loaders().active_reagent_loader.load(
+            default_use_active
         )
+        if active is None:
+            return None
         
         return Reagent(_value=active)
         
@@ -1606,6 +1684,40 @@ class Table:
     graph: Graph = strawberry.field(
         description="The graph this table was queried from."
     )
+    total: int | None = strawberry.field(
+        default=None,
+        description="The number of rows of the whole table. Exact if the page reached the end of the table, otherwise estimated by the query planner.",
+    )
+
+
+@strawberry_django.type(
+    models.GraphQueryExport,
+    filters=filters.GraphQueryExportFilter,
+    pagination=True,
+    description="A Parquet export of the results of a TABLE graph query, built in the background",
+)
+class GraphQueryExport:
+    id: auto
+    query: GraphQuery
+    status: enums.ExportStatus = strawberry_django.field(
+        description="The state of the export. Poll until it is DONE or FAILED"
+    )
+    store: MediaStore | None = strawberry_django.field(
+        description="The media store holding the Parquet file, once the export is done"
+    )
+    row_count: int | None = strawberry_django.field(
+        description="The number of exported rows"
+    )
+    error: str | None = strawberry_django.field(
+        description="Why the export failed, if it did"
+    )
+    created_at: datetime.datetime
+    finished_at: datetime.datetime | None
+
+    @classmethod
+    def get_queryset(cls, queryset, info: Info, **kwargs):
+        # Exports hold the query results, only their creator may see them
+        return queryset.filter(creator=info.context.request.user)
 
 
 @strawberry.type
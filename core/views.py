@@ -0,0 +1,8 @@
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from core import metrics  # noqa: F401 registers the graph pool collector
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for the graph, loader and render metrics"""
+    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE_LATEST)
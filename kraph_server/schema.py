@@ -4,6 +4,11 @@ from typing import Annotated, AsyncGenerator, List
 import strawberry
 from strawberry_django.optimizer import DjangoOptimizerExtension
 from core.datalayer import DatalayerExtension
+from core.connection import GraphCursorExtension
+from core.tracing import CypherTracingExtension
+from core.loaders import LoaderExtension
+from core.agtype import IdentityMapExtension
+from core.cost import CostAnalysisExtension
 from strawberry import ID
 from strawberry.permission import BasePermission
 from typing import Any, Type
@@ -11,8 +16,10 @@ from core import types, models
 from core import mutations
 from core import filters
 from core import queries
+from core import loaders
 from core import subscriptions
 from core import pagination
+from core.permissions import IsAdmin
 from strawberry.field_extensions import InputMutationExtension
 import strawberry_django
 from koherent.strawberry.extension import KoherentExtension
@@ -107,6 +114,19 @@ class Query:
         description="List of all scatter plots"
     )
 
+    materialized_views: list[types.MaterializedView] = strawberry_django.field(
+        description="List of all materialized views"
+    )
+
+    graph_query_exports: list[types.GraphQueryExport] = strawberry_django.field(
+        description="List of your exports of graph queries"
+    )
+
+    slow_cypher_queries: list[types.SlowCypherQuery] = strawberry_django.field(
+        permission_classes=[IsAdmin],
+        description="Cypher executions that exceeded the slow query threshold (admin only)",
+    )
+
     structure = strawberry_django.field(
         resolver=queries.structure,
         description="Gets a specific structure e.g an image, video, or 3D model",
@@ -266,10 +286,10 @@ class Query:
         return models.GraphQuery.objects.get(id=id)
 
     @strawberry.django.field(permission_classes=[])
-    def node(self, info: Info, id: ID) -> types.Node:
+    async def node(self, info: Info, id: ID) -> types.Node:
 
         return types.entity_to_node_subtype(
-            age.get_age_entity(age.to_graph_id(id), age.to_entity_id(id))
+            await loaders.get_loaders().vertex_loader.load(id)
         )
 
     @strawberry.django.field(permission_classes=[])
@@ -282,14 +302,14 @@ class Query:
 
     # SPecial Types
     @strawberry.django.field(permission_classes=[])
-    def structure(
+    async def structure(
         self,
         info: Info,
         id: ID,
     ) -> types.Structure:
 
         return types.entity_to_node_subtype(
-            age.get_age_entity(age.to_graph_id(id), age.to_entity_id(id))
+            await loaders.get_loaders().vertex_loader.load(id)
         )
         
     @strawberry.django.field(permission_classes=[])
@@ -315,14 +335,14 @@ class Query:
         return []
 
     @strawberry.django.field(permission_classes=[])
-    def entity(
+    async def entity(
         self,
         info: Info,
         id: ID,
     ) -> types.Entity:
 
         return types.entity_to_node_subtype(
-            age.get_age_entity(age.to_graph_id(id), age.to_entity_id(id))
+            await loaders.get_loaders().vertex_loader.load(id)
         )
 
     @strawberry.django.field(permission_classes=[])
@@ -338,10 +358,10 @@ class Query:
         )]
 
     @strawberry.django.field(permission_classes=[])
-    def reagent(self, info: Info, id: ID) -> types.Reagent:
+    async def reagent(self, info: Info, id: ID) -> types.Reagent:
 
         return types.entity_to_node_subtype(
-            age.get_age_entity(age.to_graph_id(id), age.to_entity_id(id))
+            await loaders.get_loaders().vertex_loader.load(id)
         )
 
     @strawberry.django.field(permission_classes=[])
@@ -357,10 +377,10 @@ class Query:
         )]
 
     @strawberry.django.field(permission_classes=[])
-    def protocol_event(self, info: Info, id: ID) -> types.ProtocolEvent:
+    async def protocol_event(self, info: Info, id: ID) -> types.ProtocolEvent:
 
         return types.entity_to_node_subtype(
-            age.get_age_entity(age.to_graph_id(id), age.to_entity_id(id))
+            await loaders.get_loaders().vertex_loader.load(id)
         )
 
     @strawberry.django.field(permission_classes=[])
@@ -373,10 +393,10 @@ class Query:
         return []
 
     @strawberry.django.field(permission_classes=[])
-    def natural_event(self, info: Info, id: ID) -> types.NaturalEvent:
+    async def natural_event(self, info: Info, id: ID) -> types.NaturalEvent:
 
         return types.entity_to_node_subtype(
-            age.get_age_entity(age.to_graph_id(id), age.to_entity_id(id))
+            await loaders.get_loaders().vertex_loader.load(id)
         )
 
     @strawberry.django.field(permission_classes=[])
@@ -389,10 +409,10 @@ class Query:
         return []
 
     @strawberry.django.field(permission_classes=[])
-    def metric(self, info: Info, id: ID) -> types.Metric:
+    async def metric(self, info: Info, id: ID) -> types.Metric:
 
         return types.entity_to_node_subtype(
-            age.get_age_entity(age.to_graph_id(id), age.to_entity_id(id))
+            await loaders.get_loaders().vertex_loader.load(id)
         )
 
     @strawberry.django.field(permission_classes=[])
@@ -667,6 +687,24 @@ class Mutation:
         resolver=mutations.pin_graph_query, description="Pin or unpin a graph query"
     )
 
+    materialize_graph_query = strawberry_django.mutation(
+        resolver=mutations.materialize_graph_query,
+        description="Snapshot the results of a TABLE graph query into a table",
+    )
+    refresh_materialized_view = strawberry_django.mutation(
+        resolver=mutations.refresh_materialized_view,
+        description="Rebuild the snapshot of a materialized view",
+    )
+    delete_materialized_view = strawberry_django.mutation(
+        resolver=mutations.delete_materialized_view,
+        description="Delete a materialized view and its snapshot",
+    )
+
+    export_graph_query = strawberry_django.mutation(
+        resolver=mutations.export_graph_query,
+        description="Start exporting the results of a TABLE graph query as a Parquet file. The export is built in the background",
+    )
+
     create_node_query = strawberry_django.mutation(
         resolver=mutations.create_node_query, description="Create a new node query"
     )
@@ -702,6 +740,11 @@ schema = strawberry.Schema(
         KoherentExtension,
         AuthentikateExtension,
         DatalayerExtension,
+        LoaderExtension,
+        IdentityMapExtension,
+        CypherTracingExtension,
+        CostAnalysisExtension,
+        GraphCursorExtension,
     ],
     types=[
         types.Entity,
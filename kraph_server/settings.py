@@ -87,6 +87,15 @@ CHANNEL_LAYERS = {
     },
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"redis://{conf.redis.host}:{conf.redis.port}/1",
+        "KEY_PREFIX": "kraph",
+        "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+    }
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 
@@ -149,6 +158,72 @@ DATABASES = {
     }
 }
 
+# Dedicated connection pool for graph (AGE) queries, separate from the ORM
+# connections. Sizes are per worker process.
+graph_pool_conf = conf.get("graph_pool", {})
+
+GRAPH_POOL = {
+    "ENABLED": graph_pool_conf.get("enabled", True),
+    "MIN_SIZE": graph_pool_conf.get("min_size", 1),
+    "MAX_SIZE": graph_pool_conf.get("max_size", 10),
+    "TIMEOUT": graph_pool_conf.get("timeout", 30.0),
+    "MAX_IDLE": graph_pool_conf.get("max_idle", 600.0),
+    "MAX_LIFETIME": graph_pool_conf.get("max_lifetime", 3600.0),
+    "APPLICATION_NAME": graph_pool_conf.get("application_name", "kraph-graph"),
+    "FETCH_SIZE": graph_pool_conf.get("fetch_size", 500),
+}
+
+cypher_tracing_conf = conf.get("cypher_tracing", {})
+
+CYPHER_TRACING = {
+    "ENABLED": cypher_tracing_conf.get("enabled", True),
+    "REPORT": cypher_tracing_conf.get("report", False),
+}
+
+slow_cypher_conf = conf.get("slow_cypher", {})
+
+SLOW_CYPHER = {
+    "ENABLED": slow_cypher_conf.get("enabled", True),
+    "THRESHOLD_MS": slow_cypher_conf.get("threshold_ms", 500),
+    "EXPLAIN": slow_cypher_conf.get("explain", True),
+    "SAMPLE_RATE": slow_cypher_conf.get("sample_rate", 0.1),
+}
+
+cost_analysis_conf = conf.get("cost_analysis", {})
+
+COST_ANALYSIS = {
+    "ENABLED": cost_analysis_conf.get("enabled", True),
+    "MODE": cost_analysis_conf.get("mode", "report"),
+    "MAX_COST": cost_analysis_conf.get("max_cost", 10000),
+    "DEFAULT_LIST_SIZE": cost_analysis_conf.get("default_list_size", 200),
+    "REPORT": cost_analysis_conf.get("report", False),
+    "WEIGHTS": cost_analysis_conf.get("weights", {}),
+}
+
+metadata_cache_conf = conf.get("metadata_cache", {})
+
+METADATA_CACHE = {
+    "ENABLED": metadata_cache_conf.get("enabled", True),
+    "L1_MAX_SIZE": metadata_cache_conf.get("l1_max_size", 5000),
+    "L1_TTL": metadata_cache_conf.get("l1_ttl", 300),
+    "L2_TTL": metadata_cache_conf.get("l2_ttl", 3600),
+    "CHANNEL": metadata_cache_conf.get("channel", "kraph:metadata:invalidate"),
+}
+
+render_cache_conf = conf.get("render_cache", {})
+
+RENDER_CACHE = {
+    "ENABLED": render_cache_conf.get("enabled", True),
+    "TTL": render_cache_conf.get("ttl", 300),
+}
+
+change_log_conf = conf.get("change_log", {})
+
+CHANGE_LOG = {
+    "ENABLED": change_log_conf.get("enabled", True),
+    "RETENTION_DAYS": change_log_conf.get("retention_days", 7),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
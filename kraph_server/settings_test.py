@@ -1,5 +1,8 @@
 from .settings import *  # noqa
-from .settings import DATABASES, AUTHENTIKATE
+from .settings import DATABASES, AUTHENTIKATE, GRAPH_POOL, METADATA_CACHE
 
 DATABASES["default"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
 AUTHENTIKATE = {**AUTHENTIKATE, "STATIC_TOKENS": {"test": {"sub": "1"}}}
+GRAPH_POOL = {**GRAPH_POOL, "ENABLED": False}
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+METADATA_CACHE = {**METADATA_CACHE, "ENABLED": False}
@@ -21,9 +21,11 @@ from strawberry.django.views import AsyncGraphQLView
 from kante.path import dynamicpath
 
 from kraph_server.schema import schema
+from core import views
 
 url = "s"
 
 urlpatterns = [
     dynamicpath("admin/", admin.site.urls),
+    dynamicpath("metrics", views.metrics_view, name="metrics"),
 ]